@@ -9,6 +9,9 @@ import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 
+from arena_detection import detect_arena
+from black_mouse_tracker import estimate_background
+
 # Load first frame from your video
 video_path = "G:\OPF_VIDEOS/DN_20250328_16_48_52_Pro.mp4"
 cap = cv2.VideoCapture(video_path)
@@ -18,14 +21,21 @@ cap.release()
 # Convert to grayscale for clarity
 gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-# Show the frame and let user click corners
-plt.figure(figsize=(8, 8))
-plt.imshow(gray, cmap='gray')
-plt.title("Click 4 corners of the open field (in order), then press ENTER")
-clicked_pts = plt.ginput(4, timeout=0)  # Wait for 4 clicks
-plt.close()
+# Try to detect the arena corners on the median of a few frames (the mouse is removed by the median)
+roi, confidence = detect_arena(estimate_background(video_path, n_samples=5))
+if roi is not None and confidence >= 0.8:
+    roi_coords = [(int(x), int(y)) for x, y in roi]
+    print(f"Automatically detected ROI coordinates (confidence {confidence:.2f}):")
+    print(roi_coords)
+else:
+    # Show the frame and let user click corners
+    plt.figure(figsize=(8, 8))
+    plt.imshow(gray, cmap='gray')
+    plt.title("Click 4 corners of the open field (in order), then press ENTER")
+    clicked_pts = plt.ginput(4, timeout=0)  # Wait for 4 clicks
+    plt.close()
 
-# Show what was clicked
-roi_coords = [(int(x), int(y)) for x, y in clicked_pts]
-print("Your manually selected ROI coordinates:")
-print(roi_coords)
\ No newline at end of file
+    # Show what was clicked
+    roi_coords = [(int(x), int(y)) for x, y in clicked_pts]
+    print("Your manually selected ROI coordinates:")
+    print(roi_coords)
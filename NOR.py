@@ -1,56 +1,74 @@
 # Novel object recognition within the open field
-import pandas as pd
+import os
+
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-import re
+from nor_metrics import load_nor_track, cohort_nor_metrics
+from opf_metrics import normalize_track
+from figures import use_headless, show_or_save, draw_arena, format_arena_axes
 
-# Define regex pattern
-pattern = r"(\d+\.\d+)\s+(\d+\.\d+)"
+# Track files of the animals (AnimalTracker *.txt, body_track_*.txt or track_*.npy from black_mouse_tracker)
+track_files = [r"\test_data.txt"]  # Use raw strings for Windows paths
+output_path = None  # Set to a *.csv path to save the scores
+figure_dir = None  # Set to a directory to save the figures as PNG files instead of showing them (headless)
+if figure_dir:
+    use_headless()
+sampling_rate = 60  # Hz, check your camera setting
+arena_size = 1.0  # Tracks are normalized to a 1 m arena (tracks in cm from the tracker are converted)
 
-# File paths and estimated side lengths (used for 1m normalization)
-file_path = r"\test_data.txt"  # Use raw string for Windows paths
-
-# Extract coordinates
-with open(file_path, "r") as f:
-    content = f.read()
-pattern = r"(\d+\.\d+)\s+(\d+\.\d+)"
-matches = re.findall(pattern, content)
-coordinates = pd.DataFrame(matches, columns=["X", "Y"]).astype(float)
-    titles.append(label)
-
-# Define a middle square spans from (0.25, 0.25) to (0.75, 0.75)
+# Objects in the arena (m); for tracks in cm from the tracker, give their real positions
 object_1 = (0.25, 0.75)  # Identical object
 object_2 = (0.75, 0.25)  # Identical/new object
-radius = 0.15  
-
-# Calculate exploration time for each object per mouse
-exploration_times = {}
-fig, axs = plt.subplots(2, 2, figsize=(12, 12))
+novel_object = 1  # Index of the new object in objects, for the discrimination index
+objects = [object_1, object_2]
+radius = 0.15  # Nose within this distance of an object counts as exploring it...
+max_angle = 45  # ...if the head points at the object within this angle (degrees)
+min_bout_s = 0.0  # Shorter exploration bouts are not counted
+# Track cleaning (see track_cleaning.clean_track): jumps faster than max_speed (cm/s in a 40 cm open field)
+# are rejected, gaps up to max_gap_s are interpolated and the jitter is smoothed; None scores the raw tracks
+cleaning = dict(arena_size=40, max_speed=150, max_gap_s=0.5, smoothing="savgol", window=5)
 
-for ax, track, title in zip(axs.flatten(), normalized_tracks, titles):
-    # Distance to each object
-    dist_o1 = np.sqrt((track["X"] - object_1[0])**2 + (track["Y"] - object_1[1])**2)
-    dist_o2 = np.sqrt((track["X"] - object_2[0])**2 + (track["Y"] - object_2[1])**2)
+# Load all animals; tracks in cm are converted to m, others are normalized to the arena.
+centers, noses, normalize, titles = [], [], [], []
+for path in track_files:
+    center, nose, calibrated = load_nor_track(path, sampling_rate, cleaning)
+    if calibrated:
+        center, nose = center / 100, nose / 100
+    centers.append(center)
+    noses.append(nose)
+    normalize.append(not calibrated)
+    titles.append(os.path.splitext(os.path.basename(path))[0])
 
-    # Points within 15cm of each object
-    in_o1 = dist_o1 <= radius
-    in_o2 = dist_o2 <= radius
+# Score the whole cohort in one vectorized pass.
+scores = cohort_nor_metrics(centers, noses, objects, sampling_rate, radius, max_angle, min_bout_s, arena_size,
+                            normalize, novel_object)
+rows = []
+for title, s in zip(titles, scores):
+    row = {"animal": title, "directed": s["directed"]}
+    for k in range(len(objects)):
+        row[f"object_{k + 1}_s"] = round(s["exploration_s"][k], 2)
+        row[f"object_{k + 1}_bouts"] = int(s["bouts"][k])
+        row[f"object_{k + 1}_latency_s"] = round(s["latency_s"][k], 2)
+    row["discrimination_index"] = round(s["discrimination_index"], 3)
+    rows.append(row)
+exploration_times = pd.DataFrame(rows)
+print(exploration_times.to_string(index=False))
+if output_path:
+    exploration_times.to_csv(output_path, index=False)
 
-    # Exploration time (in seconds)
-    time_o1 = round(in_o1.sum() / 60, 2)
-    time_o2 = round(in_o2.sum() / 60, 2)
-    exploration_times[title] = {"Object 1": time_o1, "Object 2": time_o2}
+# Plot every track with the object areas
+n_cols = int(np.ceil(np.sqrt(len(centers))))
+n_rows = int(np.ceil(len(centers) / n_cols))
+fig, axs = plt.subplots(n_rows, n_cols, figsize=(6 * n_cols, 6 * n_rows), squeeze=False)
+for ax in axs.flatten()[len(centers):]:
+    ax.set_visible(False)
 
-    # Plot track
-    ax.plot(track["X"], track["Y"], color='blue', linewidth=1)
-    draw_squares(ax)
-    ax.set_xlim(0, 1)
-    ax.set_ylim(0, 1)
-    ax.set_aspect("equal")
-    ax.set_xlabel("X (m)")
-    ax.set_ylabel("Y (m)")
-    ax.set_title(title)
-    ax.grid(True)
+for ax, center, scaled, title in zip(axs.flatten(), centers, normalize, titles):
+    track = normalize_track(center, arena_size) if scaled else center
+    ax.plot(track[:, 0], track[:, 1], color='blue', linewidth=1)
+    draw_arena(ax, arena_size)
+    format_arena_axes(ax, arena_size, "m", title)
 
     # Mark AOIs
     o1_circle = plt.Circle(object_1, radius, color='green', fill=False, linestyle='--', linewidth=2, label='Object 1 AOI')
@@ -59,6 +77,6 @@ for ax, track, title in zip(axs.flatten(), normalized_tracks, titles):
     ax.add_patch(o2_circle)
 
 plt.tight_layout()
-plt.show()
+show_or_save({"nor": fig}, figure_dir, "nor")
 
 exploration_times
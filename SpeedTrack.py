@@ -1,75 +1,109 @@
 # Animal speed track
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-import re
+from track_io import load_coordinates, is_calibrated, has_ellipse
+from track_cleaning import load_analysis_track, load_track_grid
+from opf_metrics import normalize_track, open_field_metrics, compute_speed, middle_zone_bounds
+from heatmaps import heatmap_grids, plot_heatmap
+from figures import use_headless, show_or_save, figure_prefix
+from kinematics import kinematic_features, kinematics_summary
 
 # Load OPF mouse data
 file_path = r"\test_data.txt"  # Directory
+figure_dir = None  # Set to a directory to save the figures as PNG files instead of showing them (headless)
+if figure_dir:
+    use_headless()
 
-# Extract coordinates
-with open(file_path, "r") as f:
-    content = f.read()
-pattern = r"(\d+\.\d+)\s+(\d+\.\d+)"
-matches = re.findall(pattern, content)
-coordinates = pd.DataFrame(matches, columns=["X", "Y"]).astype(float)
-
-# Scale field to 1m x 1m
-x_range = coordinates["X"].max() - coordinates["X"].min()
-y_range = coordinates["Y"].max() - coordinates["Y"].min()
-side_length = np.mean([x_range, y_range])
-scale = 1.0 / side_length
-coordinates_scaled = coordinates * scale
-
-# Normalize coordinates
-coordinates_normalized = coordinates_scaled.copy()
-coordinates_normalized["X"] -= coordinates_scaled["X"].min()
-coordinates_normalized["Y"] -= coordinates_scaled["Y"].min()
+# Frame rate of the track (60 Hz)
+sampling_rate = 60
+
+# Side of the square open field (cm): tracks in pixels are scaled to it, tracks in cm from black_mouse_tracker have it
+arena_size_cm = 40
+
+# Track cleaning (see track_cleaning.clean_track): jumps faster than max_speed (cm/s) are rejected, gaps up to
+# max_gap_s are interpolated and the centroid jitter is smoothed; None analyses the raw track
+cleaning = dict(arena_size=arena_size_cm, max_speed=150, max_gap_s=0.5, smoothing="savgol", window=5)
+
+# Extract coordinates (AnimalTracker *.txt, or track_*.npy from black_mouse_tracker)
+# Tracks from black_mouse_tracker are already in cm through the ROI homography and need no scaling
+calibrated = is_calibrated(file_path)
+coordinates = load_analysis_track(file_path, sampling_rate, "center_cm" if calibrated else "center", cleaning)
+if calibrated:
+    coordinates = coordinates / 100  # cm -> m
+
+# Field side in m; pixel tracks are normalized to it
+arena_size = arena_size_cm / 100
+coordinates_normalized = coordinates if calibrated else normalize_track(coordinates, arena_size)
 
 # Calculate speed (Euclidean distance between points × 60Hz)
-dx = coordinates_normalized["X"].diff()
-dy = coordinates_normalized["Y"].diff()
-speed = np.sqrt(dx**2 + dy**2) * 60  # speed in m/s
-coordinates_normalized["speed"] = speed.fillna(0)
-
-# Middle square mask (0.25–0.75 m)
-middle_mask = (
-    (coordinates_normalized["X"] >= 0.25) & (coordinates_normalized["X"] <= 0.75) &
-    (coordinates_normalized["Y"] >= 0.25) & (coordinates_normalized["Y"] <= 0.75)
-)
-
-# Average speed in the middle square
-if middle_mask.sum() > 0:
-    average_middle_speed = coordinates_normalized.loc[middle_mask, "speed"].mean()
-else:
-    average_middle_speed = 0.0
+speed = compute_speed(coordinates_normalized, sampling_rate)  # speed in m/s
+
+# Body ellipse of every tracked frame (track_*.npy from black_mouse_tracker), for posture features
+# (on the time grid of the cleaned track, or the valid frames only like the raw track)
+ellipse = None
+if has_ellipse(file_path):
+    ellipse = load_track_grid(file_path, sampling_rate, "ellipse")[0] if cleaning else load_coordinates(file_path, "ellipse")
+
+# Middle square (the middle half of the field): dwell time and average speed in the middle square
+middle_zone = middle_zone_bounds(arena_size)
+result = open_field_metrics(coordinates, sampling_rate, arena_size, middle_zone=middle_zone, normalize=not calibrated)
+average_middle_speed = result["average_middle_speed"]
+dwell_time_s = result["time_middle_s"]
 
 # Draw field
 def draw_squares(ax):
-    outer = plt.Rectangle((0, 0), 1, 1, fill=False, color='black', linewidth=1.5, linestyle='--')
-    middle = plt.Rectangle((0.25, 0.25), 0.5, 0.5, fill=False, color='red', linewidth=1.5, linestyle=':')
+    low, high = middle_zone
+    outer = plt.Rectangle((0, 0), arena_size, arena_size, fill=False, color='black', linewidth=1.5, linestyle='--')
+    middle = plt.Rectangle((low, low), high - low, high - low, fill=False, color='red', linewidth=1.5, linestyle=':')
     ax.add_patch(outer)
     ax.add_patch(middle)
 
-# Plot speed heatmap
+# Time spent and mean speed in 40 x 40 bins over the field
+occupancy, mean_speed = heatmap_grids(coordinates_normalized, speed, arena_size, bins=40, sampling_rate=sampling_rate)
+
+# Plot speed heatmap with colorbar
 fig, ax = plt.subplots(figsize=(6, 6))
-sc = ax.scatter(coordinates_normalized["X"], coordinates_normalized["Y"],
-                c=coordinates_normalized["speed"], cmap="viridis", s=3)
+plot_heatmap(ax, mean_speed, arena_size, "Speed (m/s)", orientation='vertical')
 draw_squares(ax)
 ax.set_title("Speed Heatmap - WT Mouse")
-ax.set_xlim(0, 1)
-ax.set_ylim(0, 1)
+ax.set_xlim(0, arena_size)
+ax.set_ylim(0, arena_size)
 ax.set_aspect('equal')
 ax.set_xlabel("X (m)")
 ax.set_ylabel("Y (m)")
 ax.grid(True)
 
-# Add colorbar
-cbar = plt.colorbar(sc, ax=ax, orientation='vertical')
-cbar.set_label("Speed (m/s)")
-
 plt.tight_layout()
-plt.show()
+
+# Plot occupancy heatmap
+occupancy_fig, ax = plt.subplots(figsize=(6, 6))
+plot_heatmap(ax, occupancy, arena_size, "Time (s)", orientation='vertical')
+draw_squares(ax)
+ax.set_title("Occupancy Heatmap - WT Mouse")
+ax.set_xlim(0, arena_size)
+ax.set_ylim(0, arena_size)
+ax.set_aspect('equal')
+ax.set_xlabel("X (m)")
+ax.set_ylabel("Y (m)")
+occupancy_fig.tight_layout()
+
+# Dancing / chorea-like movement: kinematic features over 1 s windows every 0.5 s
+features = kinematic_features(coordinates_normalized, sampling_rate, ellipse, window_s=1.0, step_s=0.5,
+                              turn_threshold=90, min_speed=0.02)
+kinematics_fig, kinematics_axs = plt.subplots(4, 1, figsize=(10, 10), sharex=True)
+for ax, (key, label) in zip(kinematics_axs, [("angular_speed", "Angular speed (deg/s)"),
+                                             ("tortuosity", "Tortuosity"),
+                                             ("turning_bouts_per_min", "Turning bouts (/min)"),
+                                             ("elongation", "Body elongation")]):
+    ax.plot(features["time_s"], features[key], color='blue', linewidth=0.8)
+    ax.set_ylabel(label)
+    ax.grid(True)
+kinematics_axs[-1].set_xlabel("Time (s)")
+kinematics_fig.suptitle("Kinematics - WT Mouse")
+kinematics_fig.tight_layout()
+
+show_or_save({"speed": fig, "occupancy": occupancy_fig, "kinematics": kinematics_fig}, figure_dir, figure_prefix(file_path))
 
 # Output dwell time
 print(f"Dwell time in middle square: {dwell_time_s:.2f} seconds")
+for key, value in kinematics_summary(features).items():
+    print(f"Mean {key}: {value:.3f}")
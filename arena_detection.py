@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Automatic detection of the open-field arena in a video frame.
+
+The arena floor is segmented from its surroundings with Otsu's threshold (both polarities are
+tried), the largest quadrilateral region is taken as the arena, and its corners are refined by
+fitting a line to every side. The result is the same np.int32 (4, 2) ROI polygon that
+select_roi returns, with a confidence score for deciding when to fall back to clicking.
+"""
+
+import cv2
+import numpy as np
+
+min_area_fraction = 0.05  # Smallest arena, as a fraction of the frame
+contrast_scale = 20.0  # Gray-level difference between arena and surroundings for full confidence
+
+def order_corners(corners):
+    """
+    Order four corners clockwise on screen, starting at the top-left one (as select_roi asks).
+    """
+    corners = np.asarray(corners, dtype=np.float64)
+    center = corners.mean(axis=0)
+    angles = np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+    corners = corners[np.argsort(angles)]  # Image y points down, so increasing angle is clockwise
+    return np.roll(corners, -np.argmin(corners.sum(axis=1)), axis=0)
+
+def refine_corners(contour, corners):
+    """
+    Refine approximate corners by fitting a line to the contour points of every side (leaving
+    out the points near the corners) and intersecting neighbouring lines.
+    """
+    points = contour.reshape(-1, 2).astype(np.float64)
+    starts = corners
+    ends = np.roll(corners, -1, axis=0)
+    sides = ends - starts
+    lengths = np.linalg.norm(sides, axis=1)
+    # Distance of every point to every side, and position along it (0..1).
+    rel = points[:, None, :] - starts[None, :, :]
+    along = (rel * sides).sum(axis=2) / lengths**2
+    across = np.abs(rel[:, :, 0] * sides[:, 1] - rel[:, :, 1] * sides[:, 0]) / lengths
+    nearest = np.argmin(across, axis=1)
+
+    lines = []
+    for i in range(4):
+        t = along[nearest == i, i]
+        side_points = points[nearest == i][(t > 0.1) & (t < 0.9)]
+        if len(side_points) < 2:
+            return corners
+        vx, vy, x0, y0 = cv2.fitLine(side_points.astype(np.float32), cv2.DIST_HUBER, 0, 0.01, 0.01).ravel()
+        lines.append((np.array([x0, y0]), np.array([vx, vy])))
+
+    refined = []
+    for i in range(4):
+        (p1, d1), (p2, d2) = lines[i - 1], lines[i]
+        denom = d1[0] * d2[1] - d1[1] * d2[0]
+        if abs(denom) < 1e-6:
+            return corners
+        s = ((p2[0] - p1[0]) * d2[1] - (p2[1] - p1[1]) * d2[0]) / denom
+        refined.append(p1 + s * d1)
+    return np.array(refined)
+
+def region_contrast(gray, corners, band=10):
+    """
+    Mean gray-level difference between a band just inside and a band just outside the polygon.
+    """
+    polygon = np.zeros(gray.shape, dtype=np.uint8)
+    cv2.fillPoly(polygon, [np.round(corners).astype(np.int32)], 255)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * band + 1, 2 * band + 1))
+    inner = cv2.subtract(polygon, cv2.erode(polygon, kernel))
+    outer = cv2.subtract(cv2.dilate(polygon, kernel), polygon)
+    if not inner.any() or not outer.any():
+        return 0.0
+    return abs(cv2.mean(gray, inner)[0] - cv2.mean(gray, outer)[0])
+
+def detect_arena(gray):
+    """
+    Find the square arena in a grayscale frame, best the median background of a few frames so
+    the mouse does not cut into the floor.
+    Returns (roi, confidence): the corners as an np.int32 (4, 2) array clockwise from the top-left,
+    or None if no quadrilateral was found, and a score from 0 to 1 combining how well the region
+    fits its quadrilateral with the contrast along its edges.
+    """
+    height, width = gray.shape
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
+
+    best_roi, best_confidence = None, 0.0
+    for region in (binary, cv2.bitwise_not(binary)):  # Bright arena on dark surroundings, or the reverse
+        region = cv2.morphologyEx(region, cv2.MORPH_OPEN, kernel)
+        region = cv2.morphologyEx(region, cv2.MORPH_CLOSE, kernel)
+        contours, _ = cv2.findContours(region, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area < min_area_fraction * height * width:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            if x == 0 or y == 0 or x + w == width or y + h == height:
+                continue  # The surroundings, not the arena
+            hull = cv2.convexHull(contour)
+            approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+            if len(approx) != 4:
+                continue
+            corners = refine_corners(contour, order_corners(approx.reshape(4, 2)))
+            quad_area = cv2.contourArea(corners.astype(np.float32))
+            fit = min(area, quad_area) / max(area, quad_area)
+            confidence = fit * min(1.0, region_contrast(gray, corners) / contrast_scale)
+            if confidence > best_confidence:
+                best_roi, best_confidence = np.round(corners).astype(np.int32), confidence
+    return best_roi, best_confidence
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch mode for black_mouse_tracker.
+
+Tracks every video of a directory (or listed in a manifest) in a process pool,
+using the ROI/threshold configs saved by black_mouse_tracker.process_video, or the
+calibration profile of the rig and recording day (see calibration.py).
+Finished videos are logged to a progress file, so an interrupted run resumes
+where it stopped.
+"""
+
+import os
+import csv
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from black_mouse_tracker import (create_mask, track_mouse, save_tracking_results, load_tracking_config,
+                                 tracking_params, tracking_preview, config_from_profile, save_tracking_stats)
+from result_cache import ResultCache
+from figures import use_headless, figure_prefix
+from calibration import video_date, is_profile, find_profile, arena_homography
+from tracker_stats import TrackerStats
+
+# Batch settings
+video_dir = r"G:\OPF_VIDEOS"  # Directory with the videos to track
+manifest_path = None  # Optional CSV with columns "video_path" and (optionally) "config_path"
+config_dir = r"G:\OPF_VIDEOS"  # Directory with tracking_config_<video>.json files
+default_config = None  # Optional shared config used when a video has no config of its own
+profile_dir = None  # Optional directory of calibration profiles, used when a video has no config of its own
+rig = "rig1"  # Camera rig of the videos, to pick its calibration profile
+arena_size_cm = 40  # Side of the open field (cm) for the track in cm, unless the config stores its own
+output_dir = r"G:\OPF_VIDEOS\batch"  # Directory where results will be saved
+sampling_rate = None  # None keeps the sampling rate stored in each config
+search_radius = None  # Pixels; set to track within a window around the predicted position
+n_workers = max(1, (os.cpu_count() or 2) - 1)
+cache_dir = None  # Set to a directory to reuse tracking results of unchanged videos/settings
+cache_max_gb = 20  # Size limit of the cache; least recently used results are evicted
+figure_dir = None  # Set to a directory to save a tracking preview PNG per video
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+PROGRESS_FILE = "batch_progress.jsonl"
+
+def find_config(video_path):
+    """
+    Return the config file for a video: tracking_config_<video>.json in config_dir,
+    else the calibration profile of the rig for the recording day, else the shared default_config,
+    else None.
+    """
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    config_file = os.path.join(config_dir, f"tracking_config_{video_basename}.json")
+    if os.path.exists(config_file):
+        return config_file
+    if profile_dir:
+        profile_file = find_profile(profile_dir, rig, video_date(video_path))
+        if profile_file:
+            return profile_file
+    return default_config
+
+def collect_jobs():
+    """
+    List (video_path, config_path) pairs from the manifest, or from video_dir if no manifest is given.
+    """
+    jobs = []
+    if manifest_path:
+        with open(manifest_path, newline='') as f:
+            for row in csv.DictReader(f):
+                video = row["video_path"]
+                jobs.append((video, row.get("config_path") or find_config(video)))
+    else:
+        for name in sorted(os.listdir(video_dir)):
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                video = os.path.join(video_dir, name)
+                jobs.append((video, find_config(video)))
+    return jobs
+
+def load_progress(progress_file):
+    """
+    Return the set of videos already finished in a previous (possibly crashed) run.
+    """
+    done = set()
+    if not os.path.exists(progress_file):
+        return done
+    with open(progress_file, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Line cut short by a crash
+            if record.get("status") == "done":
+                done.add(record["video_path"])
+    return done
+
+def _init_worker():
+    # One OpenCV thread per process; the pool provides the parallelism. Figures go to files only.
+    cv2.setNumThreads(1)
+    use_headless()
+
+def track_video(video_path, config_path, output_dir, sampling_rate=None, search_radius=None, cache_dir=None,
+                figure_dir=None):
+    """
+    Track a single video headless with a saved config or calibration profile and save the results.
+    A video that drifted from its calibration profile raises ValueError.
+    With cache_dir set, a cached tracking of the same video content and settings is reused.
+    With figure_dir set, a tracking preview is saved there as <video>_preview.png.
+    The stage timings of the run are saved as tracking_stats_<video>.json (see tracker_stats.py).
+    Returns a summary dict with the number of processed frames, the elapsed time and the detection rate.
+    """
+    if is_profile(config_path):
+        roi, selected_thresh, clicked_point, config = config_from_profile(config_path, video_path)
+    else:
+        roi, selected_thresh, clicked_point, config = load_tracking_config(config_path)
+    rate = sampling_rate or config["sampling_rate"]
+    homography = arena_homography(roi, config.get("arena_size_cm", arena_size_cm))
+
+    if cache_dir:
+        cache = ResultCache(cache_dir, int(cache_max_gb * 1024**3))
+        cache_key = cache.key(video_path, kind="track_mouse",
+                              **tracking_params(roi, selected_thresh, clicked_point, rate, search_radius))
+        tracked_points = cache.get(cache_key)
+        if tracked_points is not None:
+            save_tracking_results(output_dir, tracked_points, video_path, homography)
+            if figure_dir:
+                save_preview(video_path, tracked_points, roi, figure_dir)
+            return {"video_path": video_path, "frames": len(tracked_points), "seconds": 0.0,
+                    "worker": os.getpid(), "cached": True, "drift": config.get("drift")}
+
+    cap = cv2.VideoCapture(video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    cap.release()
+    if width == 0 or height == 0:
+        raise IOError(f"Could not read from video {video_path}")
+    mask = create_mask((height, width), roi)
+
+    start = time.perf_counter()
+    stats = TrackerStats()
+    tracked_points = track_mouse(video_path, mask, selected_thresh, clicked_point, rate, live_preview=False,
+                                 search_radius=search_radius, stats=stats)
+    elapsed = time.perf_counter() - start
+    if cache_dir:
+        cache.put(cache_key, tracked_points)
+    save_tracking_results(output_dir, tracked_points, video_path, homography)
+    save_tracking_stats(output_dir, stats, video_path)
+    if figure_dir:
+        save_preview(video_path, tracked_points, roi, figure_dir)
+    return {
+        "video_path": video_path,
+        "frames": len(tracked_points),
+        "seconds": elapsed,
+        "worker": os.getpid(),
+        "cached": False,
+        "drift": config.get("drift"),
+        "detection_rate": stats.to_dict().get("detection_rate"),
+    }
+
+def save_preview(video_path, tracked_points, roi, figure_dir):
+    """
+    Save the tracking preview of a video, drawn on its first frame, to figure_dir.
+    """
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        raise IOError(f"Could not read from video {video_path}")
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    tracking_preview(gray_frame, tracked_points, roi, figure_dir, figure_prefix(video_path))
+
+def print_summary(results, wall_time):
+    """
+    Print throughput in processed frames/s per worker and for the whole batch.
+    Videos taken from the cache are counted separately.
+    """
+    n_cached = sum(r["cached"] for r in results)
+    if n_cached:
+        print(f"\n{n_cached} videos taken from the cache")
+    results = [r for r in results if not r["cached"]]
+    if not results:
+        print("No videos were tracked.")
+        return
+    per_worker = {}
+    for r in results:
+        frames, seconds = per_worker.get(r["worker"], (0, 0.0))
+        per_worker[r["worker"]] = (frames + r["frames"], seconds + r["seconds"])
+    print("\nThroughput summary:")
+    for worker, (frames, seconds) in sorted(per_worker.items()):
+        print(f"  worker {worker}: {frames} frames in {seconds:.1f} s "
+              f"({frames / max(seconds, 1e-9):.1f} frames/s)")
+    total_frames = sum(r["frames"] for r in results)
+    print(f"  total: {total_frames} frames in {wall_time:.1f} s wall time "
+          f"({total_frames / wall_time:.1f} frames/s)")
+
+def run_batch():
+    """
+    Track all pending videos in a process pool, logging each finished video to the progress file.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    progress_file = os.path.join(output_dir, PROGRESS_FILE)
+    done = load_progress(progress_file)
+
+    jobs = []
+    for video, config in collect_jobs():
+        if video in done:
+            continue
+        if config is None:
+            print(f"Skipping {video}: no tracking config found")
+            continue
+        jobs.append((video, config))
+    print(f"{len(done)} videos already done, {len(jobs)} to track with {n_workers} workers")
+
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as pool, \
+            open(progress_file, 'a') as progress:
+        futures = {pool.submit(track_video, video, config, output_dir, sampling_rate, search_radius, cache_dir,
+                               figure_dir): video
+                   for video, config in jobs}
+        for i, future in enumerate(as_completed(futures), 1):
+            video = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Not logged as done, so the video is retried on the next run.
+                print(f"[{i}/{len(jobs)}] FAILED {video}: {e}")
+                continue
+            results.append(result)
+            progress.write(json.dumps(dict(result, status="done")) + "\n")
+            progress.flush()
+            if result["drift"] and result["drift"]["status"] == "corrected":
+                print(f"[{i}/{len(jobs)}] {os.path.basename(video)}: ROI moved by {result['drift']['shift_px']} px "
+                      f"to follow camera drift")
+            if result["cached"]:
+                print(f"[{i}/{len(jobs)}] {os.path.basename(video)}: {result['frames']} frames from cache")
+                continue
+            print(f"[{i}/{len(jobs)}] {os.path.basename(video)}: {result['frames']} frames in "
+                  f"{result['seconds']:.1f} s ({result['frames'] / max(result['seconds'], 1e-9):.1f} frames/s)")
+
+    print_summary(results, time.perf_counter() - start)
+
+def main():
+    run_batch()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark track_io.load_coordinates against the original loading code of the analysis scripts
+(f.read() + re.findall + string DataFrame + astype(float)) on a large coordinate file.
+"""
+
+import os
+import re
+import time
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from track_io import load_coordinates, COORDINATE_PATTERN
+
+# Benchmark settings
+n_points = 1_000_000  # Number of X, Y points in the generated file
+file_path = os.path.join(tempfile.gettempdir(), f"benchmark_coordinates_{n_points}.txt")
+n_repeats = 3
+
+def write_test_file(path, n):
+    """
+    Write n random "X Y" lines in the "%.5f %.5f" format of black_mouse_tracker.
+    """
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(0, 1000, size=(n, 2))
+    np.savetxt(path, coords, fmt="%.5f", delimiter=" ")
+
+def load_regex_dataframe(path):
+    # The loading block the analysis scripts used before track_io.
+    with open(path, "r") as f:
+        content = f.read()
+    matches = re.findall(COORDINATE_PATTERN, content)
+    return pd.DataFrame(matches, columns=["X", "Y"]).astype(float)
+
+def best_time(func, path):
+    """
+    Best wall time of n_repeats calls, and the last result.
+    """
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        result = func(path)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def main():
+    if not os.path.exists(file_path):
+        print(f"Writing {n_points} points to {file_path}")
+        write_test_file(file_path, n_points)
+
+    regex_time, reference = best_time(load_regex_dataframe, file_path)
+    fast_time, coordinates = best_time(load_coordinates, file_path)
+
+    identical = np.array_equal(reference.to_numpy(), coordinates)
+    print(f"regex + DataFrame: {regex_time:.3f} s ({n_points / regex_time / 1e6:.2f} M points/s)")
+    print(f"load_coordinates:  {fast_time:.3f} s ({n_points / fast_time / 1e6:.2f} M points/s)")
+    print(f"Speedup: {regex_time / fast_time:.1f}x, identical values: {identical}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the segmentation backends of black_mouse_tracker on the same clip:
+global threshold vs. difference to a median background.
+Reports tracked frames/s and miss rate (frames without a detected mouse) for each.
+"""
+
+import time
+
+import cv2
+
+from black_mouse_tracker import (create_mask, track_mouse, load_tracking_config, estimate_background,
+                                 ThresholdSegmenter, BackgroundSegmenter)
+
+# Benchmark settings
+config_file = r"G:\OPF_VIDEOS\tracking_config_WIN_20250403_13_54_53_Pro.json"  # Saved by black_mouse_tracker
+diff_thresh = 40  # Background difference threshold
+n_background_samples = 25  # Frames used for the median background
+clip_frames = 3600  # Number of video frames to track (None for the whole video)
+start_frame = 10
+
+def run_backend(name, video_path, mask, segmenter, clicked_point, sampling_rate):
+    """
+    Track the clip with one segmenter and return its frames/s and miss rate.
+    """
+    end_frame = start_frame + clip_frames if clip_frames else None
+    start = time.perf_counter()
+    tracked_points = track_mouse(video_path, mask, segmenter, clicked_point, sampling_rate,
+                                 start_frame=start_frame, end_frame=end_frame)
+    elapsed = time.perf_counter() - start
+    misses = sum(pt["center"] is None for pt in tracked_points)
+    n_frames = max(len(tracked_points), 1)
+    return {
+        "backend": name,
+        "frames": len(tracked_points),
+        "frames_per_s": len(tracked_points) / elapsed,
+        "miss_rate": misses / n_frames,
+    }
+
+def main():
+    roi, selected_thresh, clicked_point, config = load_tracking_config(config_file)
+    video_path = config["video_path"]
+    sampling_rate = config["sampling_rate"]
+
+    cap = cv2.VideoCapture(video_path)
+    shape = (int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    cap.release()
+    mask = create_mask(shape, roi)
+
+    start = time.perf_counter()
+    background = estimate_background(video_path, n_background_samples, start_frame)
+    background_time = time.perf_counter() - start
+    print(f"Background estimated from {n_background_samples} frames in {background_time:.2f} s")
+
+    if isinstance(selected_thresh, BackgroundSegmenter):
+        raise ValueError("The benchmark needs a config saved with segmentation = \"threshold\"")
+    results = [
+        run_backend("threshold", video_path, mask, ThresholdSegmenter(selected_thresh), clicked_point,
+                    sampling_rate),
+        run_backend("background", video_path, mask, BackgroundSegmenter(background, diff_thresh),
+                    clicked_point, sampling_rate),
+    ]
+
+    print(f"\n{'backend':<12}{'frames':>8}{'frames/s':>12}{'miss rate':>12}")
+    for r in results:
+        print(f"{r['backend']:<12}{r['frames']:>8}{r['frames_per_s']:>12.1f}{r['miss_rate']:>12.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+Reproducible benchmarks of the tracking and analysis pipeline on synthetic data
+(see synthetic_data.py), so no recorded videos are needed.
+
+Times track_mouse on a synthetic arena video, the coordinate loaders on text and binary track
+files, the track cleaning, the open-field metrics (in memory and streamed in chunks) and the heatmap figure rendering. For each it records the best
+time of n_repeats runs, the throughput (frames/s or samples/s) and the peak memory allocated
+through Python and NumPy (tracemalloc, in a separate run so it does not slow the timed ones;
+OpenCV's own buffers are not included).
+Every run is appended as one JSON line to results_file (in the home directory, so the history
+survives a cleared temp directory), with the commit and library versions, and compared with
+the last earlier run of the same settings, so regressions show up.
+"""
+
+import os
+import io
+import json
+import time
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from contextlib import redirect_stdout
+
+import cv2
+import numpy as np
+
+import synthetic_data
+from black_mouse_tracker import create_mask, track_mouse
+from track_io import load_coordinates, load_track, iter_track_coordinates
+from opf_metrics import cohort_metrics, normalize_track, streaming_metrics
+from track_cleaning import load_clean_track
+from figures import use_headless, render_track_figures
+from tracker_stats import TrackerStats
+
+# Benchmark settings
+data_dir = os.path.join(tempfile.gettempdir(), "opf_benchmark_data")  # Generated inputs, reused across runs
+# One JSON line per run. In the home directory, not data_dir: a cleared temp directory would reset the baseline.
+results_file = os.path.join(os.path.expanduser("~"), ".opf_benchmark", "benchmark_results.jsonl")
+n_video_frames = 1800  # Length of the synthetic video
+video_size = (640, 480)  # Width, height
+video_fps = 30.0
+n_samples = 1_000_000  # Length of the synthetic coordinate and track files
+sampling_rate = 30
+arena_size = 40.0
+n_repeats = 3
+regression_tolerance = 0.10  # Throughput drops beyond this fraction are flagged
+seed = 0
+
+def settings():
+    return {"n_video_frames": n_video_frames, "video_size": list(video_size), "video_fps": video_fps,
+            "n_samples": n_samples, "sampling_rate": sampling_rate, "n_repeats": n_repeats, "seed": seed}
+
+def prepare_data():
+    """
+    Generate the synthetic video, coordinate text file and binary track file unless they exist.
+    Returns their paths and the ground truth of the video.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    video_file = os.path.join(data_dir, f"arena_{n_video_frames}_{video_size[0]}x{video_size[1]}_{seed}.avi")
+    text_file = os.path.join(data_dir, f"coordinates_{n_samples}_{seed}.txt")
+    track_file = os.path.join(data_dir, f"track_{n_samples}_{seed}.npy")
+    if not os.path.exists(video_file):
+        print(f"Writing {n_video_frames} frames to {video_file}")
+        synthetic_data.write_arena_video(video_file, n_video_frames, video_size, video_fps, seed)
+    if not os.path.exists(text_file):
+        print(f"Writing {n_samples} points to {text_file}")
+        synthetic_data.write_coordinate_file(text_file, n_samples, sampling_rate=sampling_rate, seed=seed)
+    if not os.path.exists(track_file):
+        print(f"Writing {n_samples} frames to {track_file}")
+        synthetic_data.write_track_file(track_file, n_samples, arena_size, sampling_rate=sampling_rate, seed=seed)
+    truth = synthetic_data.arena_video_truth(n_video_frames, video_size, video_fps, seed)
+    return video_file, text_file, track_file, truth
+
+def measure(func, n_items):
+    """
+    Best wall time of n_repeats calls of func (its prints are suppressed), then the peak
+    tracemalloc memory of one more call. Returns the timings and the last result.
+    """
+    times = []
+    for _ in range(n_repeats):
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        with redirect_stdout(io.StringIO()):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(times)
+    return {"items": n_items, "seconds": best, "median_seconds": float(np.median(times)),
+            "per_s": n_items / best if best > 0 else float("inf"), "peak_mb": peak / 2**20}, result
+
+def bench_track_mouse(video_file, truth):
+    mask = create_mask(video_size[::-1], truth["roi"])
+    stats = TrackerStats()
+
+    def run():
+        return track_mouse(video_file, mask, truth["selected_thresh"], truth["clicked_point"], video_fps,
+                           start_frame=0)
+
+    result, tracked_points = measure(run, n_video_frames)
+    frames = [pt["frame"] for pt in tracked_points]
+    found = np.array([pt["center"] is not None for pt in tracked_points])
+    centers = np.array([pt["center"] if pt["center"] else (np.nan, np.nan) for pt in tracked_points], dtype=float)
+    errors = np.hypot(*(centers - truth["centers"][frames]).T)
+    result.update(unit="frames", detection_rate=float(found.mean()),
+                  mean_error_px=float(np.nanmean(errors)) if found.any() else None)
+    # One more run for the stage profile of the tracker.
+    with redirect_stdout(io.StringIO()):
+        track_mouse(video_file, mask, truth["selected_thresh"], truth["clicked_point"], video_fps,
+                    start_frame=0, stats=stats)
+    result["stages_ms"] = {stage: s["mean_ms"] for stage, s in stats.to_dict()["stages"].items()}
+    return result
+
+def run_benchmarks():
+    """
+    Run every benchmark and return {name: result}.
+    """
+    video_file, text_file, track_file, truth = prepare_data()
+    results = {"track_mouse": bench_track_mouse(video_file, truth)}
+
+    result, xy = measure(lambda: load_coordinates(text_file), n_samples)
+    results["load_coordinates_text"] = dict(result, unit="samples")
+    result, _ = measure(lambda: load_coordinates(track_file, "center_cm"), n_samples)
+    results["load_coordinates_track"] = dict(result, unit="samples")
+    result, _ = measure(lambda: np.asarray(load_track(track_file, mmap=False)), n_samples)
+    results["load_track"] = dict(result, unit="samples")
+    result, _ = measure(lambda: load_clean_track(track_file, sampling_rate, "center_cm"), n_samples)
+    results["clean_track"] = dict(result, unit="samples")
+
+    xy = normalize_track(xy, arena_size)
+    result, _ = measure(lambda: cohort_metrics([xy], sampling_rate, arena_size, normalize=False), n_samples)
+    results["open_field_metrics"] = dict(result, unit="samples")
+    result, _ = measure(lambda: streaming_metrics(lambda: iter_track_coordinates(track_file, "center_cm"),
+                                                  sampling_rate, arena_size, normalize=False), n_samples)
+    results["streaming_metrics"] = dict(result, unit="samples")
+
+    use_headless()
+    with tempfile.TemporaryDirectory() as figure_dir:
+        result, _ = measure(lambda: render_track_figures(text_file, figure_dir, sampling_rate, arena_size),
+                            n_samples)
+    results["track_figures"] = dict(result, unit="samples")
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_runs(path):
+    """
+    All earlier runs recorded in the results file, oldest first.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare(results, previous):
+    """
+    Print the throughput of every benchmark next to the previous run, flagging drops larger than
+    regression_tolerance. Returns the names of the regressed benchmarks.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<24}{'items/s':>14}{'previous':>14}{'change':>9}{'peak MB':>10}")
+    for name, r in results.items():
+        old = previous["results"].get(name) if previous else None
+        if old:
+            change = r["per_s"] / old["per_s"] - 1
+            flag = "  REGRESSION" if change < -regression_tolerance else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:<24}{r['per_s']:>14,.0f}{old['per_s']:>14,.0f}{change:>+9.1%}{r['peak_mb']:>10.1f}{flag}")
+        else:
+            print(f"{name:<24}{r['per_s']:>14,.0f}{'-':>14}{'-':>9}{r['peak_mb']:>10.1f}")
+    return regressions
+
+def main(results_file=results_file):
+    """
+    Run the benchmarks, append the run to results_file and compare it with the previous one.
+    """
+    machine = {"platform": platform.platform(), "cpus": os.cpu_count()}
+    # Only runs of the same settings on the same machine are comparable.
+    comparable = [run for run in load_runs(results_file)
+                  if run["settings"] == settings() and run["machine"] == machine]
+    results = run_benchmarks()
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "versions": {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__},
+        "machine": machine,
+        "settings": settings(),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(results_file)), exist_ok=True)
+    with open(results_file, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+    track = results["track_mouse"]
+    if track["mean_error_px"] is not None:
+        print(f"track_mouse: detection rate {track['detection_rate']:.1%}, "
+              f"mean error {track['mean_error_px']:.2f} px from the true center")
+    regressions = compare(results, comparable[-1] if comparable else None)
+    print(f"\nResults appended to {results_file}")
+    if regressions:
+        print(f"Slower than the previous run by more than {regression_tolerance:.0%}: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
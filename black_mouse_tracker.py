@@ -7,18 +7,51 @@ ldu13@jh.edu
 """
 
 import os
+import copy
+import json
+import time
+import queue
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import cv2
 import numpy as np
-%matplotlib qt
 import matplotlib.pyplot as plt
 
+from track_io import TRACK_DTYPE
+from result_cache import ResultCache
+from figures import show_or_save, figure_prefix
+from calibration import (video_date, save_profile, load_profile, find_profile, check_drift, arena_homography,
+                         pixels_to_cm)
+from arena_detection import detect_arena
+from tracker_stats import TrackerStats, NO_STATS, clock
+
 # Directories and camera settings
 video_path = r"G:\OPF_VIDEOS\WIN_20250403_13_54_53_Pro.mp4"  # Full path to your video file
 output_dir = r"G:\OPF_VIDEOS"  # Directory where results will be saved
 sampling_rate = 60  # Desired frame sampling rate (frames per second)
 live_preview = False  # Set to True to enable live tracking preview
+segmentation = "threshold"  # "threshold" (global threshold) or "background" (difference to a median background)
+search_radius = None  # Pixels; set (e.g. 80) to search only around the predicted position
+n_workers = 1  # Set above 1 to track the video in parallel chunks (disables live preview)
+cache_dir = None  # Set to a directory to reuse earlier tracking results of unchanged videos/settings
+figure_dir = None  # Set to a directory to save the tracking preview as PNG instead of showing it
+profile_dir = None  # Set to a directory of calibration profiles to reuse the ROI/threshold of a fixed rig
+rig = "rig1"  # Name of the camera rig, profiles are saved per rig and day
+arena_size_cm = 40  # Side of the open field (cm), for the track in cm and the pixels-per-cm of the profile
+auto_roi = True  # Detect the arena corners automatically; clicking is only needed if the detection is unsure
+min_arena_confidence = 0.8  # Detections below this confidence (0-1) fall back to clicking
 
-os.makedirs(output_dir, exist_ok=True)
+def use_interactive_figures():
+    """
+    Interactive Qt figures for ROI clicking when run from Spyder/IPython; plain Python keeps the
+    default backend.
+    """
+    try:
+        get_ipython().run_line_magic("matplotlib", "qt")
+    except NameError:
+        pass
 
 def select_roi(frame):
     """
@@ -36,6 +69,19 @@ def select_roi(frame):
     print("Selected ROI Coordinates:", roi_coords)
     return roi
 
+def find_roi(video_path, frame):
+    """
+    Detect the arena corners on the median background of the video, or let the user click them
+    (select_roi) if auto_roi is off or the detection is not confident.
+    """
+    if auto_roi:
+        roi, confidence = detect_arena(estimate_background(video_path, n_samples=5))
+        if roi is not None and confidence >= min_arena_confidence:
+            print(f"Detected ROI Coordinates: {roi.tolist()} (confidence {confidence:.2f})")
+            return roi
+        print(f"Arena detection not confident enough ({confidence:.2f}), please click the corners.")
+    return select_roi(frame)
+
 def create_mask(shape, roi):
     """
     Create a binary mask for the ROI.
@@ -66,9 +112,9 @@ def threshold_preview(gray_sample, mask):
             print(f"User clicked at: {clicked_point}")
 
     def on_trackbar(val):
-        masked_sample = cv2.bitwise_and(gray_sample, gray_sample, mask=mask)
-        # Use THRESH_BINARY_INV so the dark mouse becomes white
-        _, thresh = cv2.threshold(masked_sample, val, 255, cv2.THRESH_BINARY_INV)
+        # Use THRESH_BINARY_INV so the dark mouse becomes white, then keep only the ROI
+        _, thresh = cv2.threshold(gray_sample, val, 255, cv2.THRESH_BINARY_INV)
+        thresh = cv2.bitwise_and(thresh, mask)
         preview = cv2.cvtColor(thresh, cv2.COLOR_GRAY2BGR)
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         for cnt in contours:
@@ -99,75 +145,467 @@ def threshold_preview(gray_sample, mask):
     print(f"Selected tracking click point: {clicked_point}")
     return selected_thresh, clicked_point
 
-def track_mouse(video_path, mask, selected_thresh, clicked_point, sampling_rate, live_preview=False):
+def get_frame_interval(video_fps, sampling_rate):
+    """
+    Number of video frames between two processed frames for the desired sampling rate.
+    """
+    if sampling_rate < video_fps:
+        return int(round(video_fps / sampling_rate))
+    return 1
+
+class ThresholdSegmenter:
+    """
+    Segment with one global threshold: pixels darker than thresh become the (white) mouse.
+    """
+    def __init__(self, thresh):
+        self.thresh = thresh
+
+    def __call__(self, gray, offset=(0, 0), dst=None):
+        # Use THRESH_BINARY_INV so that the dark mouse becomes white
+        _, binary = cv2.threshold(gray, self.thresh, 255, cv2.THRESH_BINARY_INV, dst=dst)
+        return binary
+
+class BackgroundSegmenter:
+    """
+    Segment by difference to a background image: pixels darker than the background by more
+    than diff_thresh become the (white) mouse. background is a full-frame grayscale image,
+    e.g. from estimate_background. With learning_rate > 0, the background is slowly updated
+    with the non-mouse pixels of every segmented frame, to follow lighting drift; every frame
+    then depends on all frames before it, so track_mouse_parallel tracks such runs sequentially.
+    """
+    def __init__(self, background, diff_thresh, learning_rate=0.0):
+        self.background = background.astype(np.float32)
+        self.diff_thresh = diff_thresh
+        self.learning_rate = learning_rate
+        self._update_mask = np.empty(background.shape, dtype=np.uint8)
+
+    def __call__(self, gray, offset=(0, 0), dst=None):
+        h, w = gray.shape
+        background = self.background[offset[1]:offset[1] + h, offset[0]:offset[0] + w]
+        # Saturating background - frame, so only pixels darker than the background are kept.
+        diff = cv2.subtract(background, gray, dst=dst, dtype=cv2.CV_8U)
+        _, binary = cv2.threshold(diff, self.diff_thresh, 255, cv2.THRESH_BINARY, dst=diff)
+        if self.learning_rate > 0:
+            update_mask = cv2.bitwise_not(binary, dst=self._update_mask[:h, :w])
+            cv2.accumulateWeighted(gray, background, self.learning_rate, mask=update_mask)
+        return binary
+
+def estimate_background(video_path, n_samples=25, start_frame=10):
+    """
+    Estimate the empty-arena background as the per-pixel median of n_samples grayscale frames
+    spread evenly over the video. Only the sampled frames are held in memory, and the moving
+    mouse is removed by the median.
+    """
+    cap = cv2.VideoCapture(video_path)
+    max_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    samples = []
+    for frame_idx in np.linspace(start_frame, max_frames - 1, n_samples).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(frame_idx))
+        ret, frame = cap.read()
+        if ret:
+            samples.append(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    cap.release()
+    if not samples:
+        raise IOError(f"Could not read from video {video_path}")
+    return np.median(np.stack(samples), axis=0).astype(np.uint8)
+
+def get_roi_crop(mask):
+    """
+    Bounding box (x, y, w, h) of the ROI in the mask and the mask cropped to it.
+    """
+    x, y, w, h = cv2.boundingRect(mask)
+    return (x, y, w, h), mask[y:y + h, x:x + w]
+
+def locate_mouse(gray, mask, selected_thresh, clicked_point, offset=(0, 0), thresh_buf=None, stats=NO_STATS):
+    """
+    Find the mouse in one grayscale frame (or ROI crop, with mask cropped alike).
+    selected_thresh is either a threshold value or a segmenter such as BackgroundSegmenter.
+    offset is the crop's top-left corner, so contours and the returned points are in
+    full-frame coordinates. thresh_buf is an optional preallocated uint8 buffer of the
+    crop size that is reused for the binary image.
+    The time of every step is recorded to stats (a tracker_stats.TrackerStats), and failed
+    searches are counted as "no_contour" or "zero_area".
+    Returns the center, the nose estimate, the mouse contour and the body ellipse
+    (major axis, minor axis, orientation of the major axis in degrees 0-180; None for contours
+    of fewer than 5 points), or (None, None, None, None) if no contour passes the area filter.
+    """
+    segmenter = selected_thresh if callable(selected_thresh) else ThresholdSegmenter(selected_thresh)
+    # Segment the mouse as white, then keep only the ROI
+    t0 = clock()
+    thresh = segmenter(gray, offset, thresh_buf)
+    t1 = clock()
+    stats.add("threshold", t1 - t0)
+    cv2.bitwise_and(thresh, mask, dst=thresh)
+    t0 = clock()
+    stats.add("bitwise_and", t0 - t1)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+    valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 100]
+    t1 = clock()
+    stats.add("find_contours", t1 - t0)
+    if not valid_contours:
+        stats.count("no_contour")
+        return None, None, None, None
+
+    # Use absolute distance to select the contour closest to the clicked point.
+    mouse_contour = min(valid_contours, key=lambda cnt: abs(cv2.pointPolygonTest(cnt, clicked_point, True)))
+    t0 = clock()
+    stats.add("point_polygon_test", t0 - t1)
+    M = cv2.moments(mouse_contour)
+    t1 = clock()
+    stats.add("moments", t1 - t0)
+    if M["m00"] == 0:
+        stats.count("zero_area")
+        return None, None, None, None
+
+    cx = int(M["m10"] / M["m00"])
+    cy = int(M["m01"] / M["m00"])
+    center = (cx, cy)
+
+    # Estimate nose location using an ellipse fit if enough points are present.
+    if len(mouse_contour) >= 5:
+        (x, y), (MA, ma), angle = cv2.fitEllipse(mouse_contour)
+        stats.add("fit_ellipse", clock() - t1)
+        # fitEllipse gives the first axis at angle; report the major axis and its orientation.
+        if MA >= ma:
+            ellipse = (MA, ma, angle % 180)
+        else:
+            ellipse = (ma, MA, (angle + 90) % 180)
+        # The nose is at one end of the major axis; a single frame only has the shape to tell which.
+        nose_est = nose_point(center, ellipse, skew_direction(M, ellipse[2]))
+    else:
+        nose_est = center
+        ellipse = None
+    return center, nose_est, mouse_contour, ellipse
+
+def skew_direction(M, orientation):
+    """
+    Unit vector along the body axis (orientation in degrees) pointing to the end the contour is
+    skewed toward (third central moment of its area along the axis). The tapered head side of a
+    mouse draws the skew, so this is the head guess of a single frame; a tail in the contour pulls
+    the other way, and FrameTracker settles head versus tail from the movement.
+    """
+    ux, uy = np.cos(np.radians(orientation)), np.sin(np.radians(orientation))
+    skew = M["mu30"] * ux**3 + 3 * M["mu21"] * ux**2 * uy + 3 * M["mu12"] * ux * uy**2 + M["mu03"] * uy**3
+    return (ux, uy) if skew >= 0 else (-ux, -uy)
+
+def nose_point(center, ellipse, direction):
+    """
+    Nose estimate: the end of the ellipse's major axis from center in direction (unit vector).
+    """
+    half = ellipse[0] / 2
+    return (int(round(center[0] + direction[0] * half)), int(round(center[1] + direction[1] * half)))
+
+def predict_position(recent_centers):
+    """
+    Constant-velocity prediction of the next center from the last two tracked centers.
+    """
+    if len(recent_centers) == 1:
+        return recent_centers[-1]
+    (x1, y1), (x2, y2) = recent_centers[-2:]
+    return (2 * x2 - x1, 2 * y2 - y1)
+
+def locate_mouse_in_window(gray, mask, selected_thresh, predicted, search_radius, offset, thresh_buf,
+                           stats=NO_STATS):
+    """
+    Look for the mouse only in a square window of half-size search_radius around the
+    predicted position. gray, mask and thresh_buf are the ROI crop at offset.
+    Returns the same as locate_mouse; the mouse counts as lost (None) if no contour is found
+    or the chosen contour is cut by the window edge. Every loss is counted as "window_lost" in stats.
+    """
+    h, w = gray.shape
+    px, py = predicted[0] - offset[0], predicted[1] - offset[1]
+    wx0, wy0 = max(px - search_radius, 0), max(py - search_radius, 0)
+    wx1, wy1 = min(px + search_radius, w), min(py + search_radius, h)
+    if wx1 <= wx0 or wy1 <= wy0:
+        stats.count("window_lost")
+        return None, None, None, None
+
+    center, nose_est, mouse_contour, ellipse = locate_mouse(
+        gray[wy0:wy1, wx0:wx1], mask[wy0:wy1, wx0:wx1], selected_thresh, predicted,
+        offset=(offset[0] + wx0, offset[1] + wy0), thresh_buf=thresh_buf[:wy1 - wy0, :wx1 - wx0], stats=stats)
+    if mouse_contour is None:
+        stats.count("window_lost")
+        return None, None, None, None
+
+    # A blob touching a window edge inside the ROI crop is only partly visible.
+    bx, by, bw, bh = cv2.boundingRect(mouse_contour)
+    bx, by = bx - offset[0], by - offset[1]
+    if ((bx <= wx0 and wx0 > 0) or (by <= wy0 and wy0 > 0) or
+            (bx + bw >= wx1 and wx1 < w) or (by + bh >= wy1 and wy1 < h)):
+        stats.count("window_lost")
+        return None, None, None, None
+    return center, nose_est, mouse_contour, ellipse
+
+class FrameTracker:
+    """
+    Finds the mouse frame by frame in the ROI bounding box of a mask, with buffers reused
+    across frames. If search_radius is set, each frame is first searched only in a window
+    around the position predicted from the last two centers; when the mouse is lost there,
+    the whole arena is searched around the last known center.
+    The nose is put at the end of the body axis the mouse moves toward; while it moves less than
+    heading_min_motion_px between frames, at the end closest to the previous head direction.
+    Stage times and the "processed", "detected" and "missed" frame counts go to stats.
+    """
+    heading_min_motion_px = 2.0
+
+    def __init__(self, mask, selected_thresh, clicked_point, search_radius=None, stats=NO_STATS):
+        (self.roi_x, self.roi_y, self.roi_w, self.roi_h), self.mask_crop = get_roi_crop(mask)
+        self.selected_thresh = selected_thresh
+        self.clicked_point = clicked_point
+        self.search_radius = search_radius
+        self.stats = stats
+        self.gray_buf = np.empty((self.roi_h, self.roi_w), dtype=np.uint8)
+        self.thresh_buf = np.empty((self.roi_h, self.roi_w), dtype=np.uint8)
+        self.recent_centers = []
+        self.last_center = clicked_point
+        self.head_direction = None  # Unit vector from the center to the nose in the last frame
+
+    def crop_gray(self, frame):
+        """
+        Grayscale ROI crop of a BGR frame, converted into the reused buffer.
+        """
+        x, y, w, h = self.roi_x, self.roi_y, self.roi_w, self.roi_h
+        start = clock()
+        gray = cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY, dst=self.gray_buf)
+        self.stats.add("convert", clock() - start)
+        return gray
+
+    def locate(self, gray):
+        """
+        Find the mouse in a grayscale ROI crop (from crop_gray) and update the search state.
+        Returns the same as locate_mouse, in full-frame coordinates.
+        """
+        start = clock()
+        stats = self.stats
+        offset = (self.roi_x, self.roi_y)
+        center = None
+        if self.search_radius and self.recent_centers:
+            center, nose_est, mouse_contour, ellipse = locate_mouse_in_window(
+                gray, self.mask_crop, self.selected_thresh, predict_position(self.recent_centers),
+                self.search_radius, offset=offset, thresh_buf=self.thresh_buf, stats=stats)
+        if center is None:
+            # Whole-arena search, around the last known center when predicting.
+            reference = self.last_center if self.search_radius else self.clicked_point
+            center, nose_est, mouse_contour, ellipse = locate_mouse(
+                gray, self.mask_crop, self.selected_thresh, reference, offset=offset, thresh_buf=self.thresh_buf,
+                stats=stats)
+        if center is None:
+            self.recent_centers = []
+            stats.count("missed")
+        else:
+            if ellipse is not None:
+                nose_est = self.orient_nose(center, ellipse, nose_est)
+            self.recent_centers = self.recent_centers[-1:] + [center]
+            self.last_center = center
+            stats.count("detected")
+        stats.count("processed")
+        stats.add("frame", clock() - start)
+        return center, nose_est, mouse_contour, ellipse
+
+    def orient_nose(self, center, ellipse, nose_est):
+        """
+        Put the nose at the end of the major axis ahead of the movement from the previous frame,
+        or, when the mouse (nearly) stands still, the end closest to the previous head direction;
+        the shape-based guess of locate_mouse is only used without either.
+        """
+        angle = np.radians(ellipse[2])
+        axis = np.array([np.cos(angle), np.sin(angle)])
+        reference = None
+        if self.recent_centers:
+            motion = np.subtract(center, self.recent_centers[-1], dtype=np.float64)
+            if np.hypot(*motion) >= self.heading_min_motion_px:
+                reference = motion
+        if reference is None:
+            reference = self.head_direction if self.head_direction is not None else np.subtract(nose_est, center)
+        if np.dot(axis, reference) < 0:
+            axis = -axis
+        self.head_direction = axis
+        return nose_point(center, ellipse, axis)
+
+def warm_up_tracker(frame_tracker, video_path, start_frame, end_frame, frame_interval):
+    """
+    Run frame_tracker over the sampled frames in [start_frame, end_frame) without recording
+    anything to its stats, so that it reaches end_frame with the search window, last center and
+    head direction a run from start_frame has there.
+    """
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    stats, frame_tracker.stats = frame_tracker.stats, NO_STATS
+    try:
+        for frame_idx in range(start_frame, end_frame):
+            if (frame_idx - start_frame) % frame_interval != 0:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frame_tracker.locate(frame_tracker.crop_gray(frame))
+    finally:
+        frame_tracker.stats = stats
+        cap.release()
+
+class FramePrefetcher:
+    """
+    Reader thread that decodes the sampled frames of an open capture and converts their ROI crop
+    to grayscale into a ring buffer of n_slots preallocated images, while the caller processes
+    earlier frames. OpenCV releases the GIL while decoding and converting, so reading and
+    tracking overlap. The reader blocks when all slots are full.
+    The reader records the grab, decode and convert stages to stats, the caller the time spent
+    waiting for frames.
+    """
+    def __init__(self, cap, roi_box, frame_interval, start_frame, max_frames, n_slots=8, stats=NO_STATS):
+        self.cap = cap
+        self.roi_box = roi_box
+        self.frame_interval = frame_interval
+        self.start_frame = start_frame
+        self.max_frames = max_frames
+        x, y, w, h = roi_box
+        self.slots = np.empty((n_slots, h, w), dtype=np.uint8)
+        self.free = queue.Queue()
+        for slot in range(n_slots):
+            self.free.put(slot)
+        self.ready = queue.Queue()
+        self.stats = stats
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._read_loop, daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        x, y, w, h = self.roi_box
+        stats = self.stats
+        frame_idx = self.start_frame
+        try:
+            while frame_idx < self.max_frames and not self._stop.is_set():
+                decode_start = clock()
+                # Frames outside the sampling interval are only grabbed, never decoded to BGR.
+                if (frame_idx - self.start_frame) % self.frame_interval != 0:
+                    ret = self.cap.grab()
+                    stats.add("grab", clock() - decode_start)
+                    if not ret:
+                        break
+                    frame_idx += 1
+                    continue
+                ret, frame = self.cap.read()
+                stats.add("decode", clock() - decode_start)
+                if not ret:
+                    break
+                slot = self.free.get()
+                if slot is None:  # Closed by the caller
+                    break
+                convert_start = clock()
+                cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY, dst=self.slots[slot])
+                stats.add("convert", clock() - convert_start)
+                self.ready.put((frame_idx, slot))
+                frame_idx += 1
+        finally:
+            self.ready.put(None)
+
+    def frames(self):
+        """
+        Yield (frame index, grayscale ROI crop) in order. A crop is only valid until the next
+        one is requested, as its slot is then handed back to the reader.
+        """
+        while True:
+            wait_start = clock()
+            item = self.ready.get()
+            self.stats.add("wait", clock() - wait_start)
+            if item is None:
+                return
+            frame_idx, slot = item
+            yield frame_idx, self.slots[slot]
+            self.free.put(slot)
+
+    def close(self):
+        """
+        Stop the reader thread (also when the caller stopped early) and wait for it.
+        """
+        self._stop.set()
+        self.free.put(None)
+        self._thread.join()
+
+def track_mouse(video_path, mask, selected_thresh, clicked_point, sampling_rate, live_preview=False,
+                start_frame=10, end_frame=None, search_radius=None, prefetch=8, stats=None, warmup_start=None):
     """
-    Track the mouse over the video using the selected threshold and click point.
+    Track the mouse over the video using the selected threshold (or segmenter) and click point.
     The sampling_rate determines how many frames per second are processed by skipping frames as needed.
     For each processed frame, the contour closest to the clicked point is chosen,
-    and both the center and a nose estimate (via ellipse fit) are computed.
+    and the center, a nose estimate and the body ellipse (via ellipse fit) are computed.
     If live_preview is True, the tracking is shown in real time.
+    Only the ROI bounding box of each frame is converted and segmented, into reused buffers.
+    Frames skipped by the sampling interval are grabbed without being decoded to an image.
+    Only frames in [start_frame, end_frame) are tracked; end_frame=None runs to the end of the video.
+    With warmup_start (a sampled frame before start_frame), the tracker is first run over the frames
+    from there without returning or recording them (see warm_up_tracker), to pick up the mouse's
+    recent positions and head direction as a run from warmup_start would.
+    If search_radius is set, each frame is first searched only in a window around the position
+    predicted from the last two centers, choosing the contour closest to the prediction; when
+    the mouse is lost there, the whole arena is searched around the last known center.
+    With prefetch > 0 (and no live preview), frames are decoded and converted by a FramePrefetcher
+    thread with a ring buffer of that many frames, overlapping with the tracking.
+    The time of every stage and the detection counts are recorded to stats (a new
+    tracker_stats.TrackerStats if None, else the given one is filled in) and printed at the end.
     """
     cap = cv2.VideoCapture(video_path)
     video_fps = cap.get(cv2.CAP_PROP_FPS)
     print(f"Video FPS: {video_fps}")
     # Calculate frame interval based on the desired sampling rate.
-    if sampling_rate < video_fps:
-        frame_interval = int(round(video_fps / sampling_rate))
-    else:
-        frame_interval = 1
+    frame_interval = get_frame_interval(video_fps, sampling_rate)
 
     max_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    start_frame = 10  # starting from frame 10
+    if end_frame is not None:
+        max_frames = min(max_frames, end_frame)
     cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
     tracked_points = []
     frame_idx = start_frame
 
-    while frame_idx < max_frames:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        # Process only frames that match the sampling interval.
-        if (frame_idx - start_frame) % frame_interval != 0:
-            frame_idx += 1
-            continue
+    # Work on the ROI bounding box only, with buffers reused across frames.
+    if stats is None:
+        stats = TrackerStats()
+    frame_tracker = FrameTracker(mask, selected_thresh, clicked_point, search_radius, stats)
+    if warmup_start is not None and warmup_start < start_frame:
+        warm_up_tracker(frame_tracker, video_path, warmup_start, start_frame, frame_interval)
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        masked_gray = cv2.bitwise_and(gray, gray, mask=mask)
-        # Use THRESH_BINARY_INV so that the dark mouse becomes white
-        _, thresh = cv2.threshold(masked_gray, selected_thresh, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        valid_contours = [cnt for cnt in contours if cv2.contourArea(cnt) > 100]
-        if not valid_contours:
-            tracked_points.append({"center": None, "nose": None})
-            frame_idx += 1
-            continue
+    if prefetch and not live_preview:
+        roi_box = (frame_tracker.roi_x, frame_tracker.roi_y, frame_tracker.roi_w, frame_tracker.roi_h)
+        prefetcher = FramePrefetcher(cap, roi_box, frame_interval, start_frame, max_frames, prefetch, stats)
+        try:
+            for frame_idx, gray in prefetcher.frames():
+                center, nose_est, mouse_contour, ellipse = frame_tracker.locate(gray)
+                tracked_points.append({"frame": frame_idx, "time": frame_idx / video_fps,
+                                       "center": center, "nose": nose_est, "ellipse": ellipse})
+        finally:
+            prefetcher.close()
+            cap.release()
+        stats.stop()
+        print(stats.summary())
+        return tracked_points
 
-        # Use absolute distance to select the contour closest to the clicked point.
-        mouse_contour = min(valid_contours, key=lambda cnt: abs(cv2.pointPolygonTest(cnt, clicked_point, True)))
-        M = cv2.moments(mouse_contour)
-        if M["m00"] == 0:
-            tracked_points.append({"center": None, "nose": None})
+    while frame_idx < max_frames:
+        decode_start = clock()
+        # Frames outside the sampling interval are only grabbed: the decoder advances,
+        # but the frame is never retrieved and converted to BGR.
+        if (frame_idx - start_frame) % frame_interval != 0:
+            ret = cap.grab()
+            stats.add("grab", clock() - decode_start)
+            if not ret:
+                break
             frame_idx += 1
             continue
 
-        cx = int(M["m10"] / M["m00"])
-        cy = int(M["m01"] / M["m00"])
-        center = (cx, cy)
-
-        # Estimate nose location using an ellipse fit if enough points are present.
-        if len(mouse_contour) >= 5:
-            (x, y), (MA, ma), angle = cv2.fitEllipse(mouse_contour)
-            vec = np.array([np.cos(np.radians(angle)), np.sin(np.radians(angle))])
-            nose_est = (int(cx + vec[0] * ma / 2), int(cy + vec[1] * ma / 2))
-        else:
-            nose_est = center
+        ret, frame = cap.read()
+        stats.add("decode", clock() - decode_start)
+        if not ret:
+            break
 
-        tracked_points.append({"center": center, "nose": nose_est})
+        gray = frame_tracker.crop_gray(frame)
+        center, nose_est, mouse_contour, ellipse = frame_tracker.locate(gray)
+        tracked_points.append({"frame": frame_idx, "time": frame_idx / video_fps,
+                               "center": center, "nose": nose_est, "ellipse": ellipse})
 
         # Optionally show a live preview of tracking.
-        if live_preview:
-            frame_preview = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+        if live_preview and mouse_contour is not None:
+            frame_preview = cv2.cvtColor(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR)
             cv2.drawContours(frame_preview, [mouse_contour], -1, (255, 255, 255), 1)
             cv2.circle(frame_preview, center, 4, (0, 255, 0), -1)
             cv2.circle(frame_preview, nose_est, 3, (0, 0, 255), -1)
@@ -182,13 +620,199 @@ def track_mouse(video_path, mask, selected_thresh, clicked_point, sampling_rate,
     cap.release()
     if live_preview:
         cv2.destroyWindow("Live Tracking")
+    stats.stop()
+    print(stats.summary())
     return tracked_points
 
-def save_tracking_results(output_dir, tracked_points):
+def track_arenas(video_path, arenas, sampling_rate, start_frame=10, end_frame=None, search_radius=None,
+                 n_threads=1, prefetch=8, stats=None, arena_stats=None):
+    """
+    Track one mouse in each of several arenas filmed in the same video, decoding every frame once.
+    arenas is a list of (mask, selected_thresh, clicked_point), one per arena, with full-frame masks.
+    A FramePrefetcher thread decodes the sampled frames and converts the bounding box of all ROIs to
+    grayscale; every arena is then searched in its own crop of it by its own FrameTracker, in
+    n_threads threads if n_threads > 1 (OpenCV releases the GIL while segmenting).
+    The shared work is recorded once, to stats (a new TrackerStats if None): the decoding stages,
+    the time to process each frame in all arenas ("frame") and the "processed" frame count. The
+    segmentation stages and detection counts of each arena go to its own entry of arena_stats (a
+    list of TrackerStats, one per arena, filled in; new ones if None).
+    Returns one tracked_points list per arena, each the same as track_mouse gives for that arena.
+    """
+    cap = cv2.VideoCapture(video_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    print(f"Video FPS: {video_fps}, {len(arenas)} arenas")
+    frame_interval = get_frame_interval(video_fps, sampling_rate)
+    max_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    if end_frame is not None:
+        max_frames = min(max_frames, end_frame)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    if stats is None:
+        stats = TrackerStats()
+    # Separate stats per arena, so that the threads never record to the same one.
+    if arena_stats is None:
+        arena_stats = [TrackerStats() for _ in arenas]
+    trackers = [FrameTracker(mask, selected_thresh, clicked_point, search_radius, s)
+                for (mask, selected_thresh, clicked_point), s in zip(arenas, arena_stats)]
+    x0 = min(t.roi_x for t in trackers)
+    y0 = min(t.roi_y for t in trackers)
+    x1 = max(t.roi_x + t.roi_w for t in trackers)
+    y1 = max(t.roi_y + t.roi_h for t in trackers)
+    crops = [(slice(t.roi_y - y0, t.roi_y - y0 + t.roi_h), slice(t.roi_x - x0, t.roi_x - x0 + t.roi_w))
+             for t in trackers]
+
+    tracks = [[] for _ in arenas]
+    prefetcher = FramePrefetcher(cap, (x0, y0, x1 - x0, y1 - y0), frame_interval, start_frame, max_frames,
+                                 max(prefetch, 1), stats)
+    pool = ThreadPoolExecutor(max_workers=n_threads) if n_threads > 1 else None
+    try:
+        for frame_idx, gray in prefetcher.frames():
+            start = clock()
+            if pool is None:
+                results = [t.locate(gray[crop]) for t, crop in zip(trackers, crops)]
+            else:
+                results = list(pool.map(lambda t, crop: t.locate(gray[crop]), trackers, crops))
+            stats.count("processed")
+            stats.add("frame", clock() - start)
+            frame_time = frame_idx / video_fps
+            for points, (center, nose_est, _, ellipse) in zip(tracks, results):
+                points.append({"frame": frame_idx, "time": frame_time, "center": center, "nose": nose_est,
+                               "ellipse": ellipse})
+    finally:
+        prefetcher.close()
+        cap.release()
+        if pool is not None:
+            pool.shutdown()
+    stats.stop()
+    print(stats.summary())
+    for i, s in enumerate(arena_stats):
+        s.stop()
+        print(f"Arena {i + 1}:\n{s.summary()}")
+    return tracks
+
+def arena_video_path(video_path, arena_index):
+    """
+    Name under which the results of one arena of a multi-arena video are saved:
+    <video>_arena<n><ext>, n counting from 1, so every arena gets its own set of output files.
+    """
+    root, ext = os.path.splitext(video_path)
+    return f"{root}_arena{arena_index + 1}{ext}"
+
+def _track_chunk(args):
+    """
+    Pool worker: track one frame range of the video with its own capture.
+    Returns the tracked points and the TrackerStats of the chunk.
+    """
+    video_path, mask, selected_thresh, clicked_point, sampling_rate, start, end, search_radius, warmup_start = args
+    cv2.setNumThreads(1)  # One OpenCV thread per process; the pool provides the parallelism.
+    stats = TrackerStats()
+    points = track_mouse(video_path, mask, selected_thresh, clicked_point, sampling_rate,
+                         live_preview=False, start_frame=start, end_frame=end, search_radius=search_radius,
+                         stats=stats, warmup_start=warmup_start)
+    return points, stats
+
+def get_chunk_ranges(video_path, sampling_rate, n_chunks, start_frame=10):
+    """
+    Split the tracked frame range into n_chunks (start, end) ranges.
+    Every chunk starts on a sampled frame, so each chunk processes exactly the frames
+    the sequential run would.
+    """
+    cap = cv2.VideoCapture(video_path)
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
+    max_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    frame_interval = get_frame_interval(video_fps, sampling_rate)
+
+    sampled_frames = np.arange(start_frame, max_frames, frame_interval)
+    if len(sampled_frames) == 0:
+        return [(start_frame, max_frames)]
+    chunk_starts = [int(part[0]) for part in np.array_split(sampled_frames, n_chunks) if len(part)]
+    chunk_ends = chunk_starts[1:] + [max_frames]
+    return list(zip(chunk_starts, chunk_ends))
+
+def track_mouse_parallel(video_path, mask, selected_thresh, clicked_point, sampling_rate,
+                         n_workers=None, start_frame=10, search_radius=None, stats=None, warmup_frames=60):
+    """
+    Track the mouse like track_mouse, but split the video into frame chunks that are
+    decoded and tracked in separate processes. The per-chunk results are stitched back
+    in frame order. Every chunk after the first is warmed up on the warmup_frames sampled
+    frames before it (see warm_up_tracker), so its tracker carries the history the sequential
+    run has at that frame: the last centers (search window and nearest-contour choice) and the
+    head direction of the nose estimate. The results then equal the sequential run's, with
+    these caveats:
+    - a warm-up starts from the clicked point, not from the sequential run's last center, so
+      if the mouse was lost, another blob was closer to the clicked point, or the mouse did
+      not move by FrameTracker.heading_min_motion_px between two frames during the whole
+      warm-up, a chunk's first frames can still differ (the center or a nose on the tail);
+    - a BackgroundSegmenter with learning_rate > 0 cannot be split, as every chunk would start
+      again from the initial background; the video is then tracked by track_mouse instead.
+    verify_parallel_tracking checks a video for these cases.
+    The stats of all chunks are merged into stats (a new TrackerStats if None) and printed;
+    warm-up frames are not recorded.
+    """
+    if stats is None:
+        stats = TrackerStats()
+    if isinstance(selected_thresh, BackgroundSegmenter) and selected_thresh.learning_rate > 0:
+        print("The background adapts from frame to frame (learning_rate > 0): tracking sequentially")
+        return track_mouse(video_path, mask, selected_thresh, clicked_point, sampling_rate,
+                           start_frame=start_frame, search_radius=search_radius, stats=stats)
+    n_workers = n_workers or os.cpu_count() or 1
+    chunks = get_chunk_ranges(video_path, sampling_rate, n_workers, start_frame)
+    cap = cv2.VideoCapture(video_path)
+    frame_interval = get_frame_interval(cap.get(cv2.CAP_PROP_FPS), sampling_rate)
+    cap.release()
+    # Chunk starts are sampled frames, so stepping back whole intervals stays on the sampled grid.
+    jobs = [(video_path, mask, selected_thresh, clicked_point, sampling_rate, start, end, search_radius,
+             max(start_frame, start - warmup_frames * frame_interval))
+            for start, end in chunks]
+    # Spawned, not forked: a child forked while OpenCV's own threads hold a lock can hang.
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        chunk_results = list(pool.map(_track_chunk, jobs))
+    for _, chunk_stats in chunk_results:
+        stats.merge(chunk_stats)
+    stats.stop()
+    print(f"All {len(chunks)} chunks:\n{stats.summary()}")
+    return [pt for points, _ in chunk_results for pt in points]
+
+def verify_parallel_tracking(video_path, mask, selected_thresh, clicked_point, sampling_rate, n_workers=None,
+                             search_radius=None):
     """
-    Save the tracked nose and body (center) coordinates into text files.
+    Run the sequential and the chunked parallel tracker on the same video and check
+    that they produce identical tracked_points. Prints both run times and the first mismatch.
+    Each run gets its own copy of selected_thresh, as an adaptive BackgroundSegmenter changes its
+    background while tracking. Returns True if the outputs are identical.
+    """
+    start = time.perf_counter()
+    sequential = track_mouse(video_path, mask, copy.deepcopy(selected_thresh), clicked_point, sampling_rate,
+                             search_radius=search_radius)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = track_mouse_parallel(video_path, mask, copy.deepcopy(selected_thresh), clicked_point, sampling_rate,
+                                    n_workers, search_radius=search_radius)
+    parallel_time = time.perf_counter() - start
+
+    print(f"Sequential: {len(sequential)} frames in {sequential_time:.1f} s")
+    print(f"Parallel:   {len(parallel)} frames in {parallel_time:.1f} s "
+          f"(speedup {sequential_time / parallel_time:.2f}x)")
+    if len(sequential) != len(parallel):
+        print(f"Mismatch: {len(sequential)} sequential vs {len(parallel)} parallel frames")
+        return False
+    for i, (seq_pt, par_pt) in enumerate(zip(sequential, parallel)):
+        if seq_pt != par_pt:
+            print(f"Mismatch at processed frame {i}: {seq_pt} vs {par_pt}")
+            return False
+    print("Parallel tracking matches the sequential run.")
+    return True
+
+def save_tracking_results(output_dir, tracked_points, video_path=None, homography=None):
+    """
+    Save the tracked nose and body (center) coordinates into text files, and all processed
+    frames into a binary track file (see save_track_array), in cm if a homography is given.
     The files are named using the base name of the processed video.
     """
+    if video_path is None:
+        video_path = globals()["video_path"]
     video_basename = os.path.splitext(os.path.basename(video_path))[0]
     nose_points = [f"{pt['nose'][0]:.5f} {pt['nose'][1]:.5f}" for pt in tracked_points if pt["nose"]]
     body_points = [f"{pt['center'][0]:.5f} {pt['center'][1]:.5f}" for pt in tracked_points if pt["center"]]
@@ -199,12 +823,165 @@ def save_tracking_results(output_dir, tracked_points):
         f.write("\n".join(nose_points))
     with open(body_file, 'w') as f:
         f.write("\n".join(body_points))
+    track_file = save_track_array(output_dir, tracked_points, video_path, homography)
     print(f"Tracking complete for {video_basename}. Results saved to:")
-    print(f"  {nose_file}\n  {body_file}")
+    print(f"  {nose_file}\n  {body_file}\n  {track_file}")
+
+def save_tracking_stats(output_dir, stats, video_path):
+    """
+    Save the stage timings and counters of a tracking run as tracking_stats_<video>.json.
+    """
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    return stats.save_json(os.path.join(output_dir, f"tracking_stats_{video_basename}.json"))
+
+def tracked_points_to_array(tracked_points, homography=None):
+    """
+    Convert tracked_points into a structured array with the track_io.TRACK_DTYPE fields.
+    Frames without a detection are kept, with valid = False and NaN coordinates.
+    The cm coordinates are filled in from the pixel ones if a homography is given (else NaN).
+    The body ellipse is NaN where it was not fitted (and in results tracked before it was kept).
+    """
+    track = np.zeros(len(tracked_points), dtype=TRACK_DTYPE)
+    track["frame"] = [pt["frame"] for pt in tracked_points]
+    track["time"] = [pt["time"] for pt in tracked_points]
+    track["valid"] = [pt["center"] is not None for pt in tracked_points]
+    track["center"] = [pt["center"] or (np.nan, np.nan) for pt in tracked_points]
+    track["nose"] = [pt["nose"] or (np.nan, np.nan) for pt in tracked_points]
+    track["ellipse"] = [pt.get("ellipse") or (np.nan, np.nan, np.nan) for pt in tracked_points]
+    if homography is None:
+        track["center_cm"] = np.nan
+        track["nose_cm"] = np.nan
+    else:
+        track["center_cm"] = pixels_to_cm(track["center"], homography)
+        track["nose_cm"] = pixels_to_cm(track["nose"], homography)
+    return track
+
+def save_track_array(output_dir, tracked_points, video_path, homography=None):
+    """
+    Save all processed frames (frame index, timestamp, center, nose, validity, body ellipse, and
+    with a homography the center and nose in cm) as a binary track_<video>.npy file; read it back
+    with track_io.load_track or track_io.load_coordinates.
+    """
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    track_file = os.path.join(output_dir, f"track_{video_basename}.npy")
+    np.save(track_file, tracked_points_to_array(tracked_points, homography))
+    return track_file
+
+def save_tracking_config(output_dir, video_path, roi, selected_thresh, clicked_point, sampling_rate,
+                         arena_size_cm=None):
+    """
+    Save the ROI, threshold and click point (and the arena side in cm, if known) chosen for a video as JSON,
+    so the same session can be re-tracked headless (see batch_tracker.py).
+    For a BackgroundSegmenter, the background image is saved next to it as PNG.
+    """
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    config = {
+        "video_path": video_path,
+        "roi": np.asarray(roi).tolist(),
+        "clicked_point": [int(clicked_point[0]), int(clicked_point[1])],
+        "sampling_rate": sampling_rate,
+    }
+    if arena_size_cm:
+        config["arena_size_cm"] = arena_size_cm
+    if isinstance(selected_thresh, BackgroundSegmenter):
+        background_file = f"background_{video_basename}.png"
+        cv2.imwrite(os.path.join(output_dir, background_file), selected_thresh.background.astype(np.uint8))
+        config.update(segmentation="background", selected_thresh=int(selected_thresh.diff_thresh),
+                      background=background_file, learning_rate=selected_thresh.learning_rate)
+    else:
+        config.update(segmentation="threshold", selected_thresh=int(selected_thresh))
+    config_file = os.path.join(output_dir, f"tracking_config_{video_basename}.json")
+    with open(config_file, 'w') as f:
+        json.dump(config, f, indent=2)
+    print(f"Tracking config saved to: {config_file}")
+    return config_file
+
+def load_tracking_config(config_file):
+    """
+    Load a tracking config written by save_tracking_config.
+    Returns the ROI (np.int32 array), threshold (or BackgroundSegmenter), click point
+    and the full config dict.
+    """
+    with open(config_file, 'r') as f:
+        config = json.load(f)
+    roi = np.array(config["roi"], dtype=np.int32)
+    clicked_point = tuple(int(v) for v in config["clicked_point"])
+    selected_thresh = int(config["selected_thresh"])
+    if config.get("segmentation") == "background":
+        background_file = os.path.join(os.path.dirname(config_file), config["background"])
+        background = cv2.imread(background_file, cv2.IMREAD_GRAYSCALE)
+        if background is None:
+            raise IOError(f"Could not read background image {background_file}")
+        selected_thresh = BackgroundSegmenter(background, selected_thresh, config.get("learning_rate", 0.0))
+    return roi, selected_thresh, clicked_point, config
+
+def save_calibration_profile(profile_dir, rig, video_path, roi, selected_thresh, clicked_point, sampling_rate,
+                             arena_size_cm=40.0):
+    """
+    Save the ROI/threshold/click choices of a video as the calibration profile of its rig and
+    recording day, with the median background of the video as drift reference.
+    """
+    reference = estimate_background(video_path, n_samples=9)
+    if isinstance(selected_thresh, BackgroundSegmenter):
+        return save_profile(profile_dir, rig, video_date(video_path), reference, roi, selected_thresh.diff_thresh,
+                            clicked_point, sampling_rate, arena_size_cm, "background", selected_thresh.learning_rate)
+    return save_profile(profile_dir, rig, video_date(video_path), reference, roi, selected_thresh, clicked_point,
+                        sampling_rate, arena_size_cm)
+
+def config_from_profile(profile_file, video_path):
+    """
+    Set up a video from a calibration profile instead of interactively: the video background is
+    compared with the profile reference, and the ROI and click seed are moved by a small camera shift.
+    Returns the same (roi, selected_thresh, clicked_point, config) as load_tracking_config, with the
+    drift report in config["drift"]. Raises ValueError if the video drifted beyond correction.
+    """
+    profile = load_profile(profile_file)
+    background = estimate_background(video_path, n_samples=9)
+    roi, clicked_point, drift = check_drift(profile, background)
+    if drift["status"] == "drifted":
+        raise ValueError(f"{video_path} drifted from calibration {profile_file}: {drift['reason']}")
+    selected_thresh = profile["selected_thresh"]
+    if profile["segmentation"] == "background":
+        selected_thresh = BackgroundSegmenter(estimate_background(video_path), selected_thresh,
+                                              profile["learning_rate"])
+    config = {
+        "video_path": video_path,
+        "roi": roi.tolist(),
+        "clicked_point": list(clicked_point),
+        "sampling_rate": profile["sampling_rate"],
+        "segmentation": profile["segmentation"],
+        "selected_thresh": profile["selected_thresh"],
+        "arena_size_cm": profile["arena_size_cm"],
+        "px_per_cm": profile["px_per_cm"],
+        "profile": profile_file,
+        "drift": drift,
+    }
+    return roi, selected_thresh, clicked_point, config
+
+def tracking_params(roi, selected_thresh, clicked_point, sampling_rate, search_radius=None, start_frame=10):
+    """
+    Every setting that determines the output of track_mouse, as a JSON-compatible dict
+    for result cache keys. A background image is represented by its hash.
+    """
+    params = {
+        "roi": np.asarray(roi).tolist(),
+        "clicked_point": [int(clicked_point[0]), int(clicked_point[1])],
+        "sampling_rate": sampling_rate,
+        "search_radius": search_radius,
+        "start_frame": start_frame,
+    }
+    if isinstance(selected_thresh, BackgroundSegmenter):
+        params.update(segmentation="background", selected_thresh=selected_thresh.diff_thresh,
+                      learning_rate=selected_thresh.learning_rate,
+                      background=hashlib.sha256(selected_thresh.background.tobytes()).hexdigest())
+    else:
+        params.update(segmentation="threshold", selected_thresh=int(selected_thresh))
+    return params
 
-def tracking_preview(gray_frame, tracked_points, roi):
+def tracking_preview(gray_frame, tracked_points, roi, figure_dir=None, name="tracking_preview"):
     """
-    Display a final preview of the tracking overlaid on the first frame.
+    Display a final preview of the tracking overlaid on the first frame,
+    or save it to figure_dir/<name>.png if figure_dir is set.
     """
     preview = cv2.cvtColor(gray_frame, cv2.COLOR_GRAY2RGB)
     for pt in tracked_points[:300:20]:
@@ -213,17 +990,45 @@ def tracking_preview(gray_frame, tracked_points, roi):
         if pt["nose"]:
             cv2.circle(preview, pt["nose"], 3, (0, 0, 255), -1)
     cv2.polylines(preview, [roi], isClosed=True, color=(255, 255, 0), thickness=2)
+    fig = plt.figure()
     plt.imshow(preview)
     plt.title("Tracking Preview (Green: Body, Red: Nose, Yellow: ROI)")
     plt.axis("off")
-    plt.show()
+    show_or_save({"preview": fig}, figure_dir, name)
+
+def calibrate_interactively(frame):
+    """
+    Detect (or let the user select) the ROI, then let the user choose the threshold and mouse blob
+    in the threshold preview. Returns the ROI, threshold (or BackgroundSegmenter) and click point.
+    """
+    roi = find_roi(video_path, frame)
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    mask = create_mask(gray_frame.shape, roi)
+
+    # Allow interactive threshold preview and blob selection.
+    if segmentation == "background":
+        # Preview the inverted background difference, so the mouse is dark like in the threshold mode.
+        background = estimate_background(video_path)
+        gray_sample = cv2.bitwise_not(cv2.subtract(background, gray_frame))
+        preview_thresh, clicked_point = threshold_preview(gray_sample, mask)
+        # Preview keeps 255 - diff <= preview_thresh, i.e. diff > 254 - preview_thresh.
+        selected_thresh = BackgroundSegmenter(background, 254 - preview_thresh)
+    else:
+        gray_sample = gray_frame.copy()
+        selected_thresh, clicked_point = threshold_preview(gray_sample, mask)
+
+    # Warn if the clicked point is outside the ROI.
+    if mask[clicked_point[1], clicked_point[0]] == 0:
+        print("Warning: Clicked point is outside the selected ROI.")
+    return roi, selected_thresh, clicked_point
 
 def process_video():
     """
-    Process the video file: let the user select ROI and threshold interactively,
-    track the mouse, save the results, and show a tracking preview.
+    Process the video file: let the user select ROI and threshold interactively (or take them from
+    the calibration profile of the rig), track the mouse, save the results, and show a tracking preview.
     """
     print(f"Processing video: {video_path}")
+    os.makedirs(output_dir, exist_ok=True)
 
     # Load the first frame to select ROI.
     cap = cv2.VideoCapture(video_path)
@@ -232,31 +1037,61 @@ def process_video():
         print(f"Error: Could not read from video {video_path}")
         return
     cap.release()
-
-    # Let the user select the ROI.
-    roi = select_roi(frame)
     gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    # Use the calibration profile of this rig and day if there is one.
+    calibrated = False
+    profile_file = find_profile(profile_dir, rig, video_date(video_path)) if profile_dir else None
+    if profile_file:
+        try:
+            roi, selected_thresh, clicked_point, config = config_from_profile(profile_file, video_path)
+            calibrated = True
+            print(f"Using calibration profile {profile_file} (drift: {config['drift']['status']})")
+        except ValueError as e:
+            print(f"Warning: {e}. Falling back to manual calibration.")
+
+    # Otherwise let the user select the ROI and threshold, and remember them for this rig and day.
+    if not calibrated:
+        roi, selected_thresh, clicked_point = calibrate_interactively(frame)
+        if profile_dir:
+            save_calibration_profile(profile_dir, rig, video_path, roi, selected_thresh, clicked_point,
+                                     sampling_rate, arena_size_cm)
     mask = create_mask(gray_frame.shape, roi)
 
-    # Allow interactive threshold preview and blob selection.
-    gray_sample = gray_frame.copy()
-    selected_thresh, clicked_point = threshold_preview(gray_sample, mask)
+    # Keep the interactive choices so the video can be re-tracked in batch mode.
+    save_tracking_config(output_dir, video_path, roi, selected_thresh, clicked_point, sampling_rate, arena_size_cm)
 
-    # Warn if the clicked point is outside the ROI.
-    if mask[clicked_point[1], clicked_point[0]] == 0:
-        print("Warning: Clicked point is outside the selected ROI.")
+    # Reuse the tracking of an unchanged video with the same settings.
+    tracked_points = None
+    if cache_dir:
+        cache = ResultCache(cache_dir)
+        cache_key = cache.key(video_path, kind="track_mouse",
+                              **tracking_params(roi, selected_thresh, clicked_point, sampling_rate, search_radius))
+        tracked_points = cache.get(cache_key)
+        if tracked_points is not None:
+            print("Using cached tracking results.")
 
     # Track the mouse over the video.
-    tracked_points = track_mouse(video_path, mask, selected_thresh, clicked_point,
-                                 sampling_rate, live_preview=live_preview)
+    if tracked_points is None:
+        stats = TrackerStats()
+        if n_workers > 1:
+            tracked_points = track_mouse_parallel(video_path, mask, selected_thresh, clicked_point,
+                                                  sampling_rate, n_workers, search_radius=search_radius, stats=stats)
+        else:
+            tracked_points = track_mouse(video_path, mask, selected_thresh, clicked_point, sampling_rate,
+                                         live_preview=live_preview, search_radius=search_radius, stats=stats)
+        save_tracking_stats(output_dir, stats, video_path)
+        if cache_dir:
+            cache.put(cache_key, tracked_points)
 
-    # Save tracking results.
-    save_tracking_results(output_dir, tracked_points)
+    # Save tracking results, with the track also in cm on the arena floor.
+    save_tracking_results(output_dir, tracked_points, video_path, arena_homography(roi, arena_size_cm))
 
-    # Show a final preview.
-    tracking_preview(gray_frame, tracked_points, roi)
+    # Show (or save) a final preview.
+    tracking_preview(gray_frame, tracked_points, roi, figure_dir, figure_prefix(video_path))
 
 def main():
+    use_interactive_figures()
     process_video()
 
 if __name__ == "__main__":
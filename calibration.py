@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Calibration profiles for fixed camera rigs.
+
+A profile holds the ROI polygon, threshold, click seed and pixels-per-cm chosen once for a rig
+on a given day, plus a reference image of the empty arena. Videos of that rig are then set up
+without clicking: the reference is compared with the video's own background to detect camera
+drift. Small shifts are corrected by moving the ROI and click seed; larger changes are
+reported, so the rig can be recalibrated.
+
+The four ROI corners also define the homography from image pixels to cm on the arena floor,
+which corrects for the camera perspective.
+"""
+
+import os
+import re
+import json
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from arena_detection import order_corners
+
+PROFILE_PREFIX = "calibration_"
+DATE_PATTERN = re.compile(r"(20\d{2})[-_]?(\d{2})[-_]?(\d{2})")
+
+# Drift tolerances
+max_shift_px = 2.0  # Shifts up to this are ignored
+max_correctable_shift_px = 25.0  # Larger shifts need a new calibration
+min_match_response = 0.1  # Phase-correlation peak below this means the scene has changed
+max_brightness_change = 30.0  # Gray levels; a larger change of the arena brightness invalidates the threshold
+
+def video_date(video_path):
+    """
+    Recording date of a video as YYYYMMDD, taken from the file name
+    (e.g. WIN_20250403_13_54_53_Pro.mp4), else from the file modification time.
+    """
+    match = DATE_PATTERN.search(os.path.basename(video_path))
+    if match:
+        return "".join(match.groups())
+    return time.strftime("%Y%m%d", time.localtime(os.path.getmtime(video_path)))
+
+def is_profile(config_file):
+    """
+    True if config_file is a calibration profile rather than a per-video tracking config.
+    """
+    return os.path.basename(config_file).startswith(PROFILE_PREFIX)
+
+def roi_px_per_cm(roi, arena_size_cm):
+    """
+    Pixels per cm of a square arena: the mean length of the four ROI sides over arena_size_cm.
+    """
+    corners = np.asarray(roi, dtype=np.float64)
+    sides = np.linalg.norm(corners - np.roll(corners, -1, axis=0), axis=1)
+    return sides.mean() / arena_size_cm
+
+def arena_homography(roi, arena_size_cm):
+    """
+    3x3 homography from image pixels to cm on the arena floor. The ROI corners are mapped to the
+    corners of an arena_size_cm square, the top-left one to (0, 0), so the axes keep the image
+    orientation (X to the right, Y down).
+    """
+    corners = order_corners(roi).astype(np.float32)
+    square = np.array([(0, 0), (arena_size_cm, 0), (arena_size_cm, arena_size_cm), (0, arena_size_cm)],
+                      dtype=np.float32)
+    return cv2.getPerspectiveTransform(corners, square)
+
+def pixels_to_cm(xy, homography):
+    """
+    Map an (N, 2) pixel track to arena cm with one cv2.perspectiveTransform over the whole array.
+    Rows with NaN (frames without a detection) stay NaN.
+    """
+    xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+    out = np.full(xy.shape, np.nan)
+    finite = np.isfinite(xy).all(axis=1)
+    if finite.any():
+        out[finite] = cv2.perspectiveTransform(xy[finite].reshape(-1, 1, 2), homography).reshape(-1, 2)
+    return out
+
+def save_profile(profile_dir, rig, date, reference, roi, selected_thresh, clicked_point, sampling_rate,
+                 arena_size_cm=40.0, segmentation="threshold", learning_rate=0.0):
+    """
+    Save a calibration profile as calibration_<rig>_<date>.json, with the reference image of
+    the empty arena (grayscale, e.g. a median background) as a PNG next to it.
+    Returns the profile path.
+    """
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"{PROFILE_PREFIX}{rig}_{date}"
+    reference_file = f"{name}_reference.png"
+    cv2.imwrite(os.path.join(profile_dir, reference_file), reference)
+    profile = {
+        "rig": rig,
+        "date": date,
+        "roi": np.asarray(roi).tolist(),
+        "selected_thresh": int(selected_thresh),
+        "clicked_point": [int(clicked_point[0]), int(clicked_point[1])],
+        "sampling_rate": sampling_rate,
+        "segmentation": segmentation,
+        "learning_rate": learning_rate,
+        "arena_size_cm": arena_size_cm,
+        "px_per_cm": roi_px_per_cm(roi, arena_size_cm),
+        "reference": reference_file,
+    }
+    profile_file = os.path.join(profile_dir, f"{name}.json")
+    with open(profile_file, 'w') as f:
+        json.dump(profile, f, indent=2)
+    print(f"Calibration profile saved to: {profile_file}")
+    return profile_file
+
+def load_profile(profile_file):
+    """
+    Load a calibration profile. The ROI is returned as an np.int32 array, the click seed as a
+    tuple and the reference image under "reference_image".
+    """
+    with open(profile_file, 'r') as f:
+        profile = json.load(f)
+    reference_file = os.path.join(os.path.dirname(profile_file), profile["reference"])
+    reference = cv2.imread(reference_file, cv2.IMREAD_GRAYSCALE)
+    if reference is None:
+        raise IOError(f"Could not read calibration reference {reference_file}")
+    profile["roi"] = np.array(profile["roi"], dtype=np.int32)
+    profile["clicked_point"] = tuple(profile["clicked_point"])
+    profile["reference_image"] = reference
+    return profile
+
+def find_profile(profile_dir, rig, date):
+    """
+    Most recent profile of a rig made on or before date (YYYYMMDD), or None.
+    """
+    candidates = []
+    for profile_file in glob.glob(os.path.join(profile_dir, f"{PROFILE_PREFIX}{rig}_*.json")):
+        profile_date = os.path.splitext(os.path.basename(profile_file))[0].rsplit("_", 1)[-1]
+        if profile_date <= date:
+            candidates.append((profile_date, profile_file))
+    return max(candidates)[1] if candidates else None
+
+def measure_drift(reference, gray, roi):
+    """
+    Compare a frame (best the median background of a video) with the profile reference.
+    Returns the camera shift (dx, dy) in pixels from phase correlation, its peak response
+    (near 1 for a pure shift of the same scene) and the change of the mean arena brightness.
+    """
+    if reference.shape != gray.shape:
+        raise ValueError(f"Frame size {gray.shape[::-1]} differs from the calibration {reference.shape[::-1]}")
+    (dx, dy), response = cv2.phaseCorrelate(reference.astype(np.float32), gray.astype(np.float32))
+    mask = np.zeros(gray.shape, dtype=np.uint8)
+    cv2.fillPoly(mask, [np.asarray(roi, dtype=np.int32)], 255)
+    brightness_change = cv2.mean(gray, mask)[0] - cv2.mean(reference, mask)[0]
+    return (dx, dy), response, brightness_change
+
+def check_drift(profile, gray):
+    """
+    Check a video frame against a calibration profile.
+    Returns the ROI and click seed to use, moved by the camera shift if it is small enough to
+    correct, and a drift report whose "status" is "ok", "corrected" or "drifted" (with a
+    "reason"). A drifted video should not be tracked with this profile.
+    """
+    (dx, dy), response, brightness_change = measure_drift(profile["reference_image"], gray, profile["roi"])
+    shift = float(np.hypot(dx, dy))
+    report = {"shift_px": [round(dx, 2), round(dy, 2)], "response": round(response, 3),
+              "brightness_change": round(brightness_change, 1), "status": "ok"}
+    roi, clicked_point = profile["roi"], profile["clicked_point"]
+    if response < min_match_response:
+        report.update(status="drifted", reason="frame does not match the calibration reference")
+    elif shift > max_correctable_shift_px:
+        report.update(status="drifted", reason=f"camera moved by {shift:.1f} px")
+    elif abs(brightness_change) > max_brightness_change:
+        report.update(status="drifted", reason=f"arena brightness changed by {brightness_change:.0f}")
+    elif shift > max_shift_px:
+        offset = np.array([round(dx), round(dy)], dtype=np.int32)
+        roi = roi + offset
+        clicked_point = (int(clicked_point[0] + offset[0]), int(clicked_point[1] + offset[1]))
+        report["status"] = "corrected"
+    return roi, clicked_point, report
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Cohort-level open-field analysis.
+
+Computes the opf_metrics open-field metrics for every track file of a directory (or listed in
+a metadata sheet with genotype/age/... columns) in parallel, and writes one tidy summary table
+with a row per animal, plus a table with a row per middle-zone visit. Optionally the track,
+occupancy and speed heatmap figures of every animal are rendered headless to PNG/SVG files, also
+in parallel, with the cohort-averaged heatmaps (per metadata group if figure_group is set).
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from track_io import load_coordinates, is_calibrated, iter_track_coordinates
+from track_cleaning import load_clean_track
+from opf_metrics import cohort_metrics, streaming_metrics
+from result_cache import ResultCache
+from figures import render_cohort
+
+# Cohort settings
+track_dir = r"G:\OPF_VIDEOS\tracks"  # Directory with the track files (*.txt or track_*.npy)
+metadata_path = None  # Optional CSV/Excel sheet with a "file" column plus labels, e.g. genotype, age
+output_path = r"G:\OPF_VIDEOS\cohort_summary.csv"  # *.csv or *.parquet
+sampling_rate = 60  # Hz, check your camera setting
+arena_size = 40  # Side of the open field (cm)
+middle_zone = (10, 30)  # Middle square (cm)
+n_workers = os.cpu_count() or 1
+cache_dir = None  # Set to a directory to reuse the metrics of unchanged track files/settings
+cache_max_gb = 2  # Size limit of the cache; least recently used results are evicted
+figure_dir = None  # Set to a directory to save the track and heatmap figures of every animal and of the cohort
+figure_group = None  # Metadata column to average the cohort heatmaps by, e.g. "genotype"; None averages all
+figure_formats = ("png",)  # e.g. ("png", "svg")
+# Track cleaning (see track_cleaning.clean_track): jumps faster than max_speed (cm/s) are rejected, gaps up to
+# max_gap_s are interpolated and the centroid jitter is smoothed; None analyses the raw tracks
+cleaning = dict(max_speed=150, max_gap_s=0.5, smoothing="savgol", window=5)
+streaming = False  # Read every track in chunks, for recordings too long to load at once (tracks are not cleaned)
+
+TRACK_EXTENSIONS = (".txt", ".npy")
+
+def load_cohort_table():
+    """
+    Table of the animals to analyse: a "file" column with full paths, plus the metadata labels.
+    """
+    if metadata_path:
+        if metadata_path.lower().endswith((".xls", ".xlsx")):
+            table = pd.read_excel(metadata_path)
+        else:
+            table = pd.read_csv(metadata_path)
+        table["file"] = [f if os.path.isabs(f) else os.path.join(track_dir, f) for f in table["file"]]
+        return table
+    files = [os.path.join(track_dir, name) for name in sorted(os.listdir(track_dir))
+             if name.lower().endswith(TRACK_EXTENSIONS)]
+    return pd.DataFrame({"file": files})
+
+def analyse_files(files, sampling_rate, arena_size, middle_zone, cache_dir=None, cleaning=None, streaming=False):
+    """
+    Pool worker: load a batch of track files and compute their metrics in one vectorized pass.
+    Tracks saved in cm by black_mouse_tracker are used as they are, all others are normalized.
+    With cleaning set (track_cleaning.clean_track keyword arguments), tracks are cleaned first and
+    the metrics carry the cleaning report. With streaming, each track is instead read in chunks
+    (opf_metrics.streaming_metrics), in memory independent of its length, and not cleaned; the
+    metrics are exactly those of the uncleaned in-memory path.
+    With cache_dir set, files whose content and settings were analysed before are not reloaded.
+    Returns (file, metrics dict or None, error message or None) per file.
+    """
+    cache = ResultCache(cache_dir, int(cache_max_gb * 1024**3)) if cache_dir else None
+    if streaming:
+        cleaning = None
+    tracks, normalize, loaded, results = [], [], [], []
+    for path in files:
+        key = None
+        try:
+            if cache is not None:
+                key = cache.key(path, kind="opf_metrics", sampling_rate=sampling_rate,
+                                arena_size=arena_size, middle_zone=middle_zone, cleaning=cleaning)
+                metrics = cache.get(key)
+                if metrics is not None:
+                    results.append((path, metrics, None))
+                    continue
+            calibrated = is_calibrated(path)
+            part = "center_cm" if calibrated else "center"
+            if streaming:
+                metrics = streaming_metrics(lambda: iter_track_coordinates(path, part), sampling_rate, arena_size,
+                                            middle_zone, normalize=not calibrated)
+                if cache is not None:
+                    cache.put(key, metrics)
+                results.append((path, metrics, None))
+                continue
+            if cleaning is None:
+                xy, report = load_coordinates(path, part), None
+            else:
+                xy, report = load_clean_track(path, sampling_rate, part, **cleaning)
+        except (OSError, ValueError) as e:
+            results.append((path, None, str(e)))
+            continue
+        if np.isfinite(xy).all(axis=1).sum() < 2:
+            results.append((path, None, "fewer than 2 coordinates"))
+            continue
+        tracks.append(xy)
+        normalize.append(not calibrated)
+        loaded.append((path, key, report))
+    if tracks:
+        cohort = cohort_metrics(tracks, sampling_rate, arena_size, middle_zone, normalize)
+        for (path, key, report), metrics in zip(loaded, cohort):
+            if report is not None:
+                metrics["cleaning"] = report
+            if cache is not None:
+                cache.put(key, metrics)
+            results.append((path, metrics, None))
+    return results
+
+def run_cohort():
+    """
+    Analyse the whole cohort in parallel and write the summary and visit tables.
+    Returns the summary DataFrame.
+    """
+    table = load_cohort_table()
+    files = list(table["file"])
+    if not files:
+        print("No track files found.")
+        return table
+    batches = [list(batch) for batch in np.array_split(files, min(n_workers * 4, len(files))) if len(batch)]
+    print(f"Analysing {len(files)} animals with {n_workers} workers")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(analyse_files, batch, sampling_rate, arena_size, middle_zone, cache_dir, cleaning,
+                               streaming)
+                   for batch in batches]
+        batch_results = [future.result() for future in futures]
+
+    rows, visits = {}, []
+    for path, metrics, error in (r for results in batch_results for r in results):
+        if error:
+            print(f"Skipping {path}: {error}")
+            continue
+        dwell_times = metrics["dwell_times"]
+        rows[path] = {
+            "total_distance_cm": metrics["total_distance"],
+            "total_time_s": metrics["total_time_s"],
+            "average_speed_cmps": metrics["average_speed"],
+            "time_middle_s": metrics["time_middle_s"],
+            "middle_entries": metrics["middle_entries"],
+            "mean_visit_s": dwell_times.mean() if len(dwell_times) else 0.0,
+            "average_middle_speed_cmps": metrics["average_middle_speed"],
+        }
+        if "cleaning" in metrics:
+            report = metrics["cleaning"]
+            rows[path].update(dropped_frames=report["dropped_frames"], outlier_samples=report["outliers"],
+                              interpolated_samples=report["interpolated"], gap_samples=report["gaps"])
+        visits.append(pd.DataFrame({"file": path, "visit": np.arange(1, len(dwell_times) + 1),
+                                    "dwell_s": dwell_times}))
+
+    if not rows:
+        print("No track could be analysed.")
+        return table.iloc[:0]
+    metrics_table = pd.DataFrame.from_dict(rows, orient="index").rename_axis("file").reset_index()
+    summary = table.merge(metrics_table, on="file", how="inner")
+    summary.insert(0, "animal", [os.path.splitext(os.path.basename(f))[0] for f in summary["file"]])
+    if visits:
+        visit_table = pd.concat(visits, ignore_index=True)
+    else:
+        visit_table = pd.DataFrame(columns=["file", "visit", "dwell_s"])
+    elapsed = time.perf_counter() - start
+
+    save_table(summary, output_path)
+    root, ext = os.path.splitext(output_path)
+    save_table(visit_table, f"{root}_visits{ext}")
+    print(f"{len(summary)} animals analysed in {elapsed:.1f} s, summary saved to {output_path}")
+
+    if figure_dir:
+        start = time.perf_counter()
+        groups = list(summary[figure_group]) if figure_group else None
+        rendered, cohort_paths = render_cohort(list(summary["file"]), figure_dir, sampling_rate, arena_size,
+                                               middle_zone, n_workers=n_workers, formats=figure_formats,
+                                               cleaning=cleaning, groups=groups)
+        for path, _, error in rendered:
+            if error:
+                print(f"No figures for {path}: {error}")
+        print(f"Figures rendered in {time.perf_counter() - start:.1f} s, saved to {figure_dir} "
+              f"({len(cohort_paths)} cohort heatmaps)")
+    return summary
+
+def save_table(df, path):
+    """
+    Write a table as Parquet or CSV, depending on the file extension.
+    """
+    if path.lower().endswith(".parquet"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def main():
+    run_cohort()
+
+if __name__ == "__main__":
+    main()
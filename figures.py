@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Figure output for interactive and headless runs.
+
+By default figures are shown in a window. With a figure directory set they are written as
+PNG/SVG files with the non-interactive Agg backend instead, so the scripts run on compute
+nodes without a display. render_cohort draws the track, occupancy and speed heatmap figures of
+many animals in a process pool, and the cohort-averaged heatmaps from their grids.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.patches import Rectangle
+
+from track_io import load_coordinates, is_calibrated
+from track_cleaning import load_clean_track
+from opf_metrics import normalize_track, compute_speed, middle_zone_bounds
+from heatmaps import heatmap_grids, cohort_grids, plot_heatmap
+
+FIGURE_FORMATS = ("png",)  # Any format of Figure.savefig, e.g. ("png", "svg")
+
+def use_headless():
+    """
+    Switch matplotlib to the non-interactive Agg backend: no display or GUI event loop needed.
+    """
+    matplotlib.use("Agg", force=True)
+
+def save_figure(fig, figure_dir, name, formats=FIGURE_FORMATS, dpi=150):
+    """
+    Write a figure to figure_dir/name.<format> for every format and close it.
+    Returns the written paths.
+    """
+    os.makedirs(figure_dir, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(figure_dir, f"{name}.{fmt}")
+        fig.savefig(path, dpi=dpi)
+        paths.append(path)
+    plt.close(fig)
+    return paths
+
+def show_or_save(figures, figure_dir=None, prefix=None, formats=FIGURE_FORMATS):
+    """
+    Show the figures (a dict name -> figure) interactively, or save them to figure_dir as
+    <prefix>_<name>.<format> if it is set. Returns the written paths.
+    """
+    if not figure_dir:
+        plt.show()
+        return []
+    paths = []
+    for name, fig in figures.items():
+        paths += save_figure(fig, figure_dir, f"{prefix}_{name}" if prefix else name, formats)
+    return paths
+
+def figure_prefix(path):
+    """
+    Figure file prefix of a track or video file: its base name without extension.
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+def draw_arena(ax, arena_size, middle_zone=None):
+    """
+    Outline the arena and, if given, the middle square (low, high).
+    """
+    ax.add_patch(Rectangle((0, 0), arena_size, arena_size, fill=False, color='black', linewidth=1.5,
+                           linestyle='--'))
+    if middle_zone is not None:
+        low, high = middle_zone
+        ax.add_patch(Rectangle((low, low), high - low, high - low, fill=False, color='red', linewidth=1.5,
+                               linestyle=':'))
+
+def format_arena_axes(ax, arena_size, unit, title):
+    """
+    Square arena axes in the given unit, as in the analysis scripts.
+    """
+    ax.set_title(title)
+    ax.set_xlim(0, arena_size)
+    ax.set_ylim(0, arena_size)
+    ax.set_aspect('equal')
+    ax.set_xlabel(f"X ({unit})")
+    ax.set_ylabel(f"Y ({unit})")
+    ax.grid(True)
+
+def render_track_figures(path, figure_dir, sampling_rate, arena_size=40.0, middle_zone=None, unit="cm",
+                         bins=40, formats=FIGURE_FORMATS, cleaning=None):
+    """
+    Pool worker: draw the track plot and the occupancy and speed heatmaps of one track file and
+    save them to figure_dir as <track>_track.<format>, <track>_occupancy.<format> and
+    <track>_speed.<format>. Tracks in cm from the tracker are drawn as they are, others are
+    normalized to arena_size. With cleaning (track_cleaning.clean_track keyword arguments) the
+    track is cleaned first.
+    Figures are built without pyplot, so no backend or display is involved.
+    Returns the written paths and the (occupancy, mean_speed) grids, for the cohort averages.
+    """
+    if middle_zone is None:
+        middle_zone = middle_zone_bounds(arena_size)
+    calibrated = is_calibrated(path)
+    part = "center_cm" if calibrated else "center"
+    if cleaning is None:
+        xy = load_coordinates(path, part)
+    else:
+        xy, _ = load_clean_track(path, sampling_rate, part, **cleaning)
+    if not calibrated:
+        xy = normalize_track(xy, arena_size)
+    prefix = figure_prefix(path)
+    paths = []
+
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
+    ax.plot(xy[:, 0], xy[:, 1], color='blue', linewidth=1)
+    draw_arena(ax, arena_size, middle_zone)
+    format_arena_axes(ax, arena_size, unit, prefix)
+    fig.tight_layout()
+    paths += save_figure(fig, figure_dir, f"{prefix}_track", formats)
+
+    grids = heatmap_grids(xy, compute_speed(xy, sampling_rate), arena_size, bins, sampling_rate)
+    paths += render_heatmaps(grids, figure_dir, prefix, arena_size, middle_zone, unit, "Time (s)", formats)
+    return paths, grids
+
+def render_heatmaps(grids, figure_dir, prefix, arena_size, middle_zone, unit, occupancy_label,
+                    formats=FIGURE_FORMATS):
+    """
+    Save the occupancy and mean-speed grids of heatmap_grids (or cohort_grids) as
+    <prefix>_occupancy.<format> and <prefix>_speed.<format>. Returns the written paths.
+    """
+    occupancy, mean_speed = grids
+    paths = []
+    for name, grid, label in (("occupancy", occupancy, occupancy_label), ("speed", mean_speed, f"Speed ({unit}/s)")):
+        fig = Figure(figsize=(7, 6))
+        ax = fig.subplots()
+        plot_heatmap(ax, grid, arena_size, label, orientation='vertical')
+        draw_arena(ax, arena_size, middle_zone)
+        format_arena_axes(ax, arena_size, unit, prefix)
+        fig.tight_layout()
+        paths += save_figure(fig, figure_dir, f"{prefix}_{name}", formats)
+    return paths
+
+def render_cohort(files, figure_dir, sampling_rate, arena_size=40.0, middle_zone=None, unit="cm",
+                  n_workers=None, formats=FIGURE_FORMATS, cleaning=None, groups=None):
+    """
+    Render the track, occupancy and speed heatmap figures of every track file in a process pool,
+    then the cohort-averaged occupancy (fraction of time) and speed heatmaps (cohort_grids) as
+    cohort_occupancy.<format> and cohort_speed.<format>. With groups (one label per file, e.g.
+    the genotype) there is one average per group instead, as cohort_<group>_occupancy.<format>...
+    Returns (file, written paths or None, error message or None) per file, and the paths of the
+    cohort figures.
+    """
+    if middle_zone is None:
+        middle_zone = middle_zone_bounds(arena_size)
+    if groups is None:
+        groups = [None] * len(files)
+    results, group_grids = [], {}
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(render_track_figures, path, figure_dir, sampling_rate, arena_size,
+                               middle_zone, unit, formats=formats, cleaning=cleaning) for path in files]
+        for path, group, future in zip(files, groups, futures):
+            try:
+                paths, grids = future.result()
+            except (OSError, ValueError) as e:
+                results.append((path, None, str(e)))
+                continue
+            results.append((path, paths, None))
+            group_grids.setdefault(group, []).append(grids)
+    cohort_paths = []
+    for group, grids in group_grids.items():
+        prefix = "cohort" if group is None else f"cohort_{group}"
+        cohort_paths += render_heatmaps(cohort_grids(grids), figure_dir, prefix, arena_size, middle_zone, unit,
+                                        "Fraction of time", formats)
+    return results, cohort_paths
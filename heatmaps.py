@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Binned occupancy and speed heatmaps of open-field tracks.
+
+Samples are aggregated into a square grid over the arena with np.bincount, and the grid is
+drawn as a single image, instead of one scatter marker per sample.
+"""
+
+import numpy as np
+
+def bin_track(xy, arena_size, bins=40):
+    """
+    Flat grid-cell index (row = Y bin, column = X bin) of every sample of a normalized track.
+    Samples outside [0, arena_size] get -1. Samples on the far edge fall in the last bin,
+    as with np.histogram2d.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    with np.errstate(invalid="ignore"):  # NaN samples (gaps) are cast to garbage and masked below
+        cells = np.floor(xy * (bins / arena_size)).astype(np.int64)
+    inside = ((xy >= 0) & (xy <= arena_size)).all(axis=1)
+    np.minimum(cells, bins - 1, out=cells)
+    return np.where(inside, cells[:, 1] * bins + cells[:, 0], -1)
+
+def heatmap_grids(xy, speed, arena_size, bins=40, sampling_rate=None):
+    """
+    Occupancy and mean-speed grids (bins x bins, row 0 = lowest Y) of one normalized track.
+    Occupancy is in samples, or in seconds if sampling_rate is given; the mean speed is NaN in
+    cells that were never visited. NaN samples and speeds (gaps) are left out.
+    """
+    cells = bin_track(xy, arena_size, bins)
+    valid = cells >= 0
+    speed = np.asarray(speed)[valid]
+    cells = cells[valid]
+    counts = np.bincount(cells, minlength=bins * bins).reshape(bins, bins)
+    has_speed = np.isfinite(speed)
+    speed_counts = np.bincount(cells[has_speed], minlength=bins * bins).reshape(bins, bins)
+    speed_sum = np.bincount(cells[has_speed], weights=speed[has_speed], minlength=bins * bins).reshape(bins, bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_speed = speed_sum / speed_counts
+    mean_speed[speed_counts == 0] = np.nan
+    occupancy = counts / sampling_rate if sampling_rate else counts.astype(np.float64)
+    return occupancy, mean_speed
+
+def cohort_grids(grids):
+    """
+    Cohort-averaged grids of the per-animal (occupancy, mean_speed) pairs of heatmap_grids: the
+    mean over animals of the occupancy as a fraction of each animal's time, and the mean over
+    animals of the per-cell mean speed (animals that never visited a cell are left out of its
+    average). The per-animal grids can come from separate processes, as in figures.render_cohort.
+    """
+    occupancies = [occupancy / occupancy.sum() if occupancy.sum() > 0 else occupancy for occupancy, _ in grids]
+    mean_speeds = np.stack([mean_speed for _, mean_speed in grids])
+    visited = np.isfinite(mean_speeds)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cohort_speed = np.where(visited, mean_speeds, 0).sum(axis=0) / visited.sum(axis=0)
+    return np.mean(occupancies, axis=0), cohort_speed
+
+def plot_heatmap(ax, grid, arena_size, label, cmap="viridis", orientation="vertical"):
+    """
+    Draw a grid from heatmap_grids as one image over the arena, with a colorbar.
+    """
+    im = ax.imshow(grid, origin="lower", extent=(0, arena_size, 0, arena_size), cmap=cmap,
+                   interpolation="nearest")
+    cbar = ax.figure.colorbar(im, ax=ax, orientation=orientation)
+    cbar.set_label(label)
+    return im
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Kinematic features for movement phenotyping, e.g. the chorea-like "dancing" of HD mice.
+
+Per-sample quantities (heading, angular velocity, jerk, body elongation and orientation change
+of the tracker's body ellipse) are computed with array differences and summarized over sliding
+windows of strided views, so no Python loop runs over samples or windows. Every window only
+uses the samples inside it, so a long session can be processed in chunks (iter_kinematics) with
+exactly the same result as in one piece, in memory bounded by the chunk size.
+"""
+
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from track_io import load_track, is_calibrated, iter_coordinates
+
+FEATURES = ("speed", "angular_speed", "tortuosity", "jerk", "turning_bouts_per_min", "elongation",
+            "orientation_change")
+CHUNK_SAMPLES = 1 << 18  # Samples per chunk read from a track file
+
+def wrap_angle(angle, period=360.0):
+    """
+    Wrap angle differences (degrees) to [-period / 2, period / 2).
+    """
+    return (np.asarray(angle) + period / 2) % period - period / 2
+
+def _window_sums(values, length, n_windows, step, first=0):
+    """
+    Sums of values[s:s + length] for the window starts s = first, first + step, ... (n_windows of
+    them), over a strided view, so the windows are not copied.
+    """
+    return sliding_window_view(values, length)[first::step][:n_windows].sum(axis=1)
+
+def _window_nanmean(values, length, n_windows, step):
+    """
+    Mean of the finite values of every window (NaN if none), see _window_sums.
+    """
+    finite = np.isfinite(values)
+    total = _window_sums(np.where(finite, values, 0.0), length, n_windows, step)
+    count = _window_sums(finite, length, n_windows, step)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return total / np.where(count > 0, count, np.nan)
+
+def window_features(xy, ellipse, sampling_rate, window, step, turn_threshold=90.0, min_speed=0.0,
+                    min_displacement=0.0):
+    """
+    Features of the windows of window samples starting at 0, step, 2 * step, ... that fit in xy.
+    xy is an (N, 2) track (NaN for missed frames) and ellipse the matching (N, 3) body ellipse
+    (major axis, minor axis, orientation in degrees) or None. Returns a dict of one array per
+    feature (one value per window; see kinematic_features) and the window start indices.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    n = len(xy)
+    starts = np.arange(0, n - window + 1, step)
+    rate = sampling_rate
+
+    d = np.diff(xy, axis=0)
+    step_length = np.hypot(d[:, 0], d[:, 1])
+    heading = np.degrees(np.arctan2(d[:, 1], d[:, 0]))
+    heading[~(step_length * rate > min_speed)] = np.nan  # No heading while standing still
+    angular_velocity = wrap_angle(np.diff(heading)) * rate
+    turning = np.abs(angular_velocity) >= turn_threshold  # NaN counts as not turning
+    rises = np.zeros(len(turning))
+    rises[1:] = turning[1:] & ~turning[:-1]
+    jerk_xy = (xy[3:] - 3 * xy[2:-1] + 3 * xy[1:-2] - xy[:-3]) * rate**3
+
+    m = len(starts)
+    features = {"start": starts}
+    features["speed"] = _window_nanmean(step_length, window - 1, m, step) * rate
+    features["angular_speed"] = _window_nanmean(np.abs(angular_velocity), window - 2, m, step)
+    features["jerk"] = _window_nanmean(np.hypot(jerk_xy[:, 0], jerk_xy[:, 1]), window - 3, m, step)
+    # A bout under way at the window start counts as one, plus every start of a bout inside the window.
+    bouts = turning[starts] + _window_sums(rises, window - 3, m, step, first=1)
+    features["turning_bouts_per_min"] = bouts / (window / rate) * 60
+
+    path = _window_sums(step_length, window - 1, m, step)
+    chord = xy[starts + window - 1] - xy[starts]
+    displacement = np.hypot(chord[:, 0], chord[:, 1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        features["tortuosity"] = np.where(displacement > min_displacement, path / displacement, np.nan)
+
+    if ellipse is None:
+        features["elongation"] = np.full(len(starts), np.nan)
+        features["orientation_change"] = np.full(len(starts), np.nan)
+    else:
+        ellipse = np.asarray(ellipse, dtype=np.float64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            elongation = ellipse[:, 0] / ellipse[:, 1]
+        orientation_change = np.abs(wrap_angle(np.diff(ellipse[:, 2]), 180.0)) * rate
+        features["elongation"] = _window_nanmean(elongation, window, m, step)
+        features["orientation_change"] = _window_nanmean(orientation_change, window - 1, m, step)
+    return features
+
+def _window_samples(sampling_rate, window_s, step_s):
+    window = max(int(round(window_s * sampling_rate)), 4)  # Jerk needs 4 samples
+    return window, max(int(round(step_s * sampling_rate)), 1)
+
+def iter_kinematics(chunks, sampling_rate, window_s=1.0, step_s=0.5, turn_threshold=90.0, min_speed=0.0,
+                    min_displacement=0.0):
+    """
+    Sliding-window kinematic features over a track given as an iterable of (xy, ellipse) chunks
+    (ellipse None if the track has none), carrying the samples of unfinished windows from one
+    chunk to the next. Yields one dict per chunk with the features of the windows completed by it
+    and their start time (s). The result is the same as kinematic_features on the whole track.
+    """
+    window, step = _window_samples(sampling_rate, window_s, step_s)
+    xy_buf = np.empty((0, 2))
+    ellipse_buf = None
+    offset = 0  # Sample index of xy_buf[0] in the whole track
+    skip = 0  # Samples before the next window start not received yet (step longer than window)
+    for xy, ellipse in chunks:
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if ellipse is not None:
+            ellipse = np.asarray(ellipse, dtype=np.float64).reshape(-1, 3)
+        if skip:
+            drop = min(skip, len(xy))
+            xy = xy[drop:]
+            if ellipse is not None:
+                ellipse = ellipse[drop:]
+            offset += drop
+            skip -= drop
+        xy_buf = np.concatenate((xy_buf, xy))
+        if ellipse is not None:
+            ellipse_buf = ellipse if ellipse_buf is None else np.concatenate((ellipse_buf, ellipse))
+        if len(xy_buf) < window:
+            continue
+        features = window_features(xy_buf, ellipse_buf, sampling_rate, window, step, turn_threshold, min_speed,
+                                   min_displacement)
+        features["time_s"] = (features.pop("start") + offset) / sampling_rate
+        yield features
+        # Keep the samples from the next window start on; it can lie beyond them.
+        next_start = len(features["time_s"]) * step
+        drop = min(next_start, len(xy_buf))
+        xy_buf = xy_buf[drop:]
+        if ellipse_buf is not None:
+            ellipse_buf = ellipse_buf[drop:]
+        offset += drop
+        skip = next_start - drop
+
+def collect_kinematics(feature_chunks):
+    """
+    Concatenate the per-chunk dicts of iter_kinematics into one dict of arrays.
+    """
+    feature_chunks = list(feature_chunks)
+    keys = ("time_s",) + FEATURES
+    if not feature_chunks:
+        return {key: np.empty(0) for key in keys}
+    return {key: np.concatenate([chunk[key] for chunk in feature_chunks]) for key in keys}
+
+def kinematic_features(xy, sampling_rate, ellipse=None, window_s=1.0, step_s=0.5, turn_threshold=90.0,
+                       min_speed=0.0, min_displacement=0.0):
+    """
+    Sliding-window kinematic features of a whole (N, 2) track, with windows of window_s seconds
+    every step_s seconds. Returns a dict of arrays, one value per window:
+    time_s (window start), speed (mean, xy units/s), angular_speed (mean absolute change of the
+    movement direction, degrees/s; no direction while slower than min_speed), tortuosity (path
+    length over the straight distance between the window ends, NaN if that is at most
+    min_displacement), jerk (mean magnitude of the third derivative, xy units/s^3),
+    turning_bouts_per_min (runs of angular speed >= turn_threshold), and from the (N, 3) body
+    ellipse if given: elongation (mean major / minor axis) and orientation_change (mean absolute
+    change of the body axis, degrees/s).
+    The track is processed in chunks of CHUNK_SAMPLES, to bound the memory of long tracks.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    if ellipse is not None:
+        ellipse = np.asarray(ellipse, dtype=np.float64)
+    chunks = ((xy[i:i + CHUNK_SAMPLES], None if ellipse is None else ellipse[i:i + CHUNK_SAMPLES])
+              for i in range(0, len(xy), CHUNK_SAMPLES))
+    return collect_kinematics(iter_kinematics(chunks, sampling_rate, window_s, step_s, turn_threshold,
+                                              min_speed, min_displacement))
+
+def iter_track_chunks(path, chunk_samples=CHUNK_SAMPLES):
+    """
+    Read a track file in chunks of (xy, ellipse) for iter_kinematics, without loading it at once.
+    Binary track files are memory-mapped and give every frame (NaN where missed), in cm if the
+    file has them, with the body ellipse if it was saved; text files give their X, Y pairs and
+    no ellipse.
+    """
+    if os.path.splitext(path)[1].lower() != ".npy":
+        for xy in iter_coordinates(path):
+            yield xy, None
+        return
+    track = load_track(path)
+    part = "center_cm" if is_calibrated(path) else "center"
+    has_ellipse = "ellipse" in track.dtype.names
+    for start in range(0, len(track), chunk_samples):
+        chunk = track[start:start + chunk_samples]
+        ellipse = np.asarray(chunk["ellipse"], dtype=np.float64) if has_ellipse else None
+        yield np.asarray(chunk[part], dtype=np.float64), ellipse
+
+def track_kinematics(path, sampling_rate, window_s=1.0, step_s=0.5, turn_threshold=90.0, min_speed=0.0,
+                     min_displacement=0.0, chunk_samples=CHUNK_SAMPLES):
+    """
+    Sliding-window kinematic features of a track file, streamed in chunks (see kinematic_features).
+    """
+    return collect_kinematics(iter_kinematics(iter_track_chunks(path, chunk_samples), sampling_rate, window_s,
+                                              step_s, turn_threshold, min_speed, min_displacement))
+
+def kinematics_summary(features):
+    """
+    Mean of every feature over all windows (NaN windows left out), e.g. one row per animal.
+    """
+    summary = {}
+    for key in FEATURES:
+        values = features[key][np.isfinite(features[key])]
+        summary[key] = values.mean() if len(values) else np.nan
+    return summary
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""
+Live tracking from a camera or stream, for closed-loop experiments without recording first.
+
+Capture, processing and display run in separate threads connected by bounded queues. When
+processing falls behind, the oldest waiting frame is dropped rather than letting latency grow,
+and every drop is counted. Per-frame latency (capture to result) is reported, and distance and
+centre time are updated incrementally with opf_metrics.OpenFieldAccumulator, one sample per
+captured frame: dropped frames and frames without a detection enter as missing (NaN) samples, so
+the metrics' time follows the source and their counts are reported with them. A video file can
+stand in for a camera: it is replayed at its real-time speed.
+"""
+
+import os
+import time
+import queue
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+from black_mouse_tracker import FrameTracker, create_mask, load_tracking_config
+from calibration import is_profile, load_profile, check_drift, arena_homography, pixels_to_cm
+from opf_metrics import OpenFieldAccumulator
+
+# Live settings
+source = 0  # Camera index, stream URL, or a video file replayed at real-time speed
+config_path = r"G:\OPF_VIDEOS\tracking_config_WIN_20250403_13_54_53_Pro.json"  # Tracking config or calibration profile
+arena_size_cm = 40  # Side of the open field (cm), unless the config stores its own
+middle_zone = (10, 30)  # Middle square (cm)
+search_radius = 80  # Pixels; windowed search keeps the per-frame cost low
+frame_queue_size = 4  # Frames waiting for processing; older frames are dropped beyond this
+duration_s = None  # Stop after this many seconds (None: until Esc or the end of a file)
+display = True  # Show the tracking in a window; False prints a status line instead
+report_interval_s = 5.0
+LATENCY_WINDOW = 10000  # Latency percentiles are over the most recent frames
+
+class LiveTracker:
+    """
+    Threaded live tracker. start() launches the capture and processing threads; the caller
+    reads results with latest(), live metrics with metrics() and counters with stats(), and
+    ends the run with stop().
+    """
+    def __init__(self, source, mask, selected_thresh, clicked_point, homography, arena_size_cm=40.0,
+                 middle_zone=None, search_radius=None, queue_size=4):
+        self.source = source
+        self.homography = homography
+        self.frame_tracker = FrameTracker(mask, selected_thresh, clicked_point, search_radius)
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.results = queue.Queue(maxsize=1)
+        self.arena_size_cm = arena_size_cm
+        self.middle_zone = middle_zone
+        self.accumulator = None
+        self.next_frame = 0  # Index of the next frame the accumulator expects
+        self.fps = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0  # Frames dropped because processing fell behind
+        self.missed = 0  # Processed frames without a detection
+        self.latencies = deque(maxlen=LATENCY_WINDOW)  # Seconds from capture to result
+        self.finished = threading.Event()  # Set when the source ends and all frames are processed
+
+    def start(self):
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video source {self.source}")
+        self.fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        self.accumulator = OpenFieldAccumulator(self.fps, self.arena_size_cm, self.middle_zone)
+        self._threads = [threading.Thread(target=self._capture_loop, args=(cap,), daemon=True),
+                         threading.Thread(target=self._process_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _capture_loop(self, cap):
+        # Replay files at their frame rate; cameras and streams deliver frames in real time.
+        replay = isinstance(self.source, str) and os.path.isfile(self.source)
+        start = time.perf_counter()
+        frame_idx = 0
+        while not self._stop.is_set():
+            if replay:
+                delay = start + frame_idx / self.fps - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            item = (frame_idx, time.perf_counter(), frame)
+            try:
+                self.frames.put_nowait(item)
+            except queue.Full:
+                # Drop the oldest frame, so that the newest one is processed next.
+                try:
+                    self.frames.get_nowait()
+                    with self._lock:
+                        self.dropped += 1
+                except queue.Empty:
+                    pass
+                self.frames.put_nowait(item)
+            with self._lock:
+                self.captured += 1
+            frame_idx += 1
+        cap.release()
+        self.frames.put(None)  # End of the source
+
+    def _process_loop(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                break
+            frame_idx, capture_time, frame = item
+            gray = self.frame_tracker.crop_gray(frame)
+            center, nose_est, mouse_contour, _ = self.frame_tracker.locate(gray)
+            # The frames dropped since the last processed one and a miss are NaN samples.
+            samples = np.full((frame_idx - self.next_frame + 1, 2), np.nan)
+            if center is not None:
+                samples[-1] = pixels_to_cm(center, self.homography)[0]
+            latency = time.perf_counter() - capture_time
+            with self._lock:
+                self.accumulator.update(samples)
+                self.next_frame = frame_idx + 1
+                self.processed += 1
+                self.missed += center is None
+                self.latencies.append(latency)
+            result = {"frame": frame_idx, "image": frame, "center": center, "nose": nose_est,
+                      "contour": mouse_contour, "latency": latency}
+            # Keep only the newest result for the display.
+            try:
+                self.results.get_nowait()
+            except queue.Empty:
+                pass
+            self.results.put_nowait(result)
+        self.finished.set()
+
+    def latest(self, timeout=None):
+        """
+        Newest processed frame as a dict (frame, image, center, nose, contour, latency), or None.
+        """
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def metrics(self):
+        """
+        Live open-field metrics (see opf_metrics.OpenFieldAccumulator.result), in cm, over all
+        frames up to the last processed one, with the dropped and missed frame counts among them.
+        """
+        with self._lock:
+            metrics = self.accumulator.result()
+            metrics.update(dropped=self.dropped, missed=self.missed)
+        return metrics
+
+    def stats(self):
+        """
+        Frame counters and latency percentiles (ms) so far.
+        """
+        with self._lock:
+            latencies = np.array(self.latencies) * 1000
+            stats = {"captured": self.captured, "processed": self.processed, "dropped": self.dropped,
+                     "missed": self.missed}
+        if len(latencies):
+            p50, p95 = np.percentile(latencies, [50, 95])
+            stats.update(latency_mean_ms=float(latencies.mean()), latency_p50_ms=float(p50),
+                         latency_p95_ms=float(p95), latency_max_ms=float(latencies.max()))
+        return stats
+
+def load_live_config(config_path, first_frame):
+    """
+    ROI, threshold, click point and arena side for live tracking, from a tracking config or a
+    calibration profile. A profile is checked for camera drift against the first live frame;
+    a drifted camera raises ValueError.
+    """
+    if is_profile(config_path):
+        profile = load_profile(config_path)
+        roi, clicked_point, drift = check_drift(profile, cv2.cvtColor(first_frame, cv2.COLOR_BGR2GRAY))
+        if drift["status"] == "drifted":
+            raise ValueError(f"Camera drifted from calibration {config_path}: {drift['reason']}")
+        if profile["segmentation"] != "threshold":
+            raise ValueError("Live tracking needs a threshold calibration, not a background one")
+        return roi, profile["selected_thresh"], clicked_point, profile["arena_size_cm"]
+    roi, selected_thresh, clicked_point, config = load_tracking_config(config_path)
+    return roi, selected_thresh, clicked_point, config.get("arena_size_cm", arena_size_cm)
+
+def metrics_line(metrics):
+    return (f"distance {metrics['total_distance']:.1f} cm, centre {metrics['time_middle_s']:.1f} s, "
+            f"{metrics['middle_entries']} entries ({metrics['dropped']} dropped, {metrics['missed']} missed)")
+
+def status_line(tracker):
+    """
+    One-line summary of the live counters and metrics.
+    """
+    stats = tracker.stats()
+    line = f"{stats['processed']}/{stats['captured']} frames"
+    if "latency_p50_ms" in stats:
+        line += f", latency {stats['latency_p50_ms']:.1f} ms (p95 {stats['latency_p95_ms']:.1f} ms)"
+    return f"{line} | {metrics_line(tracker.metrics())}"
+
+def run_live():
+    """
+    Track the live source until Esc, the end of the source or duration_s, showing or printing
+    the live metrics. Returns the final metrics and stats.
+    """
+    cap = cv2.VideoCapture(source)
+    ret, first_frame = cap.read()
+    cap.release()
+    if not ret:
+        print(f"Error: Could not read from video source {source}")
+        return None
+    roi, selected_thresh, clicked_point, arena_size = load_live_config(config_path, first_frame)
+    mask = create_mask(first_frame.shape[:2], roi)
+    tracker = LiveTracker(source, mask, selected_thresh, clicked_point, arena_homography(roi, arena_size),
+                          arena_size, middle_zone, search_radius, frame_queue_size)
+    tracker.start()
+    print(f"Live tracking {source} at {tracker.fps:.1f} FPS")
+
+    start = last_report = time.perf_counter()
+    try:
+        while not tracker.finished.is_set():
+            if duration_s is not None and time.perf_counter() - start > duration_s:
+                break
+            if display:
+                result = tracker.latest(timeout=0.1)
+                if result is not None:
+                    preview = result["image"]
+                    cv2.polylines(preview, [roi], isClosed=True, color=(0, 255, 255), thickness=1)
+                    if result["center"] is not None:
+                        cv2.drawContours(preview, [result["contour"]], -1, (255, 255, 255), 1)
+                        cv2.circle(preview, result["center"], 4, (0, 255, 0), -1)
+                        cv2.circle(preview, result["nose"], 3, (0, 0, 255), -1)
+                    cv2.putText(preview, metrics_line(tracker.metrics()), (10, 20),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
+                    cv2.imshow("Live Tracking", preview)
+                if cv2.waitKey(1) & 0xFF == 27:  # Esc
+                    break
+            else:
+                time.sleep(0.1)
+            if time.perf_counter() - last_report >= report_interval_s:
+                print(status_line(tracker))
+                last_report = time.perf_counter()
+    finally:
+        tracker.stop()
+        if display:
+            cv2.destroyWindow("Live Tracking")
+    print(status_line(tracker))
+    return tracker.metrics(), tracker.stats()
+
+def main():
+    run_live()
+
+if __name__ == "__main__":
+    main()
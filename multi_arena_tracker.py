@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tracking of rigs that film several open fields in one camera view.
+
+Every frame is decoded once and each arena is segmented in its own crop (see
+black_mouse_tracker.track_arenas), instead of decoding the whole video again per arena.
+The ROI, threshold and mouse click of every arena are chosen interactively, or taken from the
+tracking_config_<video>_arena<n>.json files of an earlier run. Each arena gets the same output
+files as a single-arena video, named <video>_arena<n>; the stats of the shared decoding are
+saved once, as tracking_stats_<video>.json.
+"""
+
+import os
+
+import cv2
+
+from black_mouse_tracker import (select_roi, create_mask, threshold_preview, track_arenas, arena_video_path,
+                                 save_tracking_results, save_tracking_config, load_tracking_config,
+                                 save_tracking_stats, tracking_preview, use_interactive_figures)
+from calibration import arena_homography
+from figures import figure_prefix
+from tracker_stats import TrackerStats
+
+# Multi-arena settings
+video_path = r"G:\OPF_VIDEOS\WIN_20250403_13_54_53_Pro.mp4"  # Video showing all arenas
+output_dir = r"G:\OPF_VIDEOS"  # Directory where results will be saved
+n_arenas = 4  # Number of arenas in the camera view
+sampling_rate = 60  # Desired frame sampling rate (frames per second)
+search_radius = None  # Pixels; set (e.g. 80) to search only around the predicted position
+n_threads = 4  # Threads segmenting the arenas of a frame in parallel (1: one after the other)
+arena_size_cm = 40  # Side of each open field (cm)
+figure_dir = None  # Set to a directory to save the tracking previews as PNG instead of showing them
+
+def arena_config_file(arena_index):
+    """
+    Tracking config of one arena, as save_tracking_config names it.
+    """
+    name = os.path.splitext(os.path.basename(arena_video_path(video_path, arena_index)))[0]
+    return os.path.join(output_dir, f"tracking_config_{name}.json")
+
+def calibrate_arenas(frame):
+    """
+    ROI, threshold and click point of every arena: from the saved configs if all arenas have one,
+    else chosen by the user arena by arena. New choices are saved as per-arena tracking configs.
+    Returns a list of (roi, selected_thresh, clicked_point).
+    """
+    config_files = [arena_config_file(i) for i in range(n_arenas)]
+    if all(os.path.exists(f) for f in config_files):
+        print(f"Using the saved configs of {n_arenas} arenas")
+        return [load_tracking_config(f)[:3] for f in config_files]
+
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    calibrations = []
+    for i in range(n_arenas):
+        print(f"Arena {i + 1} of {n_arenas}:")
+        roi = select_roi(frame)
+        mask = create_mask(gray_frame.shape, roi)
+        selected_thresh, clicked_point = threshold_preview(gray_frame.copy(), mask)
+        if mask[clicked_point[1], clicked_point[0]] == 0:
+            print("Warning: Clicked point is outside the selected ROI.")
+        save_tracking_config(output_dir, arena_video_path(video_path, i), roi, selected_thresh, clicked_point,
+                             sampling_rate, arena_size_cm)
+        calibrations.append((roi, selected_thresh, clicked_point))
+    return calibrations
+
+def process_arenas():
+    """
+    Calibrate all arenas, track them in one pass over the video and save the results of every arena.
+    """
+    print(f"Processing video: {video_path}")
+    os.makedirs(output_dir, exist_ok=True)
+    cap = cv2.VideoCapture(video_path)
+    ret, frame = cap.read()
+    cap.release()
+    if not ret:
+        print(f"Error: Could not read from video {video_path}")
+        return
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+    calibrations = calibrate_arenas(frame)
+    arenas = [(create_mask(gray_frame.shape, roi), selected_thresh, clicked_point)
+              for roi, selected_thresh, clicked_point in calibrations]
+    stats = TrackerStats()
+    arena_stats = [TrackerStats() for _ in arenas]
+    tracks = track_arenas(video_path, arenas, sampling_rate, search_radius=search_radius, n_threads=n_threads,
+                          stats=stats, arena_stats=arena_stats)
+    save_tracking_stats(output_dir, stats, video_path)
+
+    for i, ((roi, _, _), tracked_points) in enumerate(zip(calibrations, tracks)):
+        arena_path = arena_video_path(video_path, i)
+        save_tracking_stats(output_dir, arena_stats[i], arena_path)
+        save_tracking_results(output_dir, tracked_points, arena_path, arena_homography(roi, arena_size_cm))
+        tracking_preview(gray_frame, tracked_points, roi, figure_dir, figure_prefix(arena_path))
+
+def main():
+    use_interactive_figures()
+    process_arenas()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Novel object recognition (NOR) scoring for many animals at once.
+
+The body and nose tracks of all animals are concatenated, and the distances of every sample to
+every object are computed in one broadcast (N, K) array operation. A sample counts as
+exploration of an object when the nose is within the exploration radius of it and the head
+(body center to nose) points at it; tracks without a nose (AnimalTracker text files) fall back
+to the body point within the radius. Exploration bouts are found by run-length encoding, per
+animal and object in one pass, as in opf_metrics.cohort_metrics.
+"""
+
+import os
+
+import numpy as np
+
+from track_io import load_coordinates, is_calibrated
+from track_cleaning import load_clean_track
+from opf_metrics import track_scaling
+
+def object_distances(xy, objects):
+    """
+    Distance of every sample of an (N, 2) track to every one of K objects, as an (N, K) array.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    objects = np.asarray(objects, dtype=np.float64).reshape(-1, 2)
+    d = xy[:, None, :] - objects[None, :, :]
+    return np.sqrt(d[..., 0]**2 + d[..., 1]**2)
+
+def heading_to_objects(center, nose, objects):
+    """
+    Angle (degrees, 0-180) between the head direction (center to nose) and the direction from the
+    center to every object, as an (N, K) array. NaN where nose and center coincide.
+    """
+    center = np.asarray(center, dtype=np.float64)
+    heading = np.asarray(nose, dtype=np.float64) - center
+    to_object = np.asarray(objects, dtype=np.float64).reshape(-1, 2)[None, :, :] - center[:, None, :]
+    dot = heading[:, None, 0] * to_object[..., 0] + heading[:, None, 1] * to_object[..., 1]
+    norms = np.hypot(heading[:, 0], heading[:, 1])[:, None] * np.hypot(to_object[..., 0], to_object[..., 1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.degrees(np.arccos(np.clip(dot / norms, -1.0, 1.0)))
+
+def load_nor_track(path, sampling_rate=None, cleaning=None):
+    """
+    Body center and nose track of one animal, with the frames of both aligned.
+    track_*.npy files give the center and nose (in cm if the file has them, see
+    track_io.is_calibrated); body_track_<video>.txt files are paired with the nose_track_<video>.txt
+    written next to them by black_mouse_tracker. Other text files have no nose (None).
+    With cleaning (track_cleaning.clean_track keyword arguments) both are cleaned on the time
+    grid of sampling_rate.
+    Returns (center, nose or None, calibrated).
+    """
+    def load(file, part="center"):
+        if cleaning is None:
+            return load_coordinates(file, part)
+        return load_clean_track(file, sampling_rate, part, **cleaning)[0]
+
+    if os.path.splitext(path)[1].lower() == ".npy":
+        calibrated = is_calibrated(path)
+        suffix = "_cm" if calibrated else ""
+        return load(path, "center" + suffix), load(path, "nose" + suffix), calibrated
+    center = load(path)
+    directory, name = os.path.split(path)
+    nose = None
+    if name.startswith("body_track_"):
+        nose_file = os.path.join(directory, "nose_track_" + name[len("body_track_"):])
+        if os.path.exists(nose_file):
+            nose = load(nose_file)
+            if len(nose) != len(center):
+                raise ValueError(f"{nose_file} and {path} have different lengths")
+    return center, nose, False
+
+def cohort_nor_metrics(centers, noses, objects, sampling_rate, radius, max_angle=45.0, min_bout_s=0.0,
+                       arena_size=1.0, normalize=True, novel=1):
+    """
+    NOR scores for several animals at once.
+    centers is a list of (N_i, 2) body tracks (each with at least 2 samples) and noses the matching nose tracks (None for an
+    animal without one). Tracks are scaled with normalize_track (the nose with the scale of its
+    center), except where normalize (one bool, or one per animal) is False. objects are K (X, Y)
+    positions in the same units.
+    A sample explores object k when the nose is within radius of it and the head points at it
+    within max_angle degrees (without a nose: the body within radius). Runs of exploring samples
+    are bouts; bouts shorter than min_bout_s are not counted. The discrimination index compares
+    object novel with the first of the others: (novel - familiar) / (novel + familiar).
+    Returns one dict per animal with exploration_s, bouts, mean_bout_s and latency_s (one value
+    per object; latency is NaN if the object was never explored), bout_durations (one array per
+    object), total_exploration_s, discrimination_index (NaN without exploration) and directed
+    (False for animals scored without a nose).
+    """
+    objects = np.asarray(objects, dtype=np.float64).reshape(-1, 2)
+    n_animals, n_objects = len(centers), len(objects)
+    lengths = np.array([len(c) for c in centers])
+    if (lengths < 2).any():
+        raise ValueError("Every track needs at least 2 samples")
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    animal = np.repeat(np.arange(n_animals), lengths)
+    center = np.concatenate([np.asarray(c, dtype=np.float64) for c in centers])
+    has_nose = np.array([n is not None for n in noses])
+    nose = np.concatenate([np.asarray(n if n is not None else c, dtype=np.float64)
+                           for c, n in zip(centers, noses)])
+
+    # Per-animal scaling to arena_size from the body track, as normalize_track does for one track.
+    scale, offset = track_scaling(np.fmin.reduceat(center, starts, axis=0),
+                                  np.fmax.reduceat(center, starts, axis=0), arena_size, normalize)
+    center = center * scale[animal, None] - offset[animal]
+    nose = nose * scale[animal, None] - offset[animal]
+
+    # (N, K) exploration mask in one broadcast over all samples and objects.
+    exploring = object_distances(nose, objects) <= radius
+    directed = has_nose[animal]
+    exploring[directed] &= heading_to_objects(center[directed], nose[directed], objects) <= max_angle
+
+    # Bouts: runs of exploring per (object, animal) segment of the object-major flattened mask.
+    n_total = len(center)
+    flat = exploring.T.ravel()
+    segment_starts = (np.arange(n_objects)[:, None] * n_total + starts[None, :]).ravel()
+    breaks = np.zeros(len(flat), dtype=bool)
+    breaks[segment_starts] = True
+    edges = np.diff(np.concatenate(([False], flat, [False])).astype(np.int8))
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    # Split runs at segment starts (a run crossing from one animal into the next).
+    inner_breaks = np.flatnonzero(breaks & flat & np.concatenate(([False], flat[:-1])))
+    run_starts = np.sort(np.concatenate((run_starts, inner_breaks)))
+    run_ends = np.sort(np.concatenate((run_ends, inner_breaks)))
+    run_lengths = run_ends - run_starts
+    keep = run_lengths >= max(min_bout_s * sampling_rate, 1)
+    run_starts, run_lengths = run_starts[keep], run_lengths[keep]
+    segment = np.searchsorted(segment_starts, run_starts, side="right") - 1  # object * n_animals + animal
+
+    n_segments = n_objects * n_animals
+    bouts = np.bincount(segment, minlength=n_segments).reshape(n_objects, n_animals)
+    exploration_s = (np.bincount(segment, weights=run_lengths, minlength=n_segments)
+                     .reshape(n_objects, n_animals) / sampling_rate)
+    latency_s = np.full(n_segments, np.nan)
+    first_segments, first_runs = np.unique(segment, return_index=True)
+    latency_s[first_segments] = (run_starts[first_runs] - segment_starts[first_segments]) / sampling_rate
+    latency_s = latency_s.reshape(n_objects, n_animals)
+    bout_durations = np.split(run_lengths / sampling_rate, np.cumsum(bouts.ravel())[:-1])
+
+    familiar = next((k for k in range(n_objects) if k != novel), None)
+    results = []
+    for i in range(n_animals):
+        explored = exploration_s[:, i]
+        if familiar is not None and explored[novel] + explored[familiar] > 0:
+            index = (explored[novel] - explored[familiar]) / (explored[novel] + explored[familiar])
+        else:
+            index = np.nan
+        with np.errstate(invalid="ignore"):
+            mean_bout_s = np.where(bouts[:, i] > 0, explored / bouts[:, i], 0.0)
+        results.append({
+            "exploration_s": explored,
+            "bouts": bouts[:, i],
+            "mean_bout_s": mean_bout_s,
+            "latency_s": latency_s[:, i],
+            "bout_durations": [bout_durations[k * n_animals + i] for k in range(n_objects)],
+            "total_exploration_s": explored.sum(),
+            "discrimination_index": index,
+            "directed": bool(has_nose[i]),
+        })
+    return results
+
+def nor_metrics(center, nose, objects, sampling_rate, radius, max_angle=45.0, min_bout_s=0.0, arena_size=1.0,
+                normalize=True, novel=1):
+    """
+    NOR scores of a single animal; see cohort_nor_metrics for the returned keys.
+    """
+    return cohort_nor_metrics([center], [nose], objects, sampling_rate, radius, max_angle, min_bout_s,
+                              arena_size, normalize, novel)[0]
@@ -1,45 +1,45 @@
 # Libraries for open-field analysis
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
-import re
+from track_io import is_calibrated
+from track_cleaning import load_analysis_track
+from opf_metrics import normalize_track, open_field_metrics
+from figures import use_headless, show_or_save, figure_prefix
 
 # Load OPF mouse data
 file_path = "/test_data.txt"  # Directory to the coordinates file in *.TXT format
+figure_dir = None  # Set to a directory to save the figures as PNG files instead of showing them (headless)
+if figure_dir:
+    use_headless()
 
-# Extract coordinates
-with open(file_path, "r") as f:
-    content = f.read()
-pattern = r"(\d+\.\d+)\s+(\d+\.\d+)"
-matches = re.findall(pattern, content)
-coordinates = pd.DataFrame(matches, columns=["X", "Y"]).astype(float)
+# Frame rate of the track (60 Hz)
+sampling_rate = 60
 
-# Estimate the side length of the square open field
-x_range = coordinates["X"].max() - coordinates["X"].min()
-y_range = coordinates["Y"].max() - coordinates["Y"].min()
-side_length = np.mean([x_range, y_range])
+# Side of the square open field (cm): tracks in pixels are scaled to it, tracks in cm from black_mouse_tracker have it
+arena_size_cm = 40
 
-# Scale coordinates so that the open-field is 1x1 meter
-scale = 1.0 / side_length
-coordinates_scaled = coordinates * scale
+# Track cleaning (see track_cleaning.clean_track): jumps faster than max_speed (cm/s) are rejected, gaps up to
+# max_gap_s are interpolated and the centroid jitter is smoothed; None analyses the raw track
+cleaning = dict(arena_size=arena_size_cm, max_speed=150, max_gap_s=0.5, smoothing="savgol", window=5)
 
-# Normalize coordinates to fit in [0, 1] x [0, 1]
-coordinates_normalized = coordinates_scaled.copy()
-coordinates_normalized["X"] -= coordinates_scaled["X"].min()
-coordinates_normalized["Y"] -= coordinates_scaled["Y"].min()
+# Extract coordinates (AnimalTracker *.txt, or track_*.npy from black_mouse_tracker)
+# Tracks from black_mouse_tracker are already in cm through the ROI homography and need no scaling
+calibrated = is_calibrated(file_path)
+coordinates = load_analysis_track(file_path, sampling_rate, "center_cm" if calibrated else "center", cleaning)
+if calibrated:
+    coordinates = coordinates / 100  # cm -> m
 
-# Travel distance (in meters)
-distances = np.sqrt(np.diff(coordinates_scaled["X"])**2 + np.diff(coordinates_scaled["Y"])**2)
-total_distance_m = distances.sum()
+# Field side in m; pixel tracks are normalized to [0, arena_size] x [0, arena_size]
+arena_size = arena_size_cm / 100
+coordinates_normalized = coordinates if calibrated else normalize_track(coordinates, arena_size)
 
-# Average speed in 60Hz frame rate
-sampling_rate = 60
-total_time_s = len(coordinates_scaled) / sampling_rate
-average_speed_mps = total_distance_m / total_time_s
+# Travel distance (in meters) and average speed in 60Hz frame rate
+metrics = open_field_metrics(coordinates, sampling_rate, arena_size, normalize=not calibrated)
+total_distance_m = metrics["total_distance"]
+average_speed_mps = metrics["average_speed"]
 
 # Draw open-field
 def draw_field(ax):
-    field = plt.Rectangle((0, 0), 1, 1, fill=False, color='black', linewidth=1.5, linestyle='--')
+    field = plt.Rectangle((0, 0), arena_size, arena_size, fill=False, color='black', linewidth=1.5, linestyle='--')
     ax.add_patch(field)
 
 # Print results
@@ -48,15 +48,15 @@ print(f"Average speed: {average_speed_mps:.2f} m/s")
 
 # Plot animal track
 fig, ax = plt.subplots(figsize=(6, 6))
-ax.plot(coordinates_normalized["X"], coordinates_normalized["Y"], color='blue', linewidth=1)
+ax.plot(coordinates_normalized[:, 0], coordinates_normalized[:, 1], color='blue', linewidth=1)
 draw_field(ax)
 ax.set_title("Your_title_here") # Define your plot title here
-ax.set_xlim(0, 1)
-ax.set_ylim(0, 1)
+ax.set_xlim(0, arena_size)
+ax.set_ylim(0, arena_size)
 ax.set_aspect('equal')
 ax.set_xlabel("X (m)")
 ax.set_ylabel("Y (m)")
 ax.grid(True)
 
 plt.tight_layout()
-plt.show()
+show_or_save({"track": fig}, figure_dir, figure_prefix(file_path))
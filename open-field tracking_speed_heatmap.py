@@ -4,76 +4,50 @@
 # This script is suitable for general open-field activities, including distance, speed, and visits to the center circle (represents anxiety)
 # Contact: ldu13@jh.edu
 # Libraries for open-field analysis
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import re
+from track_io import is_calibrated
+from track_cleaning import load_analysis_track
+from opf_metrics import normalize_track, open_field_metrics, compute_speed
+from heatmaps import heatmap_grids, plot_heatmap
+from figures import use_headless, show_or_save, figure_prefix
 
 # Load OPF mouse data
 file_path = "G:\OPF_VIDEOS\WIN_20250404_142_1.txt"  # Directory to the coordinates file in *.TXT format
+figure_dir = None  # Set to a directory to save the figures as PNG files instead of showing them (headless)
+if figure_dir:
+    use_headless()
 
-# Extract coordinates
-with open(file_path, "r") as f: #change "file_path" to "file_data.items()" when processing multiple files
-    content = f.read()
-pattern = r"(\d+\.\d+)\s+(\d+\.\d+)"
-matches = re.findall(pattern, content)
-coordinates = pd.DataFrame(matches, columns=["X", "Y"]).astype(float)
-
-# Scale the side length of the square open field
-x_range = coordinates["X"].max() - coordinates["X"].min()
-y_range = coordinates["Y"].max() - coordinates["Y"].min()
-side_length = np.mean([x_range, y_range])
-scale = 40 / side_length
-coordinates_scaled = coordinates * scale
+# Camera setting: frame per second (Check your camera setting)
+sampling_rate = 30  # Hz
 
-# Normalize coordinates
-coordinates_normalized = coordinates_scaled.copy()
-coordinates_normalized["X"] -= coordinates_scaled["X"].min()
-coordinates_normalized["Y"] -= coordinates_scaled["Y"].min()
+# Track cleaning (see track_cleaning.clean_track): jumps faster than max_speed (cm/s) are rejected, gaps up to
+# max_gap_s are interpolated and the centroid jitter is smoothed; None analyses the raw track
+cleaning = dict(max_speed=150, max_gap_s=0.5, smoothing="savgol", window=5)
 
-# Travel distance (in meters)
-distances = np.sqrt(np.diff(coordinates_scaled["X"])**2 + np.diff(coordinates_scaled["Y"])**2)
-total_distance_cm = distances.sum()
+# Extract coordinates (AnimalTracker *.txt, or track_*.npy from black_mouse_tracker)
+# Tracks from black_mouse_tracker are already in cm through the ROI homography and need no scaling
+calibrated = is_calibrated(file_path)
+coordinates = load_analysis_track(file_path, sampling_rate, "center_cm" if calibrated else "center", cleaning)
 
-# Average speed in 60Hz frame rate (Check your camera setting, we take 60FPS as an example here)
-sampling_rate = 60
-total_time_s = len(coordinates_scaled) / sampling_rate
-average_speed_mps = total_distance_cm / total_time_s
+# Scale the side length of the square open field to 40 cm and normalize coordinates
+arena_size = 40
+coordinates_normalized = coordinates if calibrated else normalize_track(coordinates, arena_size)
 
-# Camera setting: frame per second
-sampling_rate = 30  # Hz
+# Distance, speed and visits to the middle zone (10-30 cm square)
+result = open_field_metrics(coordinates, sampling_rate, arena_size, middle_zone=(10, 30), normalize=not calibrated)
+total_distance_cm = result["total_distance"]
+average_speed_mps = result["average_speed"]
+time_middle_square_s = result["time_middle_s"]
+middle_entries = result["middle_entries"]
+dwell_times = result["dwell_times"]
 
 # Speed calculation
-dx = coordinates_normalized["X"].diff()
-dy = coordinates_normalized["Y"].diff()
-speed = np.sqrt(dx**2 + dy**2) * sampling_rate  # speed in m/s
-coordinates_normalized["speed"] = speed.fillna(0)
-
-# Define the area of the middle zone(s)
-middle_mask = (
-    (coordinates_normalized["X"] >= 10) & (coordinates_normalized["X"] <= 30) &
-    (coordinates_normalized["Y"] >= 10) & (coordinates_normalized["Y"] <= 30)
-)
-time_middle_square_s = middle_mask.sum() / sampling_rate
+speed = compute_speed(coordinates_normalized, sampling_rate)  # speed in cm/s
 
-# Count entries into the middle zone
-middle_entries = (middle_mask & ~middle_mask.shift(1, fill_value=False)).sum()
-
-# Average time per visit
-dwell_times = []
-in_zone = False
-counter = 0
-for point in middle_mask:
-    if point:
-        counter += 1
-        in_zone = True
-    elif in_zone:
-        dwell_times.append(counter / sampling_rate)
-        counter = 0
-        in_zone = False
-# Handle final stay time if it ends inside the middle
-if in_zone and counter > 0:
-    dwell_times.append(counter / sampling_rate)
+# Time spent and mean speed per 1 x 1 cm bin
+occupancy, mean_speed = heatmap_grids(coordinates_normalized, speed, arena_size, bins=40,
+                                      sampling_rate=sampling_rate)
 
 # Draw open-field
 def draw_field(ax):
@@ -90,10 +64,10 @@ print(f"Number of entries into middle square: {middle_entries}")
 print(f"Dwell times in middle square (s): {np.round(dwell_times, 2).tolist()}")
 
 # Plot animal track
-fig, ax = plt.subplots(figsize=(6, 6)) # Mark this line when processing multiple files
+track_fig, ax = plt.subplots(figsize=(6, 6)) # Mark this line when processing multiple files
 # Unmark the line below to process multiple files
 # fig, axs = plt.subplots(2, 2, figsize=(12, 12))
-ax.plot(coordinates_normalized["X"], coordinates_normalized["Y"], color='blue', linewidth=1)
+ax.plot(coordinates_normalized[:, 0], coordinates_normalized[:, 1], color='blue', linewidth=1)
 draw_field(ax)
 ax.set_title("Your_title_here") # Define your plot title here
 ax.set_xlim(0, 40)
@@ -104,9 +78,8 @@ ax.set_ylabel("Y (cm)")
 ax.grid(True)
 
 # Plot speed heatmap
-fig, ax = plt.subplots(figsize=(7, 6))# Mark this line when processing multiple files
-sc = ax.scatter(coordinates_normalized["X"], coordinates_normalized["Y"],
-                c=coordinates_normalized["speed"], cmap="viridis", s=3)
+speed_fig, ax = plt.subplots(figsize=(7, 6))# Mark this line when processing multiple files
+plot_heatmap(ax, mean_speed, arena_size, "Speed (cm/s)", orientation='horizontal')
 ax.set_title("Your_title_here") # Define your plot title here
 ax.set_xlim(0, 40)
 ax.set_ylim(0, 40)
@@ -114,8 +87,17 @@ ax.set_aspect('equal')
 ax.set_xlabel("X (cm)")
 ax.set_ylabel("Y (cm)")
 ax.grid(True)
-cbar = plt.colorbar(sc, ax=ax, orientation='horizontal')
-cbar.set_label("Speed (cm/s)")
+
+# Plot occupancy heatmap
+occupancy_fig, ax = plt.subplots(figsize=(7, 6))
+plot_heatmap(ax, occupancy, arena_size, "Time (s)", orientation='horizontal')
+draw_field(ax)
+ax.set_title("Your_title_here") # Define your plot title here
+ax.set_xlim(0, 40)
+ax.set_ylim(0, 40)
+ax.set_aspect('equal')
+ax.set_xlabel("X (cm)")
+ax.set_ylabel("Y (cm)")
 
 plt.tight_layout()
-plt.show()
+show_or_save({"track": track_fig, "speed": speed_fig, "occupancy": occupancy_fig}, figure_dir, figure_prefix(file_path))
@@ -4,64 +4,40 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import re
+from track_io import is_calibrated
+from track_cleaning import load_analysis_track
+from opf_metrics import normalize_track, open_field_metrics
+from figures import use_headless, show_or_save, figure_prefix
 
 # Load OPF mouse data
 file_path = "G:/OPF_VIDEOS/20250403_143-1-track.txt"  # Directory to the coordinates file in *.TXT format
-
-# Extract coordinates
-with open(file_path, "r") as f: 
-    content = f.read()
-pattern = r"(\d+\.\d+)\s+(\d+\.\d+)"
-matches = re.findall(pattern, content)
-coordinates = pd.DataFrame(matches, columns=["X", "Y"]).astype(float)
-
-# Scale the side length of the square open field
-x_range = coordinates["X"].max() - coordinates["X"].min()
-y_range = coordinates["Y"].max() - coordinates["Y"].min()
-side_length = np.mean([x_range, y_range])
-scale = 40 / side_length
-coordinates_scaled = coordinates * scale
-
-# Normalize coordinates
-coordinates_normalized = coordinates_scaled.copy()
-coordinates_normalized["X"] -= coordinates_scaled["X"].min()
-coordinates_normalized["Y"] -= coordinates_scaled["Y"].min()
-
-# Travel distance (in meters)
-distances = np.sqrt(np.diff(coordinates_scaled["X"])**2 + np.diff(coordinates_scaled["Y"])**2)
-total_distance_cm = distances.sum()
+figure_dir = None  # Set to a directory to save the figures as PNG files instead of showing them (headless)
+if figure_dir:
+    use_headless()
 
 # Average speed in 60Hz frame rate (Check your camera setting, we take 60FPS as an example here)
 sampling_rate = 60
-total_time_s = len(coordinates_scaled) / sampling_rate
-average_speed_mps = total_distance_cm / total_time_s
 
-# Define the area of the middle zone(s)
-middle_mask = (
-    (coordinates_normalized["X"] >= 10) & (coordinates_normalized["X"] <= 30) &
-    (coordinates_normalized["Y"] >= 10) & (coordinates_normalized["Y"] <= 30)
-)
-time_middle_square_s = middle_mask.sum() / sampling_rate
+# Track cleaning (see track_cleaning.clean_track): jumps faster than max_speed (cm/s) are rejected, gaps up to
+# max_gap_s are interpolated and the centroid jitter is smoothed; None analyses the raw track
+cleaning = dict(max_speed=150, max_gap_s=0.5, smoothing="savgol", window=5)
+
+# Extract coordinates (AnimalTracker *.txt, or track_*.npy from black_mouse_tracker)
+# Tracks from black_mouse_tracker are already in cm through the ROI homography and need no scaling
+calibrated = is_calibrated(file_path)
+coordinates = load_analysis_track(file_path, sampling_rate, "center_cm" if calibrated else "center", cleaning)
 
-# Count entries into the middle zone
-middle_entries = (middle_mask & ~middle_mask.shift(1, fill_value=False)).sum()
+# Scale the side length of the square open field to 40 cm and normalize coordinates
+arena_size = 40
+coordinates_normalized = coordinates if calibrated else normalize_track(coordinates, arena_size)
 
-# Average time per visit
-dwell_times = []
-in_zone = False
-counter = 0
-for point in middle_mask:
-    if point:
-        counter += 1
-        in_zone = True
-    elif in_zone:
-        dwell_times.append(counter / sampling_rate)
-        counter = 0
-        in_zone = False
-# Handle final stay time if it ends inside the middle
-if in_zone and counter > 0:
-    dwell_times.append(counter / sampling_rate)
+# Distance, speed and visits to the middle zone (10-30 cm square)
+result = open_field_metrics(coordinates, sampling_rate, arena_size, middle_zone=(10, 30), normalize=not calibrated)
+total_distance_cm = result["total_distance"]
+average_speed_cmps = result["average_speed"]
+time_middle_square_s = result["time_middle_s"]
+middle_entries = result["middle_entries"]
+dwell_times = result["dwell_times"]
 
 # Draw open-field
 def draw_field(ax):
@@ -71,12 +47,19 @@ def draw_field(ax):
     ax.add_patch(middle)
 
 # Print results
-print(f"Total distance traveled: {total_distance_m:.2f} meters")
-print(f"Average speed: {average_speed_mps:.2f} m/s")
+print(f"Total distance traveled: {total_distance_cm:.2f} cm")
+print(f"Average speed: {average_speed_cmps:.2f} cm/s")
 print(f"Dwell time in middle square: {time_middle_square_s:.2f} s")
 print(f"Number of entries into middle square: {middle_entries}")
 print(f"Dwell times in middle square (s): {np.round(dwell_times, 2).tolist()}")
 
+# Summary of this animal
+metrics = ["Total distance (cm)", "Average speed (cm/s)", "Time in middle (s)",
+           "Middle entries", "Mean visit (s)"]
+values = [round(total_distance_cm, 2), round(average_speed_cmps, 2), round(time_middle_square_s, 2),
+          middle_entries, round(np.mean(dwell_times), 2) if len(dwell_times) else 0.0]
+summary_df = pd.DataFrame([values], columns=metrics)
+
 # Print tab-separated values for Excel
 print("\nCopy and paste into Excel:")
 print("\t".join(metrics))
@@ -87,7 +70,7 @@ print("\t".join(map(str, values)))
 
 # Plot animal track
 fig, ax = plt.subplots(figsize=(6, 6))
-ax.plot(coordinates_normalized["X"], coordinates_normalized["Y"], color='blue', linewidth=1)
+ax.plot(coordinates_normalized[:, 0], coordinates_normalized[:, 1], color='blue', linewidth=1)
 draw_field(ax)
 ax.set_title("Your_title_here") # Define your plot title here
 ax.set_xlim(0, 40)
@@ -98,4 +81,4 @@ ax.set_ylabel("Y (cm)")
 ax.grid(True)
 
 plt.tight_layout()
-plt.show()
+show_or_save({"track": fig}, figure_dir, figure_prefix(file_path))
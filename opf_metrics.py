@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Open-field metrics shared by the analysis scripts.
+
+All metrics are computed on NumPy arrays without per-sample Python loops; zone visits are
+found by run-length encoding of the zone mask. cohort_metrics handles many animals in one
+pass over their concatenated tracks, and OpenFieldAccumulator updates the same metrics
+incrementally as samples arrive (live tracking, or chunks of a long track; see
+streaming_metrics). Distances and speeds are summed in fixed blocks of samples (block_sums),
+so both give exactly the same result however the track is split into chunks.
+NaN samples (gaps left by track_cleaning.clean_track) count as time but add no distance and
+are never in a zone.
+"""
+
+import numpy as np
+
+SUM_BLOCK = 4096  # Samples per block of the distance and speed sums
+
+def normalize_track(xy, arena_size=40.0):
+    """
+    Scale a track so that the mean of its X and Y ranges equals arena_size (e.g. 40 cm or 1 m),
+    and shift it so that the minimum X and Y are 0. Returns an (N, 2) float64 array.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    side_length = np.mean(np.nanmax(xy, axis=0) - np.nanmin(xy, axis=0))
+    scaled = xy * (arena_size / side_length)
+    return scaled - np.nanmin(scaled, axis=0)
+
+def middle_zone_bounds(arena_size):
+    """
+    Default middle zone: the central square spanning the middle half of the arena.
+    """
+    return (arena_size / 4, 3 * arena_size / 4)
+
+def compute_speed(xy, sampling_rate):
+    """
+    Instantaneous speed of each sample (distance from the previous sample x sampling rate),
+    0 for the first sample and NaN next to a gap (NaN sample). Units follow xy (e.g. cm -> cm/s).
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    speed = np.zeros(len(xy))
+    if len(xy) > 1:
+        d = np.diff(xy, axis=0)
+        speed[1:] = np.sqrt(d[:, 0]**2 + d[:, 1]**2) * sampling_rate
+    return speed
+
+def run_lengths(mask):
+    """
+    Run-length encoding of the True runs of a boolean array.
+    Returns the start index and the length of every run.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts, ends - starts
+
+def track_scaling(mins, maxs, arena_size=40.0, normalize=True):
+    """
+    Scale and offset that normalize_track applies to tracks with the given (K, 2) minima and
+    maxima: normalized = xy * scale - offset. Tracks where normalize (one bool, or one per track)
+    is False keep scale 1 and offset 0. Returns the (K,) scales and (K, 2) offsets.
+    """
+    mins = np.asarray(mins, dtype=np.float64).reshape(-1, 2)
+    maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 2)
+    normalize = np.broadcast_to(np.asarray(normalize, dtype=bool), (len(mins),))
+    scale = np.where(normalize, arena_size / (maxs - mins).mean(axis=1), 1.0)
+    offset = np.where(normalize[:, None], mins * scale[:, None], 0.0)
+    return scale, offset
+
+def _fold(sums, total=0.0):
+    # Left-to-right addition of block sums, as a running total over chunks adds them.
+    for s in sums.tolist():
+        total += s
+    return total
+
+def block_sums(values, lengths):
+    """
+    Sums of the consecutive segments of values with the given lengths, independent of chunking:
+    each segment is cut into blocks of SUM_BLOCK samples from its start, every block is summed
+    zero-padded to SUM_BLOCK, and the block sums are added from left to right. OpenFieldAccumulator
+    sums a track it gets in chunks of any size in exactly the same way.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n_blocks = -(-lengths // SUM_BLOCK)
+    first_block = np.concatenate(([0], np.cumsum(n_blocks)[:-1]))
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    padded = np.zeros((n_blocks.sum(), SUM_BLOCK))
+    flat = padded.reshape(-1)
+    for start, length, block in zip(starts, lengths, first_block):
+        flat[block * SUM_BLOCK:block * SUM_BLOCK + length] = values[start:start + length]
+    sums = padded.sum(axis=1)
+    return np.array([_fold(sums[b:b + n]) for b, n in zip(first_block, n_blocks)])
+
+def cohort_metrics(tracks, sampling_rate, arena_size=40.0, middle_zone=None, normalize=True):
+    """
+    Open-field metrics for several animals at once.
+    tracks is a list of (N_i, 2) raw coordinate arrays (each with at least 2 samples); every track
+    is scaled with normalize_track, except where normalize (one bool, or one per track) is False:
+    such tracks are already in arena units, e.g. cm from the ROI homography of the tracker, and are
+    used as they are. middle_zone = (low, high) is the middle square in
+    normalized units (default: middle_zone_bounds). Returns one dict per animal with
+    total_distance, total_time_s, average_speed, time_middle_s, middle_entries,
+    dwell_times (s, one per middle-zone visit) and average_middle_speed.
+    """
+    if middle_zone is None:
+        middle_zone = middle_zone_bounds(arena_size)
+    lengths = np.array([len(t) for t in tracks])
+    if (lengths < 2).any():
+        raise ValueError("Every track needs at least 2 samples")
+    n_animals = len(tracks)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    last = starts + lengths - 1
+    animal = np.repeat(np.arange(n_animals), lengths)
+    xy = np.concatenate([np.asarray(t, dtype=np.float64) for t in tracks])
+
+    # Per-animal scaling to arena_size, as normalize_track does for one track.
+    scale, offset = track_scaling(np.fmin.reduceat(xy, starts, axis=0), np.fmax.reduceat(xy, starts, axis=0),
+                                  arena_size, normalize)
+    scaled = xy * scale[animal, None]
+    normalized = scaled - offset[animal]
+
+    # Step i is the distance from sample i - 1 to sample i; the first sample of each animal has none.
+    d = np.diff(scaled, axis=0)
+    step = np.zeros(len(xy))
+    step[1:] = np.sqrt(d[:, 0]**2 + d[:, 1]**2)
+    step[starts] = 0
+    step[np.isnan(step)] = 0  # No distance into or out of a gap
+    total_distance = block_sums(step, lengths)
+    total_time_s = lengths / sampling_rate
+    speed = step * sampling_rate
+
+    low, high = middle_zone
+    in_middle = ((normalized[:, 0] >= low) & (normalized[:, 0] <= high) &
+                 (normalized[:, 1] >= low) & (normalized[:, 1] <= high))
+    middle_samples = np.add.reduceat(in_middle.astype(np.int64), starts)
+    middle_speed_sum = block_sums(np.where(in_middle, speed, 0.0), lengths)
+
+    # Visits: runs of in_middle, broken at animal boundaries.
+    breaks = np.zeros(len(xy), dtype=bool)
+    breaks[starts] = True
+    run_start = in_middle & (breaks | ~np.concatenate(([False], in_middle[:-1])))
+    run_end = np.zeros(len(xy), dtype=bool)
+    run_end[:-1] = in_middle[:-1] & (breaks[1:] | ~in_middle[1:])
+    run_end[last] = in_middle[last]
+    visit_lengths = np.flatnonzero(run_end) - np.flatnonzero(run_start) + 1
+    entries = np.bincount(animal[run_start], minlength=n_animals)
+    dwell_times = np.split(visit_lengths / sampling_rate, np.cumsum(entries)[:-1])
+
+    results = []
+    for i in range(n_animals):
+        results.append({
+            "total_distance": total_distance[i],
+            "total_time_s": total_time_s[i],
+            "average_speed": total_distance[i] / total_time_s[i],
+            "time_middle_s": middle_samples[i] / sampling_rate,
+            "middle_entries": int(entries[i]),
+            "dwell_times": dwell_times[i],
+            "average_middle_speed": middle_speed_sum[i] / middle_samples[i] if middle_samples[i] else 0.0,
+        })
+    return results
+
+def open_field_metrics(xy, sampling_rate, arena_size=40.0, middle_zone=None, normalize=True):
+    """
+    Open-field metrics of a single track; see cohort_metrics for the returned keys.
+    """
+    return cohort_metrics([xy], sampling_rate, arena_size, middle_zone, normalize)[0]
+
+class _BlockSum:
+    """
+    Running sum of a stream of values, added up block by block as block_sums does.
+    """
+    def __init__(self):
+        self.total = 0.0
+        self._pending = np.empty(0)  # Values of the incomplete last block
+
+    def add(self, values):
+        values = np.concatenate((self._pending, values))
+        n_full = len(values) - len(values) % SUM_BLOCK
+        self.total = _fold(values[:n_full].reshape(-1, SUM_BLOCK).sum(axis=1), self.total)
+        self._pending = values[n_full:]
+
+    def result(self):
+        if not len(self._pending):
+            return self.total
+        last = np.zeros((1, SUM_BLOCK))
+        last[0, :len(self._pending)] = self._pending
+        return _fold(last.sum(axis=1), self.total)
+
+class OpenFieldAccumulator:
+    """
+    Open-field metrics updated incrementally, one sample or chunk of samples at a time, with the
+    last sample, any open middle-zone visit and the incomplete sum blocks carried across updates.
+    Samples are used as xy * scale - offset (see track_scaling; by default as they are, in arena
+    units such as cm), as no whole-track normalization is possible here. result() returns exactly
+    what cohort_metrics returns for all samples so far with the same scaling.
+    """
+    def __init__(self, sampling_rate, arena_size=40.0, middle_zone=None, scale=1.0, offset=(0.0, 0.0)):
+        self.sampling_rate = sampling_rate
+        self.middle_zone = middle_zone_bounds(arena_size) if middle_zone is None else middle_zone
+        self.scale = scale
+        self.offset = np.asarray(offset, dtype=np.float64)
+        self.n_samples = 0
+        self.middle_samples = 0
+        self.visit_lengths = []  # Samples per finished middle-zone visit
+        self.open_visit = 0  # Samples of the visit in progress (0 if outside the middle zone)
+        self._distance = _BlockSum()
+        self._middle_speed = _BlockSum()
+        self._last = None  # Last scaled sample
+
+    def update(self, xy):
+        """
+        Add an (N, 2) chunk of samples (or a single X, Y point).
+        """
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        if not len(xy):
+            return
+        scaled = xy * self.scale
+        step = np.zeros(len(xy))
+        if self._last is not None:
+            d = np.diff(np.vstack((self._last, scaled)), axis=0)
+        else:
+            d = np.diff(scaled, axis=0)
+        step[len(xy) - len(d):] = np.sqrt(d[:, 0]**2 + d[:, 1]**2)
+        step[np.isnan(step)] = 0
+        self._last = scaled[-1].copy()
+        self.n_samples += len(xy)
+        self._distance.add(step)
+
+        normalized = scaled - self.offset
+        low, high = self.middle_zone
+        in_middle = ((normalized[:, 0] >= low) & (normalized[:, 0] <= high) &
+                     (normalized[:, 1] >= low) & (normalized[:, 1] <= high))
+        self.middle_samples += int(in_middle.sum())
+        self._middle_speed.add(np.where(in_middle, step * self.sampling_rate, 0.0))
+
+        starts, lengths = run_lengths(in_middle)
+        if not len(starts):
+            if self.open_visit:
+                self.visit_lengths.append(self.open_visit)
+                self.open_visit = 0
+            return
+        lengths = lengths.tolist()
+        if starts[0] == 0:
+            lengths[0] += self.open_visit  # The visit in progress continues
+        elif self.open_visit:
+            self.visit_lengths.append(self.open_visit)
+        self.open_visit = 0
+        if in_middle[-1]:
+            self.open_visit = lengths.pop()
+        self.visit_lengths.extend(lengths)
+
+    def result(self):
+        """
+        Metrics of all samples so far, with a visit in progress counted as ended.
+        """
+        visits = self.visit_lengths + ([self.open_visit] if self.open_visit else [])
+        total_distance = self._distance.result()
+        middle_speed_sum = self._middle_speed.result()
+        total_time_s = self.n_samples / self.sampling_rate
+        return {
+            "total_distance": total_distance,
+            "total_time_s": total_time_s,
+            "average_speed": total_distance / total_time_s if self.n_samples else 0.0,
+            "time_middle_s": self.middle_samples / self.sampling_rate,
+            "middle_entries": len(visits),
+            "dwell_times": np.array(visits, dtype=np.int64) / self.sampling_rate,
+            "average_middle_speed": middle_speed_sum / self.middle_samples if self.middle_samples else 0.0,
+        }
+
+def streaming_metrics(read_chunks, sampling_rate, arena_size=40.0, middle_zone=None, normalize=True):
+    """
+    Open-field metrics of one track read in chunks, for recordings too long to load at once.
+    read_chunks() returns a new iterator over (n, 2) chunks of the track (e.g. with
+    track_io.iter_track_coordinates). Only one chunk is held at a time; with normalize the track
+    is read twice, first for the range that normalize_track scales by. The result is exactly
+    that of open_field_metrics on the whole track.
+    """
+    scale, offset = 1.0, (0.0, 0.0)
+    if normalize:
+        mins = np.full(2, np.nan)
+        maxs = np.full(2, np.nan)
+        for xy in read_chunks():
+            xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+            if len(xy):
+                mins = np.fmin(mins, np.fmin.reduce(xy, axis=0))
+                maxs = np.fmax(maxs, np.fmax.reduce(xy, axis=0))
+        scales, offsets = track_scaling(mins, maxs, arena_size)
+        scale, offset = scales[0], offsets[0]
+    accumulator = OpenFieldAccumulator(sampling_rate, arena_size, middle_zone, scale, offset)
+    for xy in read_chunks():
+        accumulator.update(xy)
+    if accumulator.n_samples < 2:
+        raise ValueError("Every track needs at least 2 samples")
+    return accumulator.result()
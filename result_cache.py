@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed on-disk cache for tracking and analysis results.
+
+Results are keyed on a hash of the input file content plus every parameter that affects them,
+so unchanged sessions are never re-tracked or re-analysed, while a changed file or parameter
+simply misses. The cache directory is kept under a size limit by evicting the least recently
+used entries. File digests are remembered in one small file per input path, so processes sharing
+the directory never rewrite each other's, and the digests of deleted or changed files are pruned.
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+
+import numpy as np
+
+CACHE_VERSION = 3  # Bump when the cached result formats change
+DIGEST_DIR = "digests"
+LEGACY_DIGEST_INDEX = "digests.json"  # Single digest index of earlier versions, removed when pruning
+
+def _to_json(value):
+    # json.dumps fallback for NumPy values and tuples inside the parameters.
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of pickled results in cache_dir.
+    Several processes may share one cache directory: entries are written atomically, and an
+    entry evicted by another process is just a cache miss.
+    """
+    def __init__(self, cache_dir, max_bytes=10 * 1024**3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.digest_dir = os.path.join(cache_dir, DIGEST_DIR)
+        os.makedirs(self.digest_dir, exist_ok=True)
+
+    def file_digest(self, path):
+        """
+        SHA-256 of a file's content. Digests are remembered per path, size and modification
+        time, so a large video is only hashed again when it changes.
+        """
+        stat = os.stat(path)
+        index_key = os.path.abspath(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry_file = os.path.join(self.digest_dir, hashlib.sha256(index_key.encode()).hexdigest() + ".json")
+        entry = self._load_entry(entry_file)
+        if entry and entry["path"] == index_key and entry["signature"] == signature:
+            return entry["digest"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest = digest.hexdigest()
+
+        # A stale entry of the same path is replaced.
+        self._write_atomic(entry_file, json.dumps({"path": index_key, "signature": signature,
+                                                   "digest": digest}).encode())
+        return digest
+
+    def key(self, path, **params):
+        """
+        Cache key for the results of processing the file at path with the given parameters.
+        """
+        payload = json.dumps({"version": CACHE_VERSION, "file": self.file_digest(path), "params": params},
+                             sort_keys=True, default=_to_json)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached result for key, or None if it is not cached.
+        """
+        entry = os.path.join(self.cache_dir, f"{key}.pkl")
+        try:
+            with open(entry, "rb") as f:
+                result = pickle.load(f)
+            os.utime(entry)  # Mark as recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        return result
+
+    def put(self, key, result):
+        """
+        Store a result under key, then evict least recently used entries above max_bytes.
+        """
+        self._write_atomic(os.path.join(self.cache_dir, f"{key}.pkl"),
+                           pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache fits in max_bytes, and if any
+        were deleted, prune the remembered digests (see prune_digests).
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                if e.name.endswith(".pkl"):
+                    try:
+                        stat = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.prune_digests()
+
+    def prune_digests(self):
+        """
+        Delete the remembered digests of files that no longer exist or changed since they were
+        hashed (and the digests.json index of earlier versions).
+        """
+        stale = [os.path.join(self.cache_dir, LEGACY_DIGEST_INDEX)]
+        with os.scandir(self.digest_dir) as it:
+            for e in it:
+                entry = self._load_entry(e.path)
+                try:
+                    stat = os.stat(entry["path"])
+                except (OSError, TypeError, KeyError):
+                    stale.append(e.path)
+                    continue
+                if entry.get("signature") != [stat.st_size, stat.st_mtime_ns]:
+                    stale.append(e.path)
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _load_entry(entry_file):
+        try:
+            with open(entry_file, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
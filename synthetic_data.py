@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic open-field data with a known ground truth, for benchmarks and checks that need no
+recorded videos.
+
+A mouse path is simulated as a correlated random walk inside a square arena. It is drawn as a
+dark ellipse, oriented along its heading, on a bright arena floor, with per-pixel noise and a
+slow drift of the lighting, and written as a video. The same kind of path can be written as an
+AnimalTracker-style coordinate text file or as a binary track file. Everything is seeded, so
+the same settings always give the same data.
+"""
+
+import numpy as np
+import cv2
+
+from track_io import TRACK_DTYPE
+
+# Scene defaults
+arena_gray = 200  # Arena floor
+surround_gray = 70  # Outside the arena
+mouse_gray = 35  # Mouse body
+mouse_axes = (22, 10)  # Half-length and half-width of the mouse ellipse (pixels)
+noise_sd = 6.0  # Gray levels of per-pixel noise
+lighting_drift = 0.12  # Relative amplitude of the slow lighting change
+lighting_period_s = 60.0
+selected_thresh = 100  # Threshold that separates the mouse from the floor under all lighting
+
+def simulate_path(n_samples, arena_size, sampling_rate, mean_speed=None, turn_sd=0.25, margin=0.0, seed=0):
+    """
+    Correlated random walk of n_samples positions inside [margin, arena_size - margin]^2, starting
+    in the middle. The speed (arena units per second, default arena_size / 8) changes slowly and
+    the heading turns by normally distributed angles of turn_sd radians per sample; the path
+    reflects off the walls.
+    Returns the positions as an (N, 2) float64 array and the heading of every sample (radians).
+    """
+    rng = np.random.default_rng(seed)
+    if mean_speed is None:
+        mean_speed = arena_size / 8
+    low, high = margin, arena_size - margin
+    headings = np.cumsum(rng.normal(0.0, turn_sd, n_samples)) + rng.uniform(0, 2 * np.pi)
+    # Bouts of running and resting: a smoothed positive speed around mean_speed.
+    kernel = np.ones(max(int(sampling_rate), 1))
+    speeds = np.convolve(rng.exponential(mean_speed, n_samples), kernel / kernel.sum(), mode="same")
+    steps = np.column_stack((np.cos(headings), np.sin(headings))) * (speeds / sampling_rate)[:, None]
+
+    # Integrate and fold the unbounded walk back into the arena (reflection off the walls).
+    span = high - low
+    xy = np.cumsum(steps, axis=0) + span / 2
+    xy = np.abs((xy + span) % (2 * span) - span) + low
+    heading_xy = np.diff(xy, axis=0, prepend=xy[:1] - steps[:1])
+    return xy, np.arctan2(heading_xy[:, 1], heading_xy[:, 0])
+
+def write_coordinate_file(path, n_samples, arena_px=400.0, sampling_rate=30, seed=0):
+    """
+    Write a simulated track as "X Y" lines in pixels, in the "%.5f %.5f" format of
+    black_mouse_tracker and AnimalTracker. Returns the path.
+    """
+    xy, _ = simulate_path(n_samples, arena_px, sampling_rate, seed=seed)
+    np.savetxt(path, xy + 50.0, fmt="%.5f", delimiter=" ")
+    return path
+
+def write_track_file(path, n_samples, arena_size_cm=40.0, px_per_cm=10.0, sampling_rate=30, miss_rate=0.01,
+                     seed=0):
+    """
+    Write a simulated track as a binary track file (track_io.TRACK_DTYPE), with the center in pixels
+    and in cm, a body ellipse along the heading, and about miss_rate of the frames without a detection.
+    Returns the path.
+    """
+    xy_cm, headings = simulate_path(n_samples, arena_size_cm, sampling_rate, seed=seed)
+    nose_cm = xy_cm + 2.0 * np.column_stack((np.cos(headings), np.sin(headings)))
+    track = np.zeros(n_samples, dtype=TRACK_DTYPE)
+    track["frame"] = np.arange(n_samples)
+    track["time"] = track["frame"] / sampling_rate
+    track["valid"] = np.random.default_rng(seed + 1).random(n_samples) >= miss_rate
+    track["center"] = xy_cm * px_per_cm
+    track["nose"] = nose_cm * px_per_cm
+    track["center_cm"] = xy_cm
+    track["nose_cm"] = nose_cm
+    track["ellipse"] = np.column_stack((np.full(n_samples, 8.0 * px_per_cm), np.full(n_samples, 3.5 * px_per_cm),
+                                        np.degrees(headings) % 180))
+    for part in ("center", "nose", "center_cm", "nose_cm", "ellipse"):
+        track[part][~track["valid"]] = np.nan
+    np.save(path, track)
+    return path
+
+def arena_roi(frame_size, margin=40):
+    """
+    ROI polygon (np.int32 (4, 2), clockwise from the top-left) of the largest centred square
+    arena that leaves margin pixels to the frame border.
+    """
+    width, height = frame_size
+    side = min(width, height) - 2 * margin
+    x0, y0 = (width - side) // 2, (height - side) // 2
+    return np.array([(x0, y0), (x0 + side, y0), (x0 + side, y0 + side), (x0, y0 + side)], dtype=np.int32)
+
+def arena_video_truth(n_frames, frame_size=(640, 480), fps=30.0, seed=0):
+    """
+    Tracking settings and ground truth of the video write_arena_video makes with the same arguments,
+    without writing it: a dict with the ROI, a click point on the mouse in the first frame, a working
+    threshold, the frame rate, and the true center (pixels) and heading (radians) in every frame.
+    """
+    roi = arena_roi(frame_size)
+    x0, y0 = roi[0]
+    side = roi[1][0] - x0
+    margin = mouse_axes[0] + 2  # Keep the whole mouse inside the arena
+    xy, headings = simulate_path(n_frames, side, fps, mean_speed=side / 6, margin=margin, seed=seed)
+    centers = xy + (x0, y0)
+    return {
+        "roi": roi,
+        "clicked_point": (int(round(centers[0][0])), int(round(centers[0][1]))),
+        "selected_thresh": selected_thresh,
+        "fps": fps,
+        "centers": centers,
+        "headings": headings,
+    }
+
+def write_arena_video(path, n_frames, frame_size=(640, 480), fps=30.0, seed=0):
+    """
+    Write a synthetic open-field video of n_frames (MJPG-compressed AVI): a dark ellipse moving on
+    a bright square arena, with noise and lighting drift. Returns the arena_video_truth dict.
+    """
+    width, height = frame_size
+    truth = arena_video_truth(n_frames, frame_size, fps, seed)
+    roi, centers, headings = truth["roi"], truth["centers"], truth["headings"]
+
+    base = np.full((height, width), surround_gray, dtype=np.uint8)
+    cv2.fillPoly(base, [roi], arena_gray)
+    rng = np.random.default_rng(seed)
+    noise = np.empty((height, width), dtype=np.float32)
+    frame = np.empty((height, width), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, frame_size)
+    if not writer.isOpened():
+        raise IOError(f"Could not open {path} for writing")
+    try:
+        for i, ((cx, cy), heading) in enumerate(zip(centers, headings)):
+            np.copyto(frame, base)
+            cv2.ellipse(frame, (int(round(cx)), int(round(cy))), mouse_axes, np.degrees(heading), 0, 360,
+                        mouse_gray, -1, cv2.LINE_AA)
+            gain = 1.0 + lighting_drift * np.sin(2 * np.pi * i / (fps * lighting_period_s))
+            rng.standard_normal(dtype=np.float32, out=noise)
+            noisy = frame * np.float32(gain) + noise * np.float32(noise_sd)
+            np.clip(noisy, 0, 255, out=noisy)
+            writer.write(cv2.cvtColor(noisy.astype(np.uint8), cv2.COLOR_GRAY2BGR))
+    finally:
+        writer.release()
+    return truth
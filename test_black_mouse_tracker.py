@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of black_mouse_tracker against the ground truth of synthetic_data videos.
+"""
+
+import numpy as np
+import pytest
+
+from black_mouse_tracker import (BackgroundSegmenter, create_mask, estimate_background, track_mouse,
+                                 verify_parallel_tracking)
+from synthetic_data import write_arena_video
+
+def test_nose_follows_true_heading(tmp_path):
+    video_path = str(tmp_path / "arena.avi")
+    truth = write_arena_video(video_path, 200, frame_size=(320, 240), seed=3)
+    mask = create_mask((240, 320), truth["roi"])
+    tracked_points = track_mouse(video_path, mask, truth["selected_thresh"], truth["clicked_point"],
+                                 truth["fps"], start_frame=0)
+
+    errors = []
+    for point in tracked_points:
+        if point["center"] is None:
+            continue
+        nose_vec = np.subtract(point["nose"], point["center"])
+        heading = truth["headings"][point["frame"]]
+        error = np.angle(np.exp(1j * (np.arctan2(nose_vec[1], nose_vec[0]) - heading)))
+        errors.append(abs(np.degrees(error)))
+    errors = np.array(errors)
+    assert len(errors) > 0.9 * len(tracked_points)
+    assert np.mean(errors < 45) > 0.9
+    assert np.median(errors) < 15
+
+@pytest.mark.parametrize("search_radius", [None, 60])
+def test_parallel_tracking_matches_sequential(tmp_path, search_radius):
+    video_path = str(tmp_path / "arena.avi")
+    truth = write_arena_video(video_path, 400, seed=1)
+    mask = create_mask((480, 640), truth["roi"])
+    assert verify_parallel_tracking(video_path, mask, truth["selected_thresh"], truth["clicked_point"],
+                                    truth["fps"], n_workers=4, search_radius=search_radius)
+
+@pytest.mark.parametrize("learning_rate", [0.0, 0.05])
+def test_parallel_background_tracking_matches_sequential(tmp_path, learning_rate):
+    # A static background is split into chunks, an adaptive one is tracked sequentially.
+    video_path = str(tmp_path / "arena.avi")
+    truth = write_arena_video(video_path, 300, seed=2)
+    mask = create_mask((480, 640), truth["roi"])
+    segmenter = BackgroundSegmenter(estimate_background(video_path), 40, learning_rate)
+    assert verify_parallel_tracking(video_path, mask, segmenter, truth["clicked_point"], truth["fps"],
+                                    n_workers=3)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of heatmaps.cohort_grids.
+"""
+
+import numpy as np
+
+from heatmaps import cohort_grids, heatmap_grids
+
+def test_cohort_grids_weight_animals_equally():
+    rng = np.random.default_rng(0)
+    short = rng.uniform(0, 10, (300, 2))  # One animal in the lower-left quarter
+    long = rng.uniform(10, 20, (3000, 2))  # Another, ten times longer, in the upper-right quarter
+    grids = [heatmap_grids(xy, np.full(len(xy), speed), 20.0, bins=4, sampling_rate=30.0)
+             for xy, speed in ((short, 1.0), (long, 3.0))]
+
+    occupancy, mean_speed = cohort_grids(grids)
+    np.testing.assert_allclose(occupancy.sum(), 1.0)
+    np.testing.assert_allclose(occupancy[:2, :2].sum(), 0.5)
+    np.testing.assert_allclose(occupancy[2:, 2:].sum(), 0.5)
+    np.testing.assert_allclose(mean_speed[:2, :2], 1.0)
+    np.testing.assert_allclose(mean_speed[2:, 2:], 3.0)
+    assert np.isnan(mean_speed[:2, 2:]).all()
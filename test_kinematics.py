@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the chunked kinematic features of kinematics.
+"""
+
+import numpy as np
+import pytest
+
+from kinematics import FEATURES, _window_samples, collect_kinematics, iter_kinematics, window_features
+from synthetic_data import simulate_path
+
+@pytest.mark.parametrize("window_s, step_s", [(1.0, 0.5), (0.5, 1.3), (0.2, 2.0)])
+def test_chunked_features_match_whole_track(window_s, step_s):
+    sampling_rate = 30.0
+    rng = np.random.default_rng(0)
+    xy, headings = simulate_path(2000, 40.0, sampling_rate, seed=1)
+    xy[rng.integers(0, len(xy), 40)] = np.nan
+    ellipse = np.column_stack((np.full(len(xy), 4.0), np.full(len(xy), 2.0), np.degrees(headings) % 180))
+
+    window, step = _window_samples(sampling_rate, window_s, step_s)
+    expected = window_features(xy, ellipse, sampling_rate, window, step)
+    expected["time_s"] = expected.pop("start") / sampling_rate
+
+    for _ in range(5):
+        cuts = np.sort(rng.integers(0, len(xy), 12))
+        chunks = [(a, b) for a, b in zip(np.split(xy, cuts), np.split(ellipse, cuts))]
+        features = collect_kinematics(iter_kinematics(chunks, sampling_rate, window_s, step_s))
+        for key in ("time_s",) + FEATURES:
+            np.testing.assert_array_equal(features[key], expected[key])
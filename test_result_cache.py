@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of result_cache.ResultCache.
+"""
+
+import os
+
+from result_cache import DIGEST_DIR, LEGACY_DIGEST_INDEX, ResultCache
+
+def test_digests_are_pruned_on_eviction(tmp_path):
+    cache_dir = tmp_path / "cache"
+    files = []
+    for i in range(3):
+        path = tmp_path / f"track_{i}.txt"
+        path.write_text(f"{i}.5 {i}.25\n")
+        files.append(path)
+    cache = ResultCache(str(cache_dir), max_bytes=1 << 20)
+    other = ResultCache(str(cache_dir), max_bytes=1 << 20)  # Another process sharing the directory
+    keys = [c.key(str(path), kind="test") for c, path in zip((cache, other, cache), files)]
+    assert keys[0] == other.key(str(files[0]), kind="test")
+    assert len(os.listdir(cache_dir / DIGEST_DIR)) == 3
+    (cache_dir / LEGACY_DIGEST_INDEX).write_text("{}")
+
+    files[0].unlink()
+    files[1].write_text("1.5 1.25\n2.5 2.25\n")
+    cache.max_bytes = 0
+    cache.put(keys[2], {"total_distance": 1.0})
+    assert cache.get(keys[2]) is None
+    assert len(os.listdir(cache_dir / DIGEST_DIR)) == 1
+    assert not (cache_dir / LEGACY_DIGEST_INDEX).exists()
+    assert cache.key(str(files[2]), kind="test") == keys[2]
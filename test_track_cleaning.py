@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of track_cleaning.clean_track.
+"""
+
+import numpy as np
+
+from track_cleaning import clean_track
+
+def small_range_track(n=3000, sampling_rate=30.0, seed=0):
+    # A mouse running at about 40 cm/s in an 8 cm wide corner of the arena, in cm.
+    rng = np.random.default_rng(seed)
+    angle = np.cumsum(rng.normal(0, 0.3, n))
+    xy = np.cumsum(np.column_stack((np.cos(angle), np.sin(angle))) * 40.0 / sampling_rate, axis=0)
+    xy = np.mod(xy, 16.0)
+    xy = np.where(xy > 8.0, 16.0 - xy, xy) + 2.0
+    return xy
+
+def test_calibrated_small_range_keeps_samples():
+    xy = small_range_track()
+    xy[1000:1003] += 20.0  # Three frames on a wrong blob 20 cm away
+    cleaned, report = clean_track(xy, 30.0, max_speed=150.0, normalize=False, smoothing=None)
+    assert report["outliers"] == 3
+    assert report["gaps"] == 0
+    np.testing.assert_allclose(cleaned[:1000], xy[:1000])
+
+def test_pixel_track_limit_follows_metric_scaling():
+    xy = small_range_track() * 10.0 + 100.0  # 10 px per cm
+    xy[2000] += 200.0
+    cleaned, report = clean_track(xy, 30.0, arena_size=40.0, max_speed=150.0, smoothing=None)
+    assert report["outliers"] == 1
+    assert report["interpolated"] == 1
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the chunked text parsing of track_io.
+"""
+
+import re
+
+import numpy as np
+import pytest
+
+from track_io import COORDINATE_PATTERN, iter_coordinates
+
+def random_text(rng, n_tokens):
+    # Decimal pairs mixed with what sends the parser to its regex path: integers, signs, words.
+    tokens = []
+    for _ in range(n_tokens):
+        kind = rng.integers(6)
+        if kind < 3:
+            tokens.append(f"{rng.uniform(0, 500):.{rng.integers(1, 4)}f}")
+        elif kind == 3:
+            tokens.append(str(rng.integers(0, 500)))
+        elif kind == 4:
+            tokens.append(f"-{rng.uniform(0, 5):.2f}")
+        else:
+            tokens.append(rng.choice(["x", "frame:", "1.2.3", "nan", "7.", ".5"]))
+    separators = rng.choice([" ", "  ", "\t", "\n", " \n"], size=n_tokens)
+    return "".join(t + s for t, s in zip(tokens, separators))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_regex_path_matches_findall(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    text = random_text(rng, 400)
+    if seed % 2:
+        # Decimal pairs first, so the fast path yields some before falling back to the regex.
+        text = "".join(f"{x:.3f} {y:.3f}\n" for x, y in rng.uniform(0, 500, (50, 2))) + text
+    path = tmp_path / "track.txt"
+    path.write_text(text)
+    expected = np.array(re.findall(COORDINATE_PATTERN, text), dtype=np.float64).reshape(-1, 2)
+    for chunk_bytes in (7, 16, 61, 1 << 20):
+        chunks = list(iter_coordinates(str(path), chunk_bytes))
+        parsed = np.concatenate(chunks) if chunks else np.empty((0, 2))
+        np.testing.assert_array_equal(parsed, expected)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of tracker_stats.TrackerStats.
+"""
+
+import pickle
+
+import numpy as np
+
+from tracker_stats import PENDING_CALLS, TrackerStats
+
+def test_stage_report_in_constant_memory():
+    rng = np.random.default_rng(0)
+    seconds = rng.lognormal(-7, 1, 50000)
+    first, second = TrackerStats(), TrackerStats()
+    for value in seconds[:20000].tolist():
+        first.add("threshold", value)
+    for value in seconds[20000:].tolist():
+        second.add("threshold", value)
+    assert len(first.stages["threshold"].pending) < PENDING_CALLS
+    first.merge(pickle.loads(pickle.dumps(second)))  # As the chunks of a parallel run
+
+    report = first.to_dict()["stages"]["threshold"]
+    assert report["calls"] == len(seconds)
+    np.testing.assert_allclose(report["total_s"], seconds.sum())
+    np.testing.assert_allclose(report["max_ms"], seconds.max() * 1000)
+    expected = np.percentile(seconds, [50, 95, 99]) * 1000
+    reported = [report["p50_ms"], report["p95_ms"], report["p99_ms"]]
+    np.testing.assert_allclose(reported, expected, rtol=0.03)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Cleaning of tracks between the tracker output and the metrics.
+
+Raw centroids jitter by a pixel or two from frame to frame, single frames can jump to a wrong
+blob, and frames without a detection are missing. Summed step distances grow with all three,
+and counting samples as time is wrong where frames are missing. clean_track therefore puts a
+track on the time grid the metrics assume (one slot per 1 / sampling_rate, from the frame
+timestamps of track_*.npy files), rejects stretches reached by an implausibly fast jump,
+interpolates short gaps and smooths the jitter with a median or Savitzky-Golay filter, all as
+whole-array operations. Longer gaps stay NaN, so the track keeps its true duration; the metrics
+in opf_metrics and nor_metrics leave NaN samples out.
+"""
+
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from track_io import load_track, load_coordinates
+from opf_metrics import run_lengths, track_scaling
+
+SMOOTHING = (None, "median", "savgol")
+
+def time_grid(values, time, sampling_rate):
+    """
+    Place samples with timestamps (s, increasing) on a regular grid of 1 / sampling_rate from the
+    first one. Grid slots without a sample, e.g. of dropped frames, are NaN.
+    Returns the (M, ...) grid and the number of empty slots.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values, 0
+    slots = np.round((np.asarray(time, dtype=np.float64) - time[0]) * sampling_rate).astype(np.int64)
+    grid = np.full((slots[-1] + 1,) + values.shape[1:], np.nan)
+    grid[slots] = values
+    return grid, len(grid) - len(np.unique(slots))
+
+def jump_outliers(xy, sampling_rate, max_speed, max_outlier_s=0.2):
+    """
+    Mask of the samples of short stretches: the track is split at every jump faster than
+    max_speed (xy units per second, measured from the last finite sample), and stretches of at
+    most max_outlier_s are rejected, e.g. the tracker locking onto a wrong blob for a few frames.
+    The longest stretch is always kept.
+    """
+    finite = np.flatnonzero(np.isfinite(xy).all(axis=1))
+    outliers = np.zeros(len(xy), dtype=bool)
+    if len(finite) < 2:
+        return outliers
+    d = np.diff(xy[finite], axis=0)
+    speed = np.sqrt(d[:, 0]**2 + d[:, 1]**2) * sampling_rate / np.diff(finite)
+    jump = np.concatenate(([False], speed > max_speed))
+    if not jump.any():
+        return outliers
+    # Stretch of every finite sample, numbered from the jumps.
+    stretch = np.cumsum(jump)
+    sizes = np.bincount(stretch)
+    short = sizes <= max(max_outlier_s * sampling_rate, 1)
+    short[np.argmax(sizes)] = False
+    outliers[finite[short[stretch]]] = True
+    return outliers
+
+def interpolate_gaps(xy, max_gap):
+    """
+    Linear interpolation over runs of at most max_gap missing (NaN) samples between two finite
+    ones; gaps at the ends and longer gaps stay NaN. Returns the filled copy and the mask of
+    the filled samples.
+    """
+    xy = np.array(xy, dtype=np.float64)
+    missing = ~np.isfinite(xy).all(axis=1)
+    starts, lengths = run_lengths(missing)
+    inner = (starts > 0) & (starts + lengths < len(xy)) & (lengths <= max_gap)
+    marks = np.zeros(len(xy) + 1, dtype=np.int64)
+    np.add.at(marks, starts[inner], 1)
+    np.add.at(marks, starts[inner] + lengths[inner], -1)
+    filled = np.cumsum(marks[:-1]) > 0
+    if filled.any():
+        index = np.arange(len(xy))
+        known = ~missing
+        for k in range(xy.shape[1]):
+            xy[filled, k] = np.interp(index[filled], index[known], xy[known, k])
+    return xy, filled
+
+def savgol_coefficients(window, polyorder):
+    """
+    Savitzky-Golay weights of an odd window: the least-squares polynomial of degree polyorder
+    through the window, evaluated at its center.
+    """
+    half = window // 2
+    powers = np.vander(np.arange(-half, half + 1, dtype=np.float64), polyorder + 1, increasing=True)
+    return np.linalg.pinv(powers)[0]
+
+def smooth_track(xy, method="savgol", window=5, polyorder=2):
+    """
+    Median or Savitzky-Golay smoothing of each coordinate over a centered window of samples
+    (odd; the ends are padded with the first and last sample). Samples whose window reaches into
+    a gap keep their value, so gaps do not grow.
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    if method is None or window < 3 or len(xy) < window:
+        return xy.copy()
+    if window % 2 == 0:
+        raise ValueError("The smoothing window must be odd")
+    half = window // 2
+    windows = sliding_window_view(np.pad(xy, ((half, half), (0, 0)), mode="edge"), window, axis=0)
+    if method == "median":
+        smoothed = np.median(windows, axis=-1)
+    elif method == "savgol":
+        smoothed = windows @ savgol_coefficients(window, polyorder)
+    else:
+        raise ValueError(f"Unknown smoothing {method!r}, expected one of {SMOOTHING}")
+    return np.where(np.isfinite(smoothed), smoothed, xy)
+
+def clean_track(xy, sampling_rate, time=None, arena_size=40.0, max_speed=150.0, max_outlier_s=0.2,
+                max_gap_s=0.5, smoothing="savgol", window=5, polyorder=2, normalize=True):
+    """
+    Clean an (N, 2) track (NaN for missed frames) in one pass:
+    1. with the frame timestamps time (s), put it on the grid of 1 / sampling_rate (time_grid);
+    2. reject stretches of at most max_outlier_s entered by a jump faster than max_speed; with
+       normalize (pixel tracks) max_speed is in arena units per second of the track scaled to
+       arena_size as the metrics scale it (opf_metrics.track_scaling), else (tracks in cm) in the
+       track's own units per second;
+    3. interpolate gaps of at most max_gap_s;
+    4. smooth with smoothing ("median", "savgol" or None) over window samples.
+    Returns the cleaned track and a report dict: samples (after step 1), dropped_frames (empty
+    grid slots), missed (NaN samples before cleaning, dropped frames included), outliers,
+    interpolated and gaps (samples still NaN).
+    """
+    xy = np.asarray(xy, dtype=np.float64)
+    dropped = 0
+    if time is not None:
+        xy, dropped = time_grid(xy, time, sampling_rate)
+    report = {"samples": len(xy), "dropped_frames": dropped,
+              "missed": int((~np.isfinite(xy).all(axis=1)).sum())}
+
+    outliers = np.zeros(len(xy), dtype=bool)
+    if max_speed is not None and len(xy) - report["missed"] >= 2:
+        with np.errstate(divide="ignore"):
+            scale, _ = track_scaling(np.nanmin(xy, axis=0), np.nanmax(xy, axis=0), arena_size, normalize)
+        if np.isfinite(scale[0]):
+            outliers = jump_outliers(xy, sampling_rate, max_speed / scale[0], max_outlier_s)
+            xy = np.where(outliers[:, None], np.nan, xy)
+    report["outliers"] = int(outliers.sum())
+
+    xy, filled = interpolate_gaps(xy, int(max_gap_s * sampling_rate))
+    report["interpolated"] = int(filled.sum())
+    report["gaps"] = int((~np.isfinite(xy).all(axis=1)).sum())
+    return smooth_track(xy, smoothing, window, polyorder), report
+
+def load_track_grid(path, sampling_rate, part="center"):
+    """
+    One part of a track file on the time grid of sampling_rate (see time_grid), with NaN for the
+    frames without a detection. Text files have no timestamps and are returned as they are.
+    Returns the array and the number of dropped frames.
+    """
+    if os.path.splitext(path)[1].lower() != ".npy":
+        return load_coordinates(path), 0
+    track = load_track(path)
+    if part not in track.dtype.names:
+        raise ValueError(f"{path} has no {part} coordinates")
+    values = np.array(track[part], dtype=np.float64)
+    values[~track["valid"]] = np.nan
+    return time_grid(values, track["time"], sampling_rate)
+
+def load_clean_track(path, sampling_rate, part="center", **cleaning):
+    """
+    Load one part of a track file ("center"/"nose", or "center_cm"/"nose_cm", see
+    track_io.load_coordinates) and clean it with clean_track; binary track files are put on the
+    time grid from their frame timestamps. cleaning holds the clean_track keyword arguments;
+    unless given, normalize is False for the parts in cm.
+    Returns the cleaned (N, 2) track and the report.
+    """
+    xy, dropped = load_track_grid(path, sampling_rate, part)
+    xy, report = clean_track(xy, sampling_rate, **dict({"normalize": not part.endswith("_cm")}, **cleaning))
+    report["dropped_frames"] = dropped
+    return xy, report
+
+def load_analysis_track(path, sampling_rate, part="center", cleaning=None):
+    """
+    Track of an analysis script: with cleaning (a dict of clean_track keyword arguments) the part
+    is loaded with load_clean_track and the report printed; with None the valid samples are
+    loaded as they are (track_io.load_coordinates).
+    """
+    if cleaning is None:
+        return load_coordinates(path, part)
+    xy, report = load_clean_track(path, sampling_rate, part, **cleaning)
+    print(format_cleaning_report(report))
+    return xy
+
+def format_cleaning_report(report):
+    """
+    One-line summary of a clean_track report.
+    """
+    return (f"Track cleaning: {report['samples']} samples, {report['missed']} missing "
+            f"({report['dropped_frames']} dropped frames), {report['outliers']} outliers rejected, "
+            f"{report['interpolated']} interpolated, {report['gaps']} left as gaps")
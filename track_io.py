@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Shared readers for tracking results.
+
+Text coordinates (AnimalTracker *.txt, or the nose/body_track_*.txt files of black_mouse_tracker)
+and the binary track_*.npy files written by black_mouse_tracker.save_track_array.
+"""
+
+import os
+import re
+import numpy as np
+
+# One record per processed frame. Frames without a detection keep their frame index and
+# timestamp, with valid = False and NaN coordinates. Little-endian, so files can be
+# memory-mapped on any machine.
+# center_cm/nose_cm are the same points mapped to the arena floor through the ROI homography
+# (see calibration.arena_homography); they are NaN if the track was saved without one.
+# ellipse is the body ellipse fitted by the tracker, for posture features (see kinematics.py).
+TRACK_DTYPE = np.dtype([
+    ("frame", "<i8"),            # Video frame index
+    ("time", "<f8"),             # Seconds from the start of the video
+    ("center", "<f4", (2,)),     # Body center X, Y (pixels)
+    ("nose", "<f4", (2,)),       # Nose estimate X, Y (pixels)
+    ("valid", "?"),              # False where no mouse was detected
+    ("center_cm", "<f4", (2,)),  # Body center X, Y on the arena floor (cm)
+    ("nose_cm", "<f4", (2,)),    # Nose X, Y on the arena floor (cm)
+    ("ellipse", "<f4", (3,)),    # Major axis, minor axis (pixels), orientation of the major axis (degrees, 0-180)
+])
+# Track files written before the arena coordinates, and before the body ellipse, were added.
+LEGACY_TRACK_DTYPES = (np.dtype(TRACK_DTYPE.descr[:5]), np.dtype(TRACK_DTYPE.descr[:7]))
+
+COORDINATE_PATTERN = r"(\d+\.\d+)\s+(\d+\.\d+)"
+CHUNK_BYTES = 1 << 24  # Text is parsed in 16 MB blocks
+CHUNK_SAMPLES = 1 << 18  # Samples per chunk of iter_track_coordinates
+
+# Byte classes for the fast text parser: 0 = other, 1 = whitespace, 2 = digit, 3 = dot
+_BYTE_CLASS = np.zeros(256, dtype=np.uint8)
+_BYTE_CLASS[list(b" \t\n\r\f\v")] = 1
+_BYTE_CLASS[list(b"0123456789")] = 2
+_BYTE_CLASS[ord(".")] = 3
+
+class _NotDecimalText(Exception):
+    """Raised by the fast parser for text that is not only whitespace-separated decimals."""
+
+def load_track(path, mmap=True):
+    """
+    Load a binary track file as a structured array with TRACK_DTYPE fields.
+    With mmap=True the file is memory-mapped, so only the accessed columns are read from disk.
+    """
+    track = np.load(path, mmap_mode="r" if mmap else None)
+    if track.dtype != TRACK_DTYPE and track.dtype not in LEGACY_TRACK_DTYPES:
+        raise ValueError(f"{path} is not a track file (dtype {track.dtype})")
+    return track
+
+def is_calibrated(path):
+    """
+    True if path is a binary track file with arena coordinates in cm (center_cm/nose_cm).
+    """
+    if os.path.splitext(path)[1].lower() != ".npy":
+        return False
+    track = load_track(path)
+    if "center_cm" not in track.dtype.names:
+        return False
+    return bool(np.isfinite(track["center_cm"][track["valid"]]).all()) and bool(track["valid"].any())
+
+def has_ellipse(path):
+    """
+    True if path is a binary track file with the body ellipse of its tracked frames.
+    """
+    if os.path.splitext(path)[1].lower() != ".npy":
+        return False
+    track = load_track(path)
+    if "ellipse" not in track.dtype.names:
+        return False
+    return bool(np.isfinite(track["ellipse"][track["valid"]]).any())
+
+def _parse_decimal_block(block):
+    """
+    Parse a block of whitespace-separated tokens that all look like "12.345" into float64 values.
+    Raises _NotDecimalText if the block contains anything else.
+    """
+    codes = _BYTE_CLASS[np.frombuffer(block, dtype=np.uint8)]
+    if not codes.all():
+        raise _NotDecimalText
+    is_space = codes == 1
+    token_start = ~is_space
+    token_start[1:] &= is_space[:-1]
+    token_starts = np.flatnonzero(token_start)
+    if len(token_starts) == 0:
+        return np.empty(0, dtype=np.float64)
+
+    # Every token needs exactly one dot, with a digit on both sides: as many dots as tokens,
+    # each between its token start and the next one.
+    dots = np.flatnonzero(codes == 3)
+    if len(dots) != len(token_starts) or dots[0] == 0 or dots[-1] == len(codes) - 1:
+        raise _NotDecimalText
+    if not ((token_starts < dots).all() and (dots[:-1] < token_starts[1:]).all()):
+        raise _NotDecimalText
+    if not ((codes[dots - 1] == 2).all() and (codes[dots + 1] == 2).all()):
+        raise _NotDecimalText
+    return np.fromstring(block.decode("ascii"), dtype=np.float64, sep=" ")
+
+def _iter_decimal_values(path, chunk_bytes):
+    """
+    Yield float64 arrays of the numbers in a text file, block by block.
+    Blocks end on whitespace, so no number is split between two blocks.
+    """
+    with open(path, "rb") as f:
+        tail = b""
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                if tail:
+                    yield _parse_decimal_block(tail)
+                return
+            data = tail + data
+            cut = max(data.rfind(c) for c in (b" ", b"\t", b"\n", b"\r", b"\f", b"\v")) + 1
+            tail = data[cut:]
+            yield _parse_decimal_block(data[:cut])
+
+def _iter_regex_pairs(path, chunk_bytes):
+    """
+    Yield lists of the (X, Y) string pairs re.findall(COORDINATE_PATTERN, ...) finds in a text
+    file, block by block. A match followed by a character inside the block is final; the text
+    after the last final match is carried into the next block, where the search resumes as
+    findall's would. A match cut off by the block end spans at most two whitespace-separated
+    tokens, so at most the last two tokens are carried.
+    """
+    pattern = re.compile(COORDINATE_PATTERN)
+    with open(path, "r") as f:
+        tail = ""
+        while True:
+            data = f.read(chunk_bytes)
+            text = tail + data
+            if not data:
+                yield pattern.findall(text)
+                return
+            pairs, end = [], 0
+            for match in pattern.finditer(text):
+                if match.end() == len(text):
+                    break
+                pairs.append(match.groups())
+                end = match.end()
+            rest = text[end:]
+            head = rest.rsplit(None, 2)
+            tail = rest[len(head[0]):] if len(head) == 3 else rest
+            yield pairs
+
+def iter_coordinates(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield the X, Y pairs of a text coordinate file as (n, 2) float64 arrays, one per block of
+    about chunk_bytes, so long files can be processed without loading them at once.
+    The pairs are the same as re.findall(COORDINATE_PATTERN, ...) finds. Files made only of
+    decimal numbers take a vectorized path; anything else (headers, integers, signs)
+    falls back to the regex.
+    """
+    n_yielded = 0
+    pending = np.empty(0, dtype=np.float64)
+    try:
+        for values in _iter_decimal_values(path, chunk_bytes):
+            # The regex pairs consecutive numbers; an odd one out waits for the next block.
+            values = np.concatenate([pending, values]) if len(pending) else values
+            n_pairs = len(values) // 2
+            pending = values[2 * n_pairs:]
+            if n_pairs:
+                n_yielded += n_pairs
+                yield values[:2 * n_pairs].reshape(-1, 2)
+        return
+    except _NotDecimalText:
+        pass
+
+    # Slow path: the pairs found so far match the regex, so continue after them.
+    for pairs in _iter_regex_pairs(path, chunk_bytes):
+        skip = min(n_yielded, len(pairs))
+        n_yielded -= skip
+        if len(pairs) > skip:
+            yield np.array(pairs[skip:], dtype=np.float64)
+
+def iter_track_coordinates(path, part="center", chunk_samples=CHUNK_SAMPLES):
+    """
+    The coordinates load_coordinates returns, as (n, 2) float64 chunks, without holding the whole
+    track: binary track files are memory-mapped and read chunk_samples frames at a time (valid
+    frames only), text files in blocks of about as many pairs (see iter_coordinates).
+    """
+    if os.path.splitext(path)[1].lower() != ".npy":
+        yield from iter_coordinates(path, chunk_samples * 20)  # About 20 bytes per X, Y line
+        return
+    track = load_track(path)
+    if part not in track.dtype.names:
+        raise ValueError(f"{path} has no {part} coordinates")
+    for start in range(0, len(track), chunk_samples):
+        chunk = track[start:start + chunk_samples]
+        yield np.asarray(chunk[part][chunk["valid"]], dtype=np.float64)
+
+def load_coordinates(path, part="center"):
+    """
+    Load X, Y coordinates as an (N, 2) float64 array.
+    Binary track files (*.npy) return the valid frames of the chosen part: "center" or "nose"
+    in pixels, or "center_cm" or "nose_cm" on the arena floor (see is_calibrated), or the (N, 3)
+    body "ellipse" (see has_ellipse);
+    text files return every "<float> <float>" pair, as AnimalTracker writes them (see iter_coordinates).
+    """
+    if os.path.splitext(path)[1].lower() == ".npy":
+        track = load_track(path)
+        if part not in track.dtype.names:
+            raise ValueError(f"{path} has no {part} coordinates")
+        return np.asarray(track[part][track["valid"]], dtype=np.float64)
+
+    chunks = list(iter_coordinates(path))
+    if not chunks:
+        return np.empty((0, 2), dtype=np.float64)
+    return chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Low-overhead instrumentation of the tracker.
+
+TrackerStats collects the time of every pipeline stage per call (decode, cvtColor, threshold,
+bitwise_and, findContours, pointPolygonTest, moments, fitEllipse, ...) and event counters
+(processed frames, detections, failures by reason). Recording is one perf_counter difference
+and one array append per stage, cheap enough to leave on in production; every PENDING_CALLS
+calls the times are folded into a running count, total, minimum, maximum and histogram, so the
+memory stays constant however long the run. The totals, mean and percentile
+times per stage can be printed or exported as JSON at the end of a run, and the stats of
+parallel chunks can be merged.
+"""
+
+import json
+import math
+import time
+from array import array
+
+import numpy as np
+
+# Pipeline stages in order, for reports
+STAGES = ("grab", "decode", "convert", "wait", "threshold", "bitwise_and", "find_contours",
+          "point_polygon_test", "moments", "fit_ellipse", "frame")
+
+clock = time.perf_counter
+
+# Log-spaced histogram of stage times, for percentiles within about 2.5% from 0.1 us to 1000 s
+HISTOGRAM_MIN_S = 1e-7
+BINS_PER_DECADE = 50
+HISTOGRAM_BINS = 10 * BINS_PER_DECADE
+PENDING_CALLS = 4096  # Stage times held before they are folded into the histogram
+
+class StageTimes:
+    """
+    Durations of one stage: running count, total, minimum and maximum, and a histogram in
+    log-spaced bins for the percentiles. New durations are appended to pending and folded in
+    by flush().
+    """
+    __slots__ = ("calls", "total", "min", "max", "histogram", "pending")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self.pending = array("d")
+
+    def flush(self):
+        if not self.pending:
+            return
+        seconds = np.array(self.pending)
+        self.pending = array("d")
+        self.calls += len(seconds)
+        self.total += float(seconds.sum())
+        self.min = min(self.min, float(seconds.min()))
+        self.max = max(self.max, float(seconds.max()))
+        bins = np.log10(np.maximum(seconds, HISTOGRAM_MIN_S) / HISTOGRAM_MIN_S) * BINS_PER_DECADE
+        self.histogram += np.bincount(np.minimum(bins.astype(np.int64), HISTOGRAM_BINS - 1),
+                                      minlength=HISTOGRAM_BINS)
+
+    def merge(self, other):
+        self.flush()
+        other.flush()
+        self.calls += other.calls
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram += other.histogram
+
+    def percentiles(self, q):
+        """
+        Percentiles q (0-100) of the durations: the geometric center of the histogram bin holding
+        each one, within the minimum and maximum.
+        """
+        self.flush()
+        ranks = np.maximum(np.ceil(np.asarray(q, dtype=np.float64) / 100 * self.calls), 1)
+        bins = np.searchsorted(np.cumsum(self.histogram), ranks)
+        centers = HISTOGRAM_MIN_S * 10 ** ((bins + 0.5) / BINS_PER_DECADE)
+        return np.clip(centers, self.min, self.max)
+
+class TrackerStats:
+    """
+    Per-stage durations (seconds, as StageTimes) and event counters of a tracking run.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.started = clock()
+        self.wall_time = None
+
+    def add(self, stage, seconds):
+        """
+        Record one call of a stage.
+        """
+        times = self.stages.get(stage)
+        if times is None:
+            times = self.stages[stage] = StageTimes()
+        times.pending.append(seconds)
+        if len(times.pending) >= PENDING_CALLS:
+            times.flush()
+
+    def count(self, event, n=1):
+        """
+        Increment an event counter, e.g. "processed" or "no_contour".
+        """
+        self.counters[event] = self.counters.get(event, 0) + n
+
+    def stop(self):
+        """
+        Mark the end of the run, for the wall time and throughput.
+        """
+        self.wall_time = clock() - self.started
+
+    def merge(self, other):
+        """
+        Add the stage times and counters of another TrackerStats (e.g. of a parallel chunk).
+        """
+        for stage, times in other.stages.items():
+            self.stages.setdefault(stage, StageTimes()).merge(times)
+        for event, n in other.counters.items():
+            self.count(event, n)
+
+    def to_dict(self):
+        """
+        Report as a JSON-compatible dict: counters, wall time and throughput, and per stage the
+        number of calls, the total (s) and the mean, p50, p95, p99 and max time (ms); the
+        percentiles are resolved to the histogram bins of StageTimes.
+        """
+        wall_time = self.wall_time if self.wall_time is not None else clock() - self.started
+        report = {"counters": dict(self.counters), "wall_time_s": wall_time, "stages": {}}
+        processed = self.counters.get("processed", 0)
+        report["frames_per_s"] = processed / wall_time if wall_time > 0 else 0.0
+        if processed:
+            report["detection_rate"] = self.counters.get("detected", 0) / processed
+        ordered = [s for s in STAGES if s in self.stages] + sorted(set(self.stages) - set(STAGES))
+        for stage in ordered:
+            times = self.stages[stage]
+            times.flush()
+            if not times.calls:
+                continue
+            p50, p95, p99 = times.percentiles([50, 95, 99]) * 1000
+            report["stages"][stage] = {
+                "calls": times.calls,
+                "total_s": times.total,
+                "mean_ms": times.total / times.calls * 1000,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": times.max * 1000,
+            }
+        return report
+
+    def save_json(self, path):
+        """
+        Write the report of to_dict as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    def summary(self):
+        """
+        Multi-line text report: one line per stage, then the counters.
+        """
+        report = self.to_dict()
+        lines = [f"{'stage':<20}{'calls':>8}{'total s':>10}{'mean ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for stage, s in report["stages"].items():
+            lines.append(f"{stage:<20}{s['calls']:>8}{s['total_s']:>10.2f}{s['mean_ms']:>10.3f}"
+                         f"{s['p95_ms']:>10.3f}{s['max_ms']:>10.2f}")
+        counters = ", ".join(f"{k} {v}" for k, v in sorted(report["counters"].items()))
+        lines.append(f"{counters}; {report['frames_per_s']:.1f} frames/s over {report['wall_time_s']:.2f} s")
+        return "\n".join(lines)
+
+class NullStats(TrackerStats):
+    """
+    Stand-in that records nothing, used when no stats are collected.
+    """
+    def add(self, stage, seconds):
+        pass
+
+    def count(self, event, n=1):
+        pass
+
+NO_STATS = NullStats()